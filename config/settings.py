@@ -64,6 +64,47 @@ REST_FRAMEWORK = {
     "PAGE_SIZE": 20,
 }
 
+# Ricerca dei ticket simili:
+# - "exact": prodotto scalare sparso sull'indice TF-IDF di tutto lo storico
+# - "lsh": ricerca approssimata (TruncatedSVD + random-projection LSH), per tabelle molto grandi
+SIMILARITY_BACKEND = os.getenv("SIMILARITY_BACKEND", "exact")
+SIMILARITY_ANN_COMPONENTS = int(os.getenv("SIMILARITY_ANN_COMPONENTS", "128"))
+# bucket vicini esplorati per tabella LSH: più alto = recall maggiore, latenza maggiore
+SIMILARITY_LSH_PROBES = int(os.getenv("SIMILARITY_LSH_PROBES", "2"))
+# giorni di conservazione delle tracce dei ticket cancellati (DeletedTicket): un indice
+# salvato prima di allora non può essere riallineato e viene ricostruito
+SIMILARITY_TOMBSTONE_DAYS = int(os.getenv("SIMILARITY_TOMBSTONE_DAYS", "30"))
+
+# Classificatore usato per le predizioni di categoria:
+# - "batch": TF-IDF + Logistic Regression riallenato da zero (mode "full")
+# - "online": HashingVectorizer + SGDClassifier aggiornato con partial_fit (mode "incremental")
+ML_CLASSIFIER = os.getenv("ML_CLASSIFIER", "batch")
+
+# Ogni quanti secondi un worker ricontrolla la versione attiva del modello nel registro
+# (e l'mtime del modello incrementale) per caricarla a caldo
+ML_REGISTRY_TTL = float(os.getenv("ML_REGISTRY_TTL", "5"))
+
+# Job di training ML: True = eseguiti subito nella richiesta invece che nel pool in background
+ML_JOBS_EAGER = os.getenv("ML_JOBS_EAGER", "False") == "True"
+
+# Secondi dopo i quali un job di training ancora in coda, o in esecuzione ma senza heartbeat,
+# è considerato perso (processo riavviato o ucciso) e marcato FAILED, così da non bloccare
+# i nuovi training
+ML_JOB_TIMEOUT = float(os.getenv("ML_JOB_TIMEOUT", "3600"))
+
+# Cache di Django: LocMemCache (per processo) di default; in produzione un backend
+# condiviso tra i worker, es. DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# e DJANGO_CACHE_LOCATION=redis://redis:6379/0
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("DJANGO_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("DJANGO_CACHE_LOCATION", "ticket-intelligence"),
+    }
+}
+
+# Durata (secondi) delle risposte di analytics in cache; le scritture sui ticket le invalidano prima
+ANALYTICS_CACHE_TTL = int(os.getenv("ANALYTICS_CACHE_TTL", "60"))
+
 SPECTACULAR_SETTINGS = {
     "TITLE": "Ticket Intelligence API",
     "DESCRIPTION": "Ticket management + ML classification + analytics",
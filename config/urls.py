@@ -4,15 +4,27 @@ URL di ingresso del progetto.
 Qui registriamo:
 - admin Django
 - API REST per i ticket (via DRF router)
-- endpoint ML (training modello)
-- endpoint di analytics (trend, MTTR)
+- endpoint ML (training modello, predizione in blocco)
+- endpoint di analytics (trend e serie temporali, MTTR e percentili, statistiche della cache)
 - documentazione OpenAPI/Swagger
 """
 from django.contrib import admin
 from django.urls import path, include
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 from rest_framework.routers import DefaultRouter
-from tickets.views import TicketViewSet, TrainModelView, AnalyticsTrendsView, AnalyticsMttrView
+from tickets.views import (
+    TicketViewSet,
+    TrainModelView,
+    TrainingJobView,
+    ModelVersionListView,
+    ModelVersionActivateView,
+    PredictBatchView,
+    AnalyticsTrendsView,
+    AnalyticsTrendsSeriesView,
+    AnalyticsMttrView,
+    AnalyticsMttrPercentilesView,
+    AnalyticsCacheView,
+)
 
 router = DefaultRouter()
 router.register("tickets", TicketViewSet, basename="tickets")
@@ -25,9 +37,30 @@ urlpatterns = [
     path("api/docs/", SpectacularSwaggerView.as_view(url_name="schema"), name="swagger-ui"),
     # Endpoint dedicato al training del modello ML sui ticket esistenti
     path("api/ml/train/", TrainModelView.as_view(), name="ml-train"),
-     # Endpoint di analytics sui ticket (trend per categoria + MTTR)
+    path("api/ml/jobs/<int:pk>/", TrainingJobView.as_view(), name="ml-job-detail"),
+    # Registro delle versioni del modello (elenco + attivazione/rollback)
+    path("api/ml/models/", ModelVersionListView.as_view(), name="ml-model-list"),
+    path(
+        "api/ml/models/<int:version>/activate/",
+        ModelVersionActivateView.as_view(),
+        name="ml-model-activate",
+    ),
+    # Ricategorizzazione in blocco con il modello ML
+    path("api/ml/predict_batch/", PredictBatchView.as_view(), name="ml-predict-batch"),
+     # Endpoint di analytics sui ticket (trend per categoria + MTTR) e hit/miss della loro cache
     path("api/analytics/trends/", AnalyticsTrendsView.as_view(), name="analytics-trends"),
+    path(
+        "api/analytics/trends/series/",
+        AnalyticsTrendsSeriesView.as_view(),
+        name="analytics-trends-series",
+    ),
     path("api/analytics/mttr/", AnalyticsMttrView.as_view(), name="analytics-mttr"),
+    path(
+        "api/analytics/mttr/percentiles/",
+        AnalyticsMttrPercentilesView.as_view(),
+        name="analytics-mttr-percentiles",
+    ),
+    path("api/analytics/cache/", AnalyticsCacheView.as_view(), name="analytics-cache"),
     # API REST generata dal router per i ticket
     path("api/", include(router.urls)),
 ]
\ No newline at end of file
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Ticket
+from .models import ModelVersion, Ticket, TicketDailyStats, TrainingJob
 
 
 @admin.register(Ticket)
@@ -7,3 +7,21 @@ class TicketAdmin(admin.ModelAdmin):
     list_display = ("id", "title", "status", "priority", "category", "created_at", "assigned_to")
     list_filter = ("status", "priority", "category", "created_at")
     search_fields = ("title", "description")
+
+
+@admin.register(TicketDailyStats)
+class TicketDailyStatsAdmin(admin.ModelAdmin):
+    list_display = ("date", "category", "status", "created_count", "resolved_count", "resolution_seconds")
+    list_filter = ("category", "status")
+
+
+@admin.register(TrainingJob)
+class TrainingJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "mode", "status", "progress", "stage", "created_by", "created_at", "finished_at")
+    list_filter = ("mode", "status")
+
+
+@admin.register(ModelVersion)
+class ModelVersionAdmin(admin.ModelAdmin):
+    list_display = ("version", "is_active", "artifact_dir", "created_at")
+    readonly_fields = ("version", "artifact_dir", "checksum", "size", "metrics", "created_at")
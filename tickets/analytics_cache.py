@@ -0,0 +1,91 @@
+"""
+Cache delle risposte degli endpoint di analytics (trend, serie temporali, MTTR).
+
+Usa il cache framework di Django (CACHES in settings: LocMemCache di default,
+Redis/Memcached configurabili via env). Le chiavi contengono:
+- il nome dell'endpoint e `days`;
+- il giorno di inizio della finestra (`since` arrotondato al giorno, la
+  granularità del rollup TicketDailyStats): a mezzanotte le chiavi cambiano;
+- una "generazione" globale, incrementata a ogni scrittura sul rollup.
+
+Invalidare = incrementare la generazione: le vecchie chiavi non vengono più
+lette e scadono da sole col TTL (ANALYTICS_CACHE_TTL), senza dover conoscere
+tutte le combinazioni di parametri salvate.
+
+Hit e miss sono contati nella cache stessa (condivisi tra i worker se il
+backend è condiviso) ed esposti da GET /api/analytics/cache/.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+PREFIX = "analytics"
+GENERATION_KEY = f"{PREFIX}:generation"
+HITS_KEY = f"{PREFIX}:hits"
+MISSES_KEY = f"{PREFIX}:misses"
+
+
+def _initial_generation():
+    # in millisecondi: se la chiave viene espulsa dalla cache, la nuova generazione
+    # è comunque maggiore di quelle già usate (niente collisioni con chiavi vecchie)
+    return int(time.time() * 1000)
+
+
+def generation():
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        cache.add(GENERATION_KEY, _initial_generation(), timeout=None)
+        value = cache.get(GENERATION_KEY, _initial_generation())
+    return value
+
+
+def invalidate():
+    """
+    Invalida tutte le risposte in cache. Da chiamare dopo il commit delle
+    scritture sui ticket (vedi TicketDailyStats.apply/reconcile).
+    """
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, _initial_generation(), timeout=None)
+
+
+def _count(key):
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            # chiave espulsa tra add e incr: il campione si perde
+            pass
+
+
+def cached(name, days, since, compute):
+    """
+    Ritorna il risultato di `compute()` dalla cache, calcolandolo (e salvandolo)
+    solo se manca per questa combinazione di endpoint, finestra e generazione.
+    """
+    key = f"{PREFIX}:{generation()}:{name}:{days}:{timezone.localdate(since).isoformat()}"
+    value = cache.get(key)
+    if value is not None:
+        _count(HITS_KEY)
+        return value
+    _count(MISSES_KEY)
+    value = compute()
+    cache.set(key, value, timeout=settings.ANALYTICS_CACHE_TTL)
+    return value
+
+
+def stats():
+    hits = cache.get(HITS_KEY, 0)
+    misses = cache.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {
+        "backend": settings.CACHES["default"]["BACKEND"],
+        "ttl_seconds": settings.ANALYTICS_CACHE_TTL,
+        "generation": generation(),
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / total if total else None,
+    }
@@ -0,0 +1,200 @@
+"""
+Ricerca approssimata dei vicini (ANN) per i ticket simili.
+
+I vettori TF-IDF (sparsi, con vocabolario di bigrammi) vengono ridotti con
+TruncatedSVD a poche decine di dimensioni dense e indicizzati con un
+random-projection LSH multi-tabella: ogni tabella assegna al vettore un codice
+di n_bits (segno delle proiezioni su iperpiani casuali), e la query esamina solo
+i ticket che cadono nei bucket del proprio codice.
+
+Il parametro `probes` (multi-probe LSH) è la manopola recall/latenza: per ogni
+tabella vengono esplorati anche i bucket ottenuti invertendo i `probes` bit
+più "incerti" del codice della query (proiezione più vicina a zero).
+
+Modulo volutamente indipendente da Django (solo NumPy/scikit-learn),
+così da poter essere usato anche nel benchmark `bench_ann`.
+"""
+import numpy as np
+from sklearn.decomposition import TruncatedSVD
+
+
+def _normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def choose_n_bits(n_items, bucket_size=64):
+    """
+    Numero di bit per tabella tale che ogni bucket contenga in media
+    circa `bucket_size` elementi.
+    """
+    bits = int(np.ceil(np.log2(max(n_items, 1) / bucket_size)))
+    return int(np.clip(bits, 4, 24))
+
+
+class RandomProjectionLSH:
+    """
+    Random-projection LSH su vettori densi normalizzati (cosine similarity).
+
+    Ogni tabella è memorizzata come coppia di array (codici ordinati, posizioni),
+    quindi la ricerca di un bucket è una searchsorted, senza dict Python per bucket.
+    Gli inserimenti successivi al build finiscono in un buffer scansionato per
+    forza bruta e vengono fusi nelle tabelle con `compact()`.
+    """
+
+    def __init__(self, dim, n_tables=16, n_bits=16, seed=0):
+        rng = np.random.default_rng(seed)
+        self.dim = dim
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.planes = rng.standard_normal((n_tables, n_bits, dim)).astype(np.float32)
+        self._weights = (1 << np.arange(n_bits)).astype(np.int64)
+        self._reset(np.empty(0, dtype=np.int64), np.empty((0, dim), dtype=np.float32))
+
+    def _reset(self, ids, vectors):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.vectors = _normalize(vectors).reshape(len(self.ids), self.dim)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self._rows = {int(item_id): row for row, item_id in enumerate(self.ids)}
+        self._delta_ids = []
+        self._delta_vectors = []
+
+        codes = self._codes(self.vectors)
+        self._order = np.argsort(codes, axis=1, kind="stable")
+        self._sorted_codes = np.take_along_axis(codes, self._order, axis=1)
+
+    def _project(self, vectors):
+        # (n_tables, n, n_bits)
+        return np.einsum("tbd,nd->tnb", self.planes, vectors)
+
+    def _codes(self, vectors):
+        return ((self._project(vectors) > 0) * self._weights).sum(axis=-1)
+
+    def __len__(self):
+        return int(self.alive.sum()) + len(self._delta_ids)
+
+    def fit(self, ids, vectors):
+        self._reset(ids, vectors)
+        return self
+
+    def add(self, item_id, vector):
+        self.remove(item_id)
+        self._delta_ids.append(int(item_id))
+        self._delta_vectors.append(_normalize(vector).reshape(self.dim))
+
+    def remove(self, item_id):
+        item_id = int(item_id)
+        row = self._rows.pop(item_id, None)
+        if row is not None:
+            self.alive[row] = False
+            return
+        if item_id in self._delta_ids:
+            pos = self._delta_ids.index(item_id)
+            del self._delta_ids[pos]
+            del self._delta_vectors[pos]
+
+    @property
+    def pending(self):
+        return len(self._delta_ids)
+
+    def compact(self):
+        if not self._delta_ids and self.alive.all():
+            return
+        ids = np.concatenate([self.ids[self.alive], np.asarray(self._delta_ids, dtype=np.int64)])
+        vectors = np.concatenate(
+            [self.vectors[self.alive], np.asarray(self._delta_vectors, dtype=np.float32).reshape(-1, self.dim)]
+        )
+        self._reset(ids, vectors)
+
+    def candidates(self, vector, probes=0):
+        """
+        Posizioni (righe) dei vettori che condividono almeno un bucket con la query,
+        esplorando per ogni tabella il bucket esatto + `probes` bucket vicini.
+        """
+        proj = self._project(vector.reshape(1, self.dim))[:, 0, :]  # (n_tables, n_bits)
+        codes = ((proj > 0) * self._weights).sum(axis=-1)
+        probes = int(np.clip(probes, 0, self.n_bits))
+
+        found = []
+        for t in range(self.n_tables):
+            probe_codes = [codes[t]]
+            if probes:
+                flip = np.argsort(np.abs(proj[t]))[:probes]
+                probe_codes.extend(codes[t] ^ self._weights[flip])
+            probe_codes = np.asarray(probe_codes, dtype=np.int64)
+            lo = np.searchsorted(self._sorted_codes[t], probe_codes, side="left")
+            hi = np.searchsorted(self._sorted_codes[t], probe_codes, side="right")
+            found.extend(self._order[t][a:b] for a, b in zip(lo, hi) if b > a)
+
+        if not found:
+            return np.empty(0, dtype=np.int64)
+        rows = np.unique(np.concatenate(found))
+        return rows[self.alive[rows]]
+
+    def search(self, vector, probes=0):
+        """
+        Ritorna (ids, scores) dei candidati con la relativa cosine similarity.
+        """
+        vector = _normalize(vector).reshape(self.dim)
+        rows = self.candidates(vector, probes=probes)
+        ids = self.ids[rows]
+        scores = self.vectors[rows] @ vector
+        if self._delta_ids:
+            delta = np.asarray(self._delta_vectors, dtype=np.float32)
+            ids = np.concatenate([ids, np.asarray(self._delta_ids, dtype=np.int64)])
+            scores = np.concatenate([scores, delta @ vector])
+        return ids, scores
+
+
+class SvdLshIndex:
+    """
+    Backend ANN per i ticket simili: TruncatedSVD sui vettori TF-IDF + RandomProjectionLSH.
+
+    Espone la stessa interfaccia dell'indice esatto (upsert/remove/scores)
+    così che ml_utils possa usare l'uno o l'altro in modo trasparente.
+    """
+
+    COMPACT_EVERY = 1024
+
+    def __init__(self, svd, lsh, synced_at):
+        self.svd = svd
+        self.lsh = lsh
+        self.synced_at = synced_at
+
+    @classmethod
+    def build(cls, ids, matrix, synced_at, n_components=128, n_tables=16, seed=0):
+        # TruncatedSVD richiede n_components < n_features
+        n_components = max(1, min(n_components, matrix.shape[1] - 1, matrix.shape[0]))
+        svd = TruncatedSVD(n_components=n_components, random_state=seed)
+        reduced = svd.fit_transform(matrix) if matrix.shape[0] else np.empty((0, n_components))
+        lsh = RandomProjectionLSH(
+            dim=n_components,
+            n_tables=n_tables,
+            n_bits=choose_n_bits(len(ids)),
+            seed=seed,
+        ).fit(ids, reduced)
+        return cls(svd, lsh, synced_at)
+
+    def __len__(self):
+        return len(self.lsh)
+
+    def _reduce(self, vectors):
+        return self.svd.transform(vectors)
+
+    def upsert(self, ticket_id, vector):
+        self.lsh.add(ticket_id, self._reduce(vector))
+
+    def remove(self, ticket_id):
+        self.lsh.remove(ticket_id)
+
+    @property
+    def needs_compaction(self):
+        return self.lsh.pending >= self.COMPACT_EVERY
+
+    def compact(self):
+        self.lsh.compact()
+
+    def scores(self, query_vec, probes=0):
+        return self.lsh.search(self._reduce(query_vec)[0], probes=probes)
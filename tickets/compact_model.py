@@ -0,0 +1,187 @@
+"""
+Formato "compatto" del modello TF-IDF + Logistic Regression, pensato per essere
+caricato con np.load(mmap_mode="r").
+
+Il Pipeline scikit-learn serializzato con joblib contiene il vocabolario dei
+bigrammi come dict Python: ogni worker lo ricostruisce interamente in memoria
+(decine/centinaia di MB per processo). Qui invece tutto è salvato come array
+NumPy in file .npy separati:
+
+- terms_hash.npy  hash a 64 bit dei termini, ordinati (lookup con searchsorted)
+- term_index.npy  colonna della feature corrispondente a ciascun hash
+- idf.npy         vettore idf del TfidfVectorizer
+- coef.npy / intercept.npy / classes.npy   parametri della Logistic Regression
+- params.json     parametri del tokenizer (ngram_range, lowercase, ...)
+
+Caricati in mmap, i file restano nella page cache del sistema operativo e sono
+condivisi da tutti i worker che usano la stessa versione del modello.
+
+Modulo indipendente da Django (usato anche dal benchmark `bench_model_rss`).
+"""
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.special import expit, softmax
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.preprocessing import normalize
+
+# parametri del TfidfVectorizer necessari per riprodurne transform()
+TFIDF_PARAMS = (
+    "analyzer",
+    "binary",
+    "lowercase",
+    "ngram_range",
+    "norm",
+    "strip_accents",
+    "sublinear_tf",
+    "token_pattern",
+)
+
+
+def term_hash(term):
+    # 64 bit: con ~10^6 termini la probabilità di collisione è trascurabile
+    return int.from_bytes(hashlib.blake2b(term.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+class CompactTfidf:
+    """
+    Equivalente di TfidfVectorizer.transform() con vocabolario come array ordinato.
+    """
+
+    def __init__(self, params, terms_hash, term_index, idf):
+        self.params = params
+        self.terms_hash = terms_hash
+        self.term_index = term_index
+        self.idf = idf
+        self._analyzer = TfidfVectorizer(**params).build_analyzer()
+
+    @property
+    def n_features(self):
+        return len(self.idf)
+
+    def transform(self, texts):
+        indptr = [0]
+        indices = []
+        counts = []
+        for text in texts:
+            tokens = self._analyzer(text)
+            cols = col_counts = np.empty(0, dtype=np.int64)
+            if tokens:
+                hashes = np.fromiter((term_hash(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+                pos = np.searchsorted(self.terms_hash, hashes)
+                pos[pos == len(self.terms_hash)] = 0
+                known = self.terms_hash[pos] == hashes
+                cols, col_counts = np.unique(self.term_index[pos[known]], return_counts=True)
+            indices.append(cols)
+            counts.append(col_counts)
+            indptr.append(indptr[-1] + len(cols))
+
+        X = sp.csr_matrix(
+            (
+                np.concatenate(counts).astype(np.float64) if counts else np.empty(0),
+                np.concatenate(indices) if indices else np.empty(0, dtype=np.int64),
+                np.asarray(indptr),
+            ),
+            shape=(len(indptr) - 1, self.n_features),
+        )
+
+        if self.params.get("binary"):
+            X.data[:] = 1.0
+        if self.params.get("sublinear_tf"):
+            np.log(X.data, X.data)
+            X.data += 1.0
+        X.data *= self.idf[X.indices]
+        if self.params.get("norm"):
+            X = normalize(X, norm=self.params["norm"], copy=False)
+        return X
+
+
+class CompactLogisticRegression:
+    """
+    predict_proba() di una LogisticRegression già allenata, a partire da coef/intercept.
+    """
+
+    def __init__(self, coef, intercept, classes):
+        self.coef_ = coef
+        self.intercept_ = intercept
+        self.classes_ = classes
+
+    def predict_proba(self, X):
+        scores = np.asarray(X @ self.coef_.T) + self.intercept_
+        if scores.shape[1] == 1:
+            # caso binario: una sola colonna di decision function
+            positive = expit(scores[:, 0])
+            return np.column_stack([1 - positive, positive])
+        return softmax(scores, axis=1)
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+
+class CompactPipeline:
+    """
+    Interfaccia minima del Pipeline usata dal resto del codice:
+    named_steps["tfidf"], classes_, predict_proba(texts), predict(texts).
+    """
+
+    def __init__(self, tfidf, clf):
+        self.named_steps = {"tfidf": tfidf, "clf": clf}
+
+    @property
+    def classes_(self):
+        return self.named_steps["clf"].classes_
+
+    def predict_proba(self, texts):
+        return self.named_steps["clf"].predict_proba(self.named_steps["tfidf"].transform(texts))
+
+    def predict(self, texts):
+        return self.named_steps["clf"].predict(self.named_steps["tfidf"].transform(texts))
+
+
+def save_compact(pipeline, directory):
+    """
+    Salva un Pipeline (tfidf + clf) allenato nel formato compatto.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    tfidf = pipeline.named_steps["tfidf"]
+    clf = pipeline.named_steps["clf"]
+
+    terms = list(tfidf.vocabulary_.keys())
+    hashes = np.fromiter((term_hash(t) for t in terms), dtype=np.uint64, count=len(terms))
+    columns = np.fromiter(tfidf.vocabulary_.values(), dtype=np.int32, count=len(terms))
+    order = np.argsort(hashes)
+
+    np.save(directory / "terms_hash.npy", hashes[order])
+    np.save(directory / "term_index.npy", columns[order])
+    np.save(directory / "idf.npy", tfidf.idf_)
+    np.save(directory / "coef.npy", np.ascontiguousarray(clf.coef_))
+    np.save(directory / "intercept.npy", clf.intercept_)
+    np.save(directory / "classes.npy", np.asarray(clf.classes_, dtype=str))
+
+    params = {name: tfidf.get_params()[name] for name in TFIDF_PARAMS}
+    (directory / "params.json").write_text(json.dumps(params))
+
+
+def load_compact(directory, mmap_mode="r"):
+    """
+    Carica il modello compatto; con mmap_mode="r" gli array non vengono copiati
+    nella memoria del processo ma mappati dal file.
+    """
+    directory = Path(directory)
+
+    def load(name):
+        return np.load(directory / name, mmap_mode=mmap_mode)
+
+    params = json.loads((directory / "params.json").read_text())
+    params["ngram_range"] = tuple(params["ngram_range"])
+    tfidf = CompactTfidf(params, load("terms_hash.npy"), load("term_index.npy"), load("idf.npy"))
+    clf = CompactLogisticRegression(
+        load("coef.npy"),
+        np.load(directory / "intercept.npy"),
+        np.load(directory / "classes.npy").astype(object),
+    )
+    return CompactPipeline(tfidf, clf)
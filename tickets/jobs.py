@@ -0,0 +1,187 @@
+"""
+Esecuzione in background dei job di training del modello ML.
+
+I job sono righe di TrainingJob; l'esecuzione avviene in un pool di thread
+interno al processo (un solo worker). Che ci sia un solo job attivo per tipo,
+anche tra più processi, lo garantisce il DB (vincolo unique_active_training_job).
+Con ML_JOBS_EAGER = True il job viene eseguito subito nella richiesta
+(utile nei test e negli ambienti senza worker).
+
+Il pool non sopravvive al processo: un job PENDING/RUNNING il cui processo è
+stato riavviato o ucciso resterebbe attivo per sempre e bloccherebbe i training
+successivi. Per questo, prima di accodare un nuovo job:
+- i job in coda da più di ML_JOB_TIMEOUT secondi, o in esecuzione senza
+  heartbeat da più di ML_JOB_TIMEOUT secondi, vengono marcati FAILED;
+- alla prima richiesta del processo i job PENDING rimasti vengono rimessi in coda.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import TrainingJob
+from .ml_utils import train_incremental, train_model
+
+logger = logging.getLogger(__name__)
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ml-train")
+
+ACTIVE_STATUSES = ("PENDING", "RUNNING")
+
+# i job PENDING ereditati da un processo precedente si rimettono in coda una volta sola
+_requeue_lock = threading.Lock()
+_requeued = False
+
+
+TRAINERS = {
+    "full": train_model,
+    "incremental": train_incremental,
+}
+
+
+def submit_training_job(user=None, mode="full"):
+    """
+    Accoda un job di training ("full" o "incremental") e ritorna la riga TrainingJob.
+    Se c'è già un job dello stesso tipo in coda o in esecuzione, ritorna quello.
+    """
+    fail_stale_jobs()
+    _requeue_pending_jobs()
+    while True:
+        active = TrainingJob.objects.filter(mode=mode, status__in=ACTIVE_STATUSES).first()
+        if active is not None:
+            return active
+        try:
+            with transaction.atomic():
+                job = TrainingJob.objects.create(
+                    mode=mode,
+                    created_by=user if user and user.is_authenticated else None,
+                )
+            break
+        except IntegrityError:
+            # un altro processo ha appena accodato un job dello stesso tipo: si ritorna quello
+            continue
+    _enqueue(job.pk)
+    if getattr(settings, "ML_JOBS_EAGER", False):
+        job.refresh_from_db()
+    return job
+
+
+def _enqueue(job_id):
+    if getattr(settings, "ML_JOBS_EAGER", False):
+        run_training_job(job_id)
+    else:
+        # il thread deve vedere la riga: si parte solo dopo il commit della richiesta
+        transaction.on_commit(lambda: _executor.submit(_run_in_thread, job_id))
+
+
+def fail_stale_jobs():
+    """
+    Marca FAILED i job in coda da più di ML_JOB_TIMEOUT secondi (created_at) e
+    quelli in esecuzione il cui heartbeat è fermo da più di ML_JOB_TIMEOUT secondi:
+    il processo che li eseguiva è stato riavviato o ucciso. Un training lungo
+    ma vivo continua ad aggiornare heartbeat_at e non viene toccato.
+    Ritorna il numero di job marcati.
+    """
+    timeout = getattr(settings, "ML_JOB_TIMEOUT", 3600)
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=timeout)
+    stale = TrainingJob.objects.filter(
+        Q(status="PENDING", created_at__lt=cutoff)
+        | Q(status="RUNNING", heartbeat_at__lt=cutoff)
+        | Q(status="RUNNING", heartbeat_at__isnull=True, started_at__lt=cutoff)
+    )
+    count = stale.update(
+        status="FAILED",
+        error=f"Timed out after {timeout:g}s (worker restarted or killed)",
+        finished_at=now,
+    )
+    if count:
+        logger.warning("Marked %d stale training job(s) as failed", count)
+    return count
+
+
+def _requeue_pending_jobs():
+    """
+    I job PENDING di un processo precedente sono persi con il suo pool: la prima
+    volta che questo processo accoda un job li rimette nel proprio. Se un altro
+    worker vivo ha già lo stesso job in coda, lo esegue solo chi lo prende per
+    primo (vedi run_training_job).
+    """
+    global _requeued
+    with _requeue_lock:
+        if _requeued:
+            return
+        _requeued = True
+    for job_id in TrainingJob.objects.filter(status="PENDING").order_by("created_at").values_list("pk", flat=True):
+        logger.info("Requeueing pending training job %s", job_id)
+        _enqueue(job_id)
+
+
+def _run_in_thread(job_id):
+    close_old_connections()
+    # heartbeat da un thread a parte: una singola fase del training (es. il fit)
+    # può durare più di ML_JOB_TIMEOUT senza chiamare report()
+    stop = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job_id, stop), name="ml-heartbeat", daemon=True)
+    heartbeat.start()
+    try:
+        run_training_job(job_id)
+    finally:
+        stop.set()
+        heartbeat.join()
+        close_old_connections()
+
+
+def _heartbeat(job_id, stop):
+    interval = getattr(settings, "ML_JOB_TIMEOUT", 3600) / 4
+    try:
+        while not stop.wait(interval):
+            TrainingJob.objects.filter(pk=job_id, status="RUNNING").update(heartbeat_at=timezone.now())
+    finally:
+        # connessione propria di questo thread
+        connection.close()
+
+
+def run_training_job(job_id):
+    """
+    Esegue il training aggiornando stato, avanzamento, heartbeat e risultato del job.
+    Non fa nulla se il job non è più PENDING (già preso da un altro worker o scaduto);
+    lo stato finale viene scritto solo se il job è ancora RUNNING (non scaduto nel frattempo).
+    """
+    jobs = TrainingJob.objects.filter(pk=job_id)
+    train = TRAINERS[jobs.values_list("mode", flat=True).get()]
+    now = timezone.now()
+    if not jobs.filter(status="PENDING").update(status="RUNNING", started_at=now, heartbeat_at=now, stage="starting"):
+        return
+    jobs = jobs.filter(status="RUNNING")
+
+    def report(progress, stage):
+        jobs.update(progress=progress, stage=stage, heartbeat_at=timezone.now())
+
+    try:
+        info = train(progress=report)
+    except Exception as exc:
+        logger.exception("Training job %s failed", job_id)
+        jobs.update(status="FAILED", error=repr(exc), finished_at=timezone.now())
+        return
+
+    if info is None:
+        jobs.update(
+            status="FAILED",
+            error="No data (or only one class) available for training",
+            finished_at=timezone.now(),
+        )
+        return
+
+    jobs.update(
+        status="SUCCEEDED",
+        progress=1.0,
+        stage="done",
+        result=info,
+        finished_at=timezone.now(),
+    )
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from tickets.ml_utils import TRAINING_CHUNK_SIZE, backfill_ticket_vectors
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcola e salva in TicketVector i vettori TF-IDF dei ticket senza un vettore "
+        "valido per la versione attiva del modello (es. dopo un rollback o un import)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=TRAINING_CHUNK_SIZE,
+            help=f"Ticket per blocco (default: {TRAINING_CHUNK_SIZE})",
+        )
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Ricalcola i vettori di tutti i ticket, anche quelli già allineati",
+        )
+
+    def handle(self, *args, **options):
+        done = backfill_ticket_vectors(
+            chunk_size=options["chunk_size"],
+            rebuild=options["rebuild"],
+            progress=lambda n: self.stdout.write(f"vectorized: {n}"),
+        )
+        if done is None:
+            raise CommandError("Model not trained")
+        self.stdout.write(self.style.SUCCESS(f"Ticket vectors stored: {done}"))
@@ -0,0 +1,84 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from tickets.ann import RandomProjectionLSH, choose_n_bits
+
+
+def _percentiles(samples):
+    ms = np.asarray(samples) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 99)
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark della ricerca ticket simili: forza bruta vs LSH "
+        "(latenza p50/p99 e recall@k) su vettori sintetici"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--n", type=int, default=1_000_000, help="Numero di ticket sintetici (default: 1M)")
+        parser.add_argument("--dim", type=int, default=128, help="Dimensioni dopo TruncatedSVD (default: 128)")
+        parser.add_argument("--queries", type=int, default=200, help="Numero di query (default: 200)")
+        parser.add_argument("--tables", type=int, default=16, help="Tabelle LSH (default: 16)")
+        parser.add_argument("--top", type=int, default=10, help="k per recall@k (default: 10)")
+        parser.add_argument(
+            "--probes",
+            type=int,
+            nargs="+",
+            default=[0, 2, 4, 8],
+            help="Valori di probes da misurare (default: 0 2 4 8)",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        n, dim, top = options["n"], options["dim"], options["top"]
+        rng = np.random.default_rng(options["seed"])
+
+        # dati a cluster (come ticket "quasi duplicati" attorno a pochi argomenti)
+        n_clusters = max(n // 100, 1)
+        centers = rng.standard_normal((n_clusters, dim)).astype(np.float32)
+        vectors = centers[rng.integers(0, n_clusters, n)]
+        vectors += 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = np.arange(n, dtype=np.int64)
+
+        queries = vectors[rng.integers(0, n, options["queries"])]
+        queries = queries + 0.1 * rng.standard_normal(queries.shape).astype(np.float32)
+
+        start = time.perf_counter()
+        lsh = RandomProjectionLSH(
+            dim=dim, n_tables=options["tables"], n_bits=choose_n_bits(n), seed=options["seed"]
+        ).fit(ids, vectors)
+        self.stdout.write(
+            f"n={n} dim={dim} tables={lsh.n_tables} bits={lsh.n_bits} "
+            f"build={time.perf_counter() - start:.1f}s"
+        )
+
+        exact_top = []
+        timings = []
+        for q in queries:
+            start = time.perf_counter()
+            scores = lsh.vectors @ (q / np.linalg.norm(q))
+            best = np.argpartition(-scores, top)[:top]
+            timings.append(time.perf_counter() - start)
+            exact_top.append(set(ids[best].tolist()))
+        p50, p99 = _percentiles(timings)
+        self.stdout.write(f"exact          p50={p50:8.2f}ms p99={p99:8.2f}ms recall@{top}=1.000")
+
+        for probes in options["probes"]:
+            timings = []
+            hits = 0
+            for q, truth in zip(queries, exact_top):
+                start = time.perf_counter()
+                cand_ids, scores = lsh.search(q, probes=probes)
+                k = min(top, len(scores))
+                best = cand_ids[np.argpartition(-scores, k - 1)[:k]] if k else cand_ids
+                timings.append(time.perf_counter() - start)
+                hits += len(truth & set(best.tolist()))
+            p50, p99 = _percentiles(timings)
+            recall = hits / (top * len(queries))
+            self.stdout.write(
+                f"lsh probes={probes:<3d} p50={p50:8.2f}ms p99={p99:8.2f}ms recall@{top}={recall:.3f}"
+            )
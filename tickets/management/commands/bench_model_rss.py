@@ -0,0 +1,111 @@
+import multiprocessing
+import tempfile
+from pathlib import Path
+
+import joblib
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from tickets.compact_model import load_compact, save_compact
+
+SAMPLE_TEXTS = ["invoice not received", "error 500 on dashboard", "cannot reset password"]
+
+
+def _memory_kb():
+    # Rss = pagine residenti del processo; Pss = Rss con le pagine condivise
+    # divise tra i processi che le usano (la misura giusta per sommare i worker)
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            key, _, rest = line.partition(":")
+            if key in ("Rss", "Pss"):
+                values[key] = int(rest.split()[0])
+    return values
+
+
+def _worker(layout, path, barrier, results):
+    if layout == "joblib":
+        model = joblib.load(path)
+    elif layout == "mmap":
+        model = load_compact(path)
+    else:
+        model = None
+    if model is not None:
+        model.predict_proba(SAMPLE_TEXTS)
+    # tutti i worker vivi nello stesso momento, come in gunicorn
+    barrier.wait()
+    results.put(_memory_kb())
+    barrier.wait()
+
+
+def _synthetic_corpus(n_docs, n_words, seed):
+    rng = np.random.default_rng(seed)
+    syllables = ["ka", "lo", "mi", "ne", "ru", "to", "sa", "vi", "de", "po", "fu", "ze"]
+    vocabulary = [
+        "".join(rng.choice(syllables, size=rng.integers(2, 5))) + str(i % 97) for i in range(n_words)
+    ]
+    # distribuzione Zipf: poche parole frequenti, coda lunga di parole rare
+    weights = 1.0 / np.arange(1, n_words + 1)
+    weights /= weights.sum()
+    categories = ["billing", "account", "bug", "feature", "other"]
+    for i in range(n_docs):
+        words = rng.choice(vocabulary, size=60, p=weights)
+        yield " ".join(words), categories[i % len(categories)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark della memoria di N worker che caricano il modello: "
+        "Pipeline joblib (vocabolario come dict) vs formato compatto in mmap"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Processi worker (default: 8)")
+        parser.add_argument("--docs", type=int, default=20_000, help="Documenti sintetici (default: 20000)")
+        parser.add_argument("--words", type=int, default=50_000, help="Parole distinte (default: 50000)")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        from tickets.ml_utils import fit_pipeline
+
+        pipeline, _ = fit_pipeline(_synthetic_corpus(options["docs"], options["words"], options["seed"]))
+        n_features = len(pipeline.named_steps["tfidf"].vocabulary_)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            joblib.dump(pipeline, tmp / "model.joblib")
+            save_compact(pipeline, tmp / "compact")
+            del pipeline
+
+            joblib_mb = (tmp / "model.joblib").stat().st_size / 2**20
+            compact_mb = sum(p.stat().st_size for p in (tmp / "compact").iterdir()) / 2**20
+            self.stdout.write(
+                f"features={n_features} joblib file={joblib_mb:.1f} MB compact files={compact_mb:.1f} MB"
+            )
+
+            baseline = None
+            for layout, path in (
+                ("baseline", None),
+                ("joblib", tmp / "model.joblib"),
+                ("mmap", tmp / "compact"),
+            ):
+                rss, pss = self._run(layout, path, options["workers"])
+                if baseline is None:
+                    baseline = pss
+                self.stdout.write(
+                    f"{layout:<9} workers={options['workers']} "
+                    f"sum RSS={rss / 1024:8.1f} MB sum PSS={pss / 1024:8.1f} MB "
+                    f"model PSS={(pss - baseline) / 1024:8.1f} MB"
+                )
+
+    def _run(self, layout, path, workers):
+        ctx = multiprocessing.get_context("spawn")
+        barrier = ctx.Barrier(workers)
+        results = ctx.Queue()
+        procs = [ctx.Process(target=_worker, args=(layout, path, barrier, results)) for _ in range(workers)]
+        for proc in procs:
+            proc.start()
+        samples = [results.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+        return sum(s["Rss"] for s in samples), sum(s["Pss"] for s in samples)
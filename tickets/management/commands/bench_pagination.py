@@ -0,0 +1,114 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from rest_framework.test import APIClient
+
+from tickets.models import Ticket
+from tickets.pagination import KeysetPagination
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark della lista ticket a pagine profonde: PageNumberPagination "
+        "(OFFSET + COUNT) vs paginazione keyset, con e senza count"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--n",
+            type=int,
+            default=200_000,
+            help=(
+                "Ticket sintetici da inserire (in una transazione annullata a fine benchmark). "
+                "0 = misura sulla tabella esistente."
+            ),
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            nargs="+",
+            default=[1, 100, 1000, 5000],
+            help="Pagine da misurare (default: 1 100 1000 5000)",
+        )
+        parser.add_argument("--repeat", type=int, default=20, help="Richieste per misura (default: 20)")
+
+    def handle(self, *args, **options):
+        # APIClient usa l'host "testserver"
+        with transaction.atomic(), override_settings(ALLOWED_HOSTS=["testserver"]):
+            user, _ = User.objects.get_or_create(username="bench")
+            if options["n"]:
+                self._insert(user, options["n"])
+            client = APIClient()
+            client.force_authenticate(user=user)
+
+            url = reverse("tickets-list")
+            total = Ticket.objects.count()
+            page_size = api_settings.PAGE_SIZE
+            self.stdout.write(f"tickets: {total}")
+
+            for page in options["pages"]:
+                offset = (page - 1) * page_size
+                if offset >= total:
+                    self.stdout.write(f"page={page}: oltre la fine della tabella, salto")
+                    continue
+                # cursore equivalente a ?page=N: chiave dell'ultimo ticket della pagina precedente
+                params = {"pagination": "cursor"}
+                if offset:
+                    last = Ticket.objects.order_by("-created_at", "-id")[offset - 1]
+                    params["cursor"] = KeysetPagination(page_size).encode_cursor(last, reverse=False)
+
+                modes = [
+                    ("offset", lambda: client.get(url, {"page": page})),
+                    ("keyset", lambda: client.get(url, params)),
+                    ("keyset no-count", lambda: client.get(url, {**params, "count": "false"})),
+                ]
+                for label, run in modes:
+                    p50, p99 = self._measure(run, options["repeat"])
+                    self.stdout.write(f"page={page:<6d} {label:<16} p50={p50:8.2f}ms p99={p99:8.2f}ms")
+
+            transaction.set_rollback(True)
+
+    def _insert(self, user, n, batch_size=5000):
+        # created_at distinti e crescenti (auto_now_add li renderebbe tutti uguali)
+        field = Ticket._meta.get_field("created_at")
+        field.auto_now_add = False
+        try:
+            start = timezone.now() - timedelta(seconds=n)
+            batch = []
+            for i in range(n):
+                batch.append(
+                    Ticket(
+                        title=f"Ticket {i}",
+                        description="synthetic ticket for pagination benchmark",
+                        created_by=user,
+                        created_at=start + timedelta(seconds=i),
+                    )
+                )
+                if len(batch) == batch_size:
+                    Ticket.objects.bulk_create(batch)
+                    batch = []
+            if batch:
+                Ticket.objects.bulk_create(batch)
+        finally:
+            field.auto_now_add = True
+
+    def _measure(self, run, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            response = run()
+            timings.append(time.perf_counter() - start)
+            if response.status_code != 200:
+                raise CommandError(f"HTTP {response.status_code}: {response.data}")
+        ms = np.asarray(timings) * 1000
+        return np.percentile(ms, 50), np.percentile(ms, 99)
@@ -0,0 +1,72 @@
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tickets.models import Ticket
+from tickets.serializers import TicketReadSerializer, TicketSerializer
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        "Micro-benchmark della serializzazione di una pagina di ticket: "
+        "TicketSerializer (ModelSerializer) vs TicketReadSerializer, in ticket/s"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[20, 100, 1000],
+            help="Dimensioni di pagina da misurare (default: 20 100 1000)",
+        )
+        parser.add_argument(
+            "--tickets",
+            type=int,
+            default=50_000,
+            help="Ticket serializzati per misura, ripetendo la pagina (default: 50000)",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="Misure per caso, si tiene la migliore (default: 3)")
+
+    def handle(self, *args, **options):
+        # ticket in memoria con created_by già risolto (come con select_related): si misura
+        # solo la serializzazione, senza query
+        author = User(id=1, username="bench")
+        now = timezone.now()
+        pool = [
+            Ticket(
+                id=i + 1,
+                title=f"Ticket {i}",
+                description="synthetic ticket for serializer benchmark",
+                status="RESOLVED" if i % 4 == 0 else "OPEN",
+                priority="MEDIUM",
+                category="bug",
+                created_by=author,
+                assigned_to_id=1 if i % 2 else None,
+                created_at=now - timedelta(hours=i),
+                updated_at=now,
+                resolved_at=now if i % 4 == 0 else None,
+            )
+            for i in range(max(options["sizes"]))
+        ]
+
+        for size in options["sizes"]:
+            page = pool[:size]
+            pages = max(1, options["tickets"] // size)
+            rates = {}
+            for label, serializer_class in (("ModelSerializer", TicketSerializer), ("read", TicketReadSerializer)):
+                best = min(self._measure(serializer_class, page, pages) for _ in range(options["repeat"]))
+                rates[label] = size * pages / best
+                self.stdout.write(f"page={size:<5d} {label:<16} {rates[label]:12,.0f} ticket/s")
+            self.stdout.write(f"page={size:<5d} speedup          {rates['read'] / rates['ModelSerializer']:12.1f}x")
+
+    def _measure(self, serializer_class, page, pages):
+        start = time.perf_counter()
+        for _ in range(pages):
+            serializer_class(page, many=True).data
+        return time.perf_counter() - start
@@ -0,0 +1,140 @@
+import multiprocessing
+import resource
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+WORDS = (
+    "invoice payment card refund password login account error crash dashboard "
+    "export csv dark mode sso pricing feedback mobile app search email"
+).split()
+
+# modalità misurate, ognuna in un processo separato (ru_maxrss è il picco dell'intero processo)
+MODES = ("extract materialized", "extract streaming", "fit materialized", "fit streaming")
+
+
+def _legacy_rows():
+    from tickets.ml_utils import _build_text, _training_queryset
+
+    # estrazione "vecchia": istanze complete del model + liste in memoria
+    texts, labels = [], []
+    for t in _training_queryset():
+        texts.append(_build_text(t.title, t.description))
+        labels.append(t.category)
+    return zip(texts, labels)
+
+
+def _consume(rows):
+    return sum(len(text) for text, _ in rows)
+
+
+def _worker(mode, results):
+    # processo "spawn": Django va inizializzato qui, prima di importare i model
+    import django
+
+    django.setup()
+    from tickets.ml_utils import fit_pipeline, iter_training_data
+
+    runs = {
+        "baseline": lambda: None,
+        # solo estrazione: quanto costa portare i dati fino al vectorizer
+        "extract materialized": lambda: _consume(_legacy_rows()),
+        "extract streaming": lambda: _consume(iter_training_data()),
+        # estrazione + fit completo (vocabolario TF-IDF e classificatore inclusi)
+        "fit materialized": lambda: fit_pipeline(_legacy_rows()),
+        "fit streaming": lambda: fit_pipeline(iter_training_data()),
+    }
+    start = time.perf_counter()
+    runs[mode]()
+    elapsed = time.perf_counter() - start
+    # ru_maxrss è in KB su Linux
+    results.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, elapsed))
+
+
+class Command(BaseCommand):
+    help = (
+        "Misura picco di memoria (RSS, un processo per modalità) e tempo del training: "
+        "estrazione completa del queryset vs estrazione in streaming (values_list + iterator)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--n",
+            type=int,
+            default=100_000,
+            help=(
+                "Ticket sintetici da inserire (cancellati a fine benchmark). "
+                "0 = misura sulla tabella esistente."
+            ),
+        )
+        parser.add_argument(
+            "--skip-legacy",
+            action="store_true",
+            help="Misura solo l'estrazione in streaming (utile su tabelle molto grandi)",
+        )
+
+    def handle(self, *args, **options):
+        from tickets.ml_utils import _training_queryset
+
+        # i processi di misura hanno una loro connessione: i ticket sintetici devono
+        # essere committati (non basta una transazione annullata come prima)
+        inserted = self._insert(options["n"]) if options["n"] else None
+        try:
+            total = _training_queryset().count()
+            self.stdout.write(f"training rows: {total}")
+
+            baseline, _ = self._run("baseline")
+            self.stdout.write(f"{'baseline':<21} peak RSS={baseline / 1024:8.1f} MB")
+            for mode in MODES:
+                if options["skip_legacy"] and mode.endswith("materialized"):
+                    continue
+                peak, elapsed = self._run(mode)
+                self.stdout.write(
+                    f"{mode:<21} peak RSS={peak / 1024:8.1f} MB "
+                    f"(+{(peak - baseline) / 1024:7.1f} MB) time={elapsed:6.1f}s"
+                )
+        finally:
+            if inserted is not None:
+                # DELETE diretto, senza signal: i ticket sintetici non sono mai entrati
+                # nel rollup giornaliero né nell'indice di similarità (bulk_create)
+                inserted._raw_delete(inserted.db)
+
+    def _run(self, mode):
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        proc = ctx.Process(target=_worker, args=(mode, results))
+        proc.start()
+        result = results.get()
+        proc.join()
+        return result
+
+    def _insert(self, n, batch_size=5000):
+        """
+        Inserisce n ticket sintetici e ritorna il queryset per cancellarli.
+        """
+        from tickets.models import Ticket
+
+        User = get_user_model()
+        user, _ = User.objects.get_or_create(username="bench")
+        last_id = Ticket.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        categories = [c[0] for c in Ticket.CATEGORY_CHOICES]
+        batch = []
+        for i in range(n):
+            category = categories[i % len(categories)]
+            # ~1 KB di testo, come una tipica email di supporto
+            words = " ".join(WORDS[(i * k) % len(WORDS)] for k in range(1, 150))
+            batch.append(
+                Ticket(
+                    title=f"Ticket {i} about {category}",
+                    description=f"{category} {words}",
+                    category=category,
+                    created_by=user,
+                )
+            )
+            if len(batch) == batch_size:
+                Ticket.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Ticket.objects.bulk_create(batch)
+        return Ticket.objects.filter(id__gt=last_id, created_by=user)
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tickets.models import TicketDailyStats
+
+
+class Command(BaseCommand):
+    help = (
+        "Ricalcola il rollup giornaliero TicketDailyStats dalla tabella dei ticket "
+        "(tutto, o solo gli ultimi N giorni)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Ricalcola solo gli ultimi N giorni (default: tutta la tabella)",
+        )
+
+    def handle(self, *args, **options):
+        dates = None
+        if options["days"] is not None:
+            today = timezone.localdate()
+            dates = [today - timedelta(days=i) for i in range(options["days"] + 1)]
+        rows = TicketDailyStats.reconcile(dates)
+        self.stdout.write(self.style.SUCCESS(f"Daily stats rows: {rows}"))
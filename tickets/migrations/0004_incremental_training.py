@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0003_trainingjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingjob',
+            name='mode',
+            field=models.CharField(choices=[('full', 'Full retrain'), ('incremental', 'Incremental update')], default='full', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
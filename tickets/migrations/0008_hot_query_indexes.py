@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0007_ordering_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='ticket',
+            name='assigned_to',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='assigned_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='category',
+            field=models.CharField(choices=[('billing', 'Billing'), ('account', 'Account'), ('bug', 'Bug'), ('feature', 'Feature'), ('other', 'Other')], default='other', help_text='Categoria funzionale del ticket (es. billing, bug, question). Predetta anche dal modello ML.', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        migrations.AlterField(
+            model_name='ticket',
+            name='status',
+            field=models.CharField(choices=[('OPEN', 'Open'), ('IN_PROGRESS', 'In progress'), ('RESOLVED', 'Resolved'), ('CLOSED', 'Closed')], default='OPEN', help_text='Stato del ticket nel workflow (open, in_progress, resolved, ...)', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['created_at', 'category'], name='ticket_created_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(condition=models.Q(('resolved_at__isnull', False)), fields=['created_at', 'resolved_at'], name='ticket_resolved_created_idx'),
+        ),
+    ]
@@ -0,0 +1,104 @@
+from django.db import migrations
+
+# SQL copiato qui (non importato da tickets/search.py): la migration deve
+# restare eseguibile anche quando il codice dell'app cambia. I trigger SQLite
+# sono ricreati dopo ogni migrate da search.ensure_sqlite_triggers, con la sua copia.
+
+POSTGRES_INSTALL = [
+    "ALTER TABLE tickets_ticket ADD COLUMN search_vector tsvector",
+    """
+    CREATE FUNCTION tickets_ticket_search_vector_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER tickets_ticket_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON tickets_ticket
+    FOR EACH ROW EXECUTE FUNCTION tickets_ticket_search_vector_update()
+    """,
+    # backfill dei ticket esistenti (il trigger scatta sull'UPDATE di title)
+    "UPDATE tickets_ticket SET title = title",
+    "CREATE INDEX tickets_ticket_search_vector_gin ON tickets_ticket USING gin (search_vector)",
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS tickets_ticket_search_vector_trigger ON tickets_ticket",
+    "DROP FUNCTION IF EXISTS tickets_ticket_search_vector_update()",
+    "ALTER TABLE tickets_ticket DROP COLUMN IF EXISTS search_vector",
+]
+
+# tabella FTS5 "external content" con i suoi trigger (vedi documentazione SQLite FTS5)
+SQLITE_INSTALL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS tickets_ticket_fts USING fts5(
+        title, description, content='tickets_ticket', content_rowid='id', tokenize='porter unicode61'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_ticket_fts_ai AFTER INSERT ON tickets_ticket BEGIN
+        INSERT INTO tickets_ticket_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_ticket_fts_ad AFTER DELETE ON tickets_ticket BEGIN
+        INSERT INTO tickets_ticket_fts(tickets_ticket_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS tickets_ticket_fts_au AFTER UPDATE OF title, description ON tickets_ticket BEGIN
+        INSERT INTO tickets_ticket_fts(tickets_ticket_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tickets_ticket_fts(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    "INSERT INTO tickets_ticket_fts(tickets_ticket_fts) VALUES ('rebuild')",
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS tickets_ticket_fts_ai",
+    "DROP TRIGGER IF EXISTS tickets_ticket_fts_ad",
+    "DROP TRIGGER IF EXISTS tickets_ticket_fts_au",
+    "DROP TABLE IF EXISTS tickets_ticket_fts",
+]
+
+
+def _execute(schema_editor, statements):
+    for sql in statements:
+        schema_editor.execute(sql, params=None)
+
+
+def install(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _execute(schema_editor, POSTGRES_INSTALL)
+    elif vendor == "sqlite":
+        _execute(schema_editor, SQLITE_INSTALL)
+
+
+def uninstall(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == "postgresql":
+        _execute(schema_editor, POSTGRES_UNINSTALL)
+    elif vendor == "sqlite":
+        _execute(schema_editor, SQLITE_UNINSTALL)
+
+
+class Migration(migrations.Migration):
+    """
+    Ricerca full-text: tsvector + trigger + indice GIN su PostgreSQL,
+    tabella FTS5 con trigger su SQLite (letti da tickets/search.py).
+    """
+
+    dependencies = [
+        ('tickets', '0008_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
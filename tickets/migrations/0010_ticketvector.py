@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0009_ticket_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketVector',
+            fields=[
+                ('ticket', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='vector', serialize=False, to='tickets.ticket')),
+                ('model_version', models.PositiveIntegerField(db_index=True)),
+                ('indices', models.BinaryField()),
+                ('values', models.BinaryField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:12
+
+from django.db import migrations, models
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.db.models.functions import TruncDate
+
+
+def populate(apps, schema_editor):
+    # stessa aggregazione di TicketDailyStats.reconcile(), sui model storici
+    Ticket = apps.get_model('tickets', 'Ticket')
+    TicketDailyStats = apps.get_model('tickets', 'TicketDailyStats')
+    resolution = ExpressionWrapper(F('resolved_at') - F('created_at'), output_field=DurationField())
+    aggregated = (
+        Ticket.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('day', 'category', 'status')
+        .annotate(
+            created=Count('id'),
+            resolved=Count('resolved_at'),
+            seconds=Sum(resolution, filter=Q(resolved_at__isnull=False)),
+        )
+    )
+    TicketDailyStats.objects.bulk_create(
+        [
+            TicketDailyStats(
+                date=row['day'],
+                category=row['category'],
+                status=row['status'],
+                created_count=row['created'],
+                resolved_count=row['resolved'],
+                resolution_seconds=row['seconds'].total_seconds() if row['seconds'] else 0.0,
+            )
+            for row in aggregated
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0010_ticketvector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TicketDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('category', models.CharField(choices=[('billing', 'Billing'), ('account', 'Account'), ('bug', 'Bug'), ('feature', 'Feature'), ('other', 'Other')], max_length=20)),
+                ('status', models.CharField(choices=[('OPEN', 'Open'), ('IN_PROGRESS', 'In progress'), ('RESOLVED', 'Resolved'), ('CLOSED', 'Closed')], max_length=20)),
+                ('created_count', models.IntegerField(default=0)),
+                ('resolved_count', models.IntegerField(default=0)),
+                ('resolution_seconds', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['date', 'category', 'status'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'category', 'status'), name='unique_daily_stats')],
+            },
+        ),
+        migrations.RunPython(populate, migrations.RunPython.noop),
+    ]
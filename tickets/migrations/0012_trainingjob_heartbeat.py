@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:53
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def fail_duplicate_active_jobs(apps, schema_editor):
+    # prima del vincolo: per ogni tipo resta attivo solo il job più vecchio
+    TrainingJob = apps.get_model('tickets', 'TrainingJob')
+    active = TrainingJob.objects.filter(status__in=['PENDING', 'RUNNING']).order_by('created_at', 'id')
+    seen = set()
+    duplicates = []
+    for job_id, mode in active.values_list('id', 'mode'):
+        if mode in seen:
+            duplicates.append(job_id)
+        seen.add(mode)
+    TrainingJob.objects.filter(id__in=duplicates).update(
+        status='FAILED', error='Duplicate active job', finished_at=timezone.now()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tickets', '0011_ticketdailystats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainingjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fail_duplicate_active_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='trainingjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['PENDING', 'RUNNING'])), fields=('mode',), name='unique_active_training_job'),
+        ),
+    ]
@@ -2,26 +2,72 @@
 Utility per il modello di ML:
 
 - training (TF-IDF + Logistic Regression) sulla tabella Ticket
-- salvataggio/caricamento del modello
+- training incrementale (HashingVectorizer + SGDClassifier.partial_fit)
+- salvataggio/caricamento del modello tramite registro versionato (ModelVersion)
+  con hot-swap della versione attiva in tutti i worker
 - predizione categoria e ricerca ticket simili
+- indice TF-IDF persistente per la ricerca dei ticket simili
+  (esatto oppure approssimato, vedi SIMILARITY_BACKEND e tickets/ann.py)
 """
+import copy
+import hashlib
+import logging
+import os
+import shutil
+import threading
+import time
+from datetime import timedelta
+from itertools import islice
 from pathlib import Path
 
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
 
-from .models import Ticket
+from .ann import SvdLshIndex
+from .compact_model import load_compact, save_compact
+from .models import DeletedTicket, ModelVersion, Ticket, TicketDailyStats, TicketVector, add_delta
+from .search import lexical_candidates
 from sklearn.pipeline import Pipeline
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 import joblib
+import numpy as np
+import scipy.sparse as sp
 
 
+logger = logging.getLogger(__name__)
+
 MODEL_DIR = Path(settings.BASE_DIR) / "ml" / "artifacts"
+# Ogni versione del registro ha la sua directory MODEL_DIR/vNNNN con questi file;
+# il classificatore è salvato nel formato compatto caricabile in mmap (vedi compact_model.py)
+MODEL_FILENAME = "ticket_classifier"
+INDEX_FILENAME = "similarity_index.joblib"
+ANN_FILENAME = "ann_index.joblib"
+# Percorso pre-registro: usato solo se non esiste ancora nessuna ModelVersion
 MODEL_PATH = MODEL_DIR / "ticket_classifier.joblib"
+ONLINE_MODEL_PATH = MODEL_DIR / "ticket_classifier_online.joblib"
 
-# Semplice cache in memoria del modello già caricato
+# Cache in memoria del modello già caricato, con versione e directory degli artifact
 _cached_model = None
+_cached_version = None
+_cached_dir = MODEL_DIR
+# ultimo controllo (time.monotonic) della versione attiva sul DB
+_checked_at = 0.0
+# un solo thread per processo deserializza un nuovo modello
+_load_lock = threading.Lock()
+# Cache in memoria dell'indice di similarità (vedi SimilarityIndex)
+_cached_index = None
+# Cache in memoria dell'indice ANN (solo con SIMILARITY_BACKEND = "lsh")
+_cached_ann = None
+# ultimo riallineamento (time.monotonic) degli indici in memoria con la tabella Ticket
+_index_checked_at = 0.0
+# Cache in memoria del modello incrementale: {"pipeline": ..., "checkpoint": datetime}
+_cached_online = None
+# mtime del file del modello incrementale caricato e ultimo controllo
+_online_mtime = None
+_online_checked_at = 0.0
 
 
 def _build_text(title, description) -> str:
@@ -36,67 +82,405 @@ def _build_text(title, description) -> str:
     return title or desc
 
 
-def get_training_data():
+TRAINING_CHUNK_SIZE = 2000
+
+
+def _training_queryset():
+    return Ticket.objects.exclude(category__isnull=True).exclude(category="")
+
+
+def iter_training_data(chunk_size=TRAINING_CHUNK_SIZE):
     """
-    Estrae dai Ticket solo quelli con category valorizzata,
-    e costruisce (texts, labels) per il training.
+    Estrae dai Ticket solo quelli con category valorizzata e genera
+    le coppie (text, label) per il training, in streaming: legge solo
+    title/description/category a blocchi (cursori server-side su PostgreSQL)
+    senza istanziare i model né tenere in memoria l'intero queryset.
     """
-    qs = Ticket.objects.exclude(category__isnull=True).exclude(category="")
+    rows = _training_queryset().values_list("title", "description", "category")
+    for title, description, category in rows.iterator(chunk_size=chunk_size):
+        yield _build_text(title, description), category
+
 
-    texts = []
+def fit_pipeline(rows):
+    """
+    Allena TF-IDF + Logistic Regression consumando `rows` (iterabile di
+    (text, label)) in un solo passaggio: i testi non vengono mai tenuti
+    tutti in memoria, solo la matrice sparsa e le label.
+    Ritorna (pipeline, labels).
+    """
     labels = []
-    for t in qs:
-        texts.append(_build_text(t.title, t.description))
-        labels.append(t.category)
+    # un solo oggetto stringa per categoria (le righe del DB ne creano uno per ticket)
+    canonical = {}
 
-    return texts, labels
+    def texts():
+        for text, label in rows:
+            labels.append(canonical.setdefault(label, label))
+            yield text
 
+    tfidf = TfidfVectorizer(ngram_range=(1, 2), min_df=1)
+    # class_weight="balanced" aiuta se le categorie sono sbilanciate
+    clf = LogisticRegression(max_iter=1000, class_weight="balanced")
 
-def train_model():
+    features = tfidf.fit_transform(texts())
+    clf.fit(features, labels)
+    return Pipeline([("tfidf", tfidf), ("clf", clf)]), labels
+
+
+def train_model(progress=None):
     """
     Allena un modello TF-IDF + Logistic Regression e lo salva su disco.
     Ritorna alcune info riassuntive per l'endpoint /analytics.
+
+    `progress`, se passato, viene chiamato come progress(frazione, fase)
+    ad ogni fase del training (usato dai job in background).
     """
-    texts, labels = get_training_data()
+    report = progress or (lambda fraction, stage: None)
+
+    report(0.0, "loading data")
     # nessun dato o una sola classe -> non ha senso allenare
-    if not texts or len(set(labels)) < 2:
+    # (controllo fatto sul DB, prima di leggere i testi)
+    if _training_queryset().values("category").distinct().count() < 2:
         return None
 
-    pipeline = Pipeline(
+    report(0.2, "fitting model")
+    pipeline, labels = fit_pipeline(iter_training_data())
+
+    report(0.6, "saving model")
+    version = (ModelVersion.objects.aggregate(Max("version"))["version__max"] or 0) + 1
+    # gli artifact vengono scritti in una directory temporanea e pubblicati
+    # con un rename: nessun worker può vedere una versione a metà
+    tmp_dir = MODEL_DIR / f".v{version:04d}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    save_compact(pipeline, tmp_dir / MODEL_FILENAME)
+
+    # gli indici dipendono dal vocabolario del tfidf: vanno ricostruiti ad ogni training
+    report(0.7, "building similarity index")
+    index = build_similarity_index(pipeline.named_steps["tfidf"], tmp_dir)
+    # vettori per ticket nel DB, letti in blocco da catch-up e ricerche (vedi load_ticket_vectors)
+    report(0.8, "storing ticket vectors")
+    store_ticket_vectors(index.ids, index.matrix, version)
+    ann = None
+    if _similarity_backend() == "lsh":
+        ann = build_ann_index(index, tmp_dir)
+
+    version_dir = MODEL_DIR / f"v{version:04d}"
+    shutil.rmtree(version_dir, ignore_errors=True)
+    os.replace(tmp_dir, version_dir)
+
+    classes = sorted(set(labels))
+    info = {
+        "version": version,
+        "n_samples": len(labels),
+        "n_classes": len(classes),
+        "classes": classes,
+        "model_path": str(version_dir / MODEL_FILENAME),
+    }
+
+    report(0.9, "activating version")
+    with transaction.atomic():
+        ModelVersion.objects.filter(is_active=True).update(is_active=False)
+        ModelVersion.objects.create(
+            version=version,
+            artifact_dir=version_dir.name,
+            checksum=_checksum(version_dir / MODEL_FILENAME),
+            size=_artifact_size(version_dir / MODEL_FILENAME),
+            metrics=info,
+            is_active=True,
+        )
+
+    # anche questo processo passa al formato compatto: il Pipeline sklearn
+    # (con il vocabolario come dict) viene liberato a fine funzione
+    _set_active(version, version_dir, load_compact(version_dir / MODEL_FILENAME))
+    global _cached_index, _cached_ann, _index_checked_at
+    _cached_index, _cached_ann = index, ann
+    _index_checked_at = time.monotonic()
+    prune_deleted_tickets()
+    return info
+
+
+def _checksum(path):
+    """
+    sha256 di un file, o di tutti i file di una directory (nome + contenuto, in ordine).
+    """
+    digest = hashlib.sha256()
+    files = sorted(p for p in path.iterdir() if p.is_file()) if path.is_dir() else [path]
+    for file in files:
+        digest.update(file.name.encode())
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _artifact_size(path):
+    """
+    Dimensione in byte di un file, o di tutti i file di una directory: solo stat(),
+    senza leggere il contenuto.
+    """
+    files = [p for p in path.iterdir() if p.is_file()] if path.is_dir() else [path]
+    return sum(file.stat().st_size for file in files)
+
+
+def _verify_artifact(version):
+    """
+    Verifica lo sha256 dell'artifact di una versione e ne registra la dimensione
+    (le versioni create prima della colonna size non ce l'hanno). Ritorna False
+    se l'artifact manca o non corrisponde al checksum.
+    """
+    path = MODEL_DIR / version.artifact_dir / MODEL_FILENAME
+    if not path.exists() or _checksum(path) != version.checksum:
+        logger.error("Model version %s: missing or corrupted artifact %s", version.version, path)
+        return False
+    if version.size is None:
+        version.size = _artifact_size(path)
+        ModelVersion.objects.filter(pk=version.pk).update(size=version.size)
+    return True
+
+
+def _dump(obj, path):
+    """
+    joblib.dump atomico (file temporaneo + rename): gli altri worker non
+    leggono mai un file scritto a metà.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    joblib.dump(obj, tmp)
+    os.replace(tmp, path)
+
+
+def _set_active(version, artifact_dir, model):
+    global _cached_model, _cached_version, _cached_dir, _checked_at, _cached_index, _cached_ann
+    _cached_model = model
+    _cached_version = version
+    _cached_dir = artifact_dir
+    _checked_at = time.monotonic()
+    # gli indici appartengono alla versione precedente
+    _cached_index = None
+    _cached_ann = None
+
+
+def _artifact_dir():
+    return _cached_dir
+
+
+def load_model():
+    """
+    Ritorna il modello della versione attiva nel registro.
+
+    La versione attiva viene riletta dal DB al massimo ogni ML_REGISTRY_TTL secondi:
+    se è cambiata (training o rollback fatto da un altro worker) il nuovo modello
+    viene caricato e sostituito a caldo. Il lock garantisce che i thread concorrenti
+    dello stesso processo non deserializzino lo stesso modello due volte.
+    Lo sha256 è verificato al training e all'attivazione: qui si confronta solo
+    la dimensione dell'artifact, per non rileggerlo tenendo il lock.
+    Se il registro è vuoto usa il vecchio MODEL_PATH, se esiste; altrimenti ritorna None.
+    """
+    global _checked_at
+    ttl = getattr(settings, "ML_REGISTRY_TTL", 5.0)
+    if _cached_model is not None and time.monotonic() - _checked_at < ttl:
+        return _cached_model
+
+    with _load_lock:
+        # un altro thread potrebbe aver appena fatto il controllo
+        if _cached_model is not None and time.monotonic() - _checked_at < ttl:
+            return _cached_model
+
+        active = ModelVersion.objects.filter(is_active=True).first()
+        _checked_at = time.monotonic()
+
+        if active is None:
+            if _cached_model is None and MODEL_PATH.exists():
+                _set_active(None, MODEL_DIR, joblib.load(MODEL_PATH))
+            return _cached_model
+
+        if active.version != _cached_version:
+            artifact_dir = MODEL_DIR / active.artifact_dir
+            path = artifact_dir / MODEL_FILENAME
+            # versione registrata prima della colonna size: sha256 una volta sola
+            if active.size is None and not _verify_artifact(active):
+                return _cached_model
+            if not path.exists() or _artifact_size(path) != active.size:
+                logger.error("Model version %s: missing or corrupted artifact %s", active.version, path)
+                return _cached_model
+            # array in mmap: le pagine sono condivise tra i worker tramite la page cache
+            _set_active(active.version, artifact_dir, load_compact(path))
+
+        return _cached_model
+
+
+def activate_model_version(version):
+    """
+    Rende attiva una versione già presente nel registro (es. rollback).
+    Gli altri worker la caricano entro ML_REGISTRY_TTL secondi.
+    Ritorna False se la versione non esiste; solleva ValueError se il suo
+    artifact manca o non corrisponde al checksum.
+    """
+    global _checked_at
+    target = ModelVersion.objects.filter(version=version).first()
+    if target is None:
+        return False
+    # sha256 verificato qui, una volta, invece che a ogni hot-swap nei worker
+    if not _verify_artifact(target):
+        raise ValueError(f"Model version {version}: missing or corrupted artifact")
+    with transaction.atomic():
+        if not ModelVersion.objects.filter(version=version).exists():
+            return False
+        ModelVersion.objects.filter(is_active=True).update(is_active=False)
+        ModelVersion.objects.filter(version=version).update(is_active=True)
+    # forza il controllo alla prossima richiesta in questo processo
+    _checked_at = 0.0
+    return True
+
+
+# bucket dell'HashingVectorizer del modello incrementale: coef_ è (classi x bucket) float64,
+# riscritto a ogni run incrementale e caricato da ogni worker. Con 5 classi 2**18 bucket
+# sono ~10 MB (2**20 erano ~42 MB), con collisioni ancora trascurabili per testi brevi
+ONLINE_N_FEATURES = 2**18
+
+
+def _new_online_pipeline():
+    return Pipeline(
         [
-            ("tfidf", TfidfVectorizer(ngram_range=(1, 2), min_df=1)),
-            # class_weight="balanced" aiuta se le categorie sono sbilanciate
-            ("clf", LogisticRegression(max_iter=1000, class_weight="balanced")),
+            # stateless: nessun vocabolario da riallenare, i nuovi termini finiscono
+            # direttamente nel loro bucket
+            (
+                "hashing",
+                HashingVectorizer(ngram_range=(1, 2), n_features=ONLINE_N_FEATURES, alternate_sign=False),
+            ),
+            # log_loss -> predict_proba disponibile come per la Logistic Regression
+            ("clf", SGDClassifier(loss="log_loss", alpha=1e-5, random_state=0)),
         ]
     )
-    pipeline.fit(texts, labels)
 
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    joblib.dump(pipeline, MODEL_PATH)
 
-    global _cached_model
-    _cached_model = pipeline
+def load_online_model():
+    """
+    Carica lo stato del modello incrementale (pipeline + checkpoint)
+    da cache o da disco. Ritorna None se non è mai stato allenato.
+
+    Ogni ML_REGISTRY_TTL secondi confronta l'mtime del file con quello caricato,
+    così i worker vedono gli aggiornamenti fatti dal job incrementale.
+    """
+    global _cached_online, _online_mtime, _online_checked_at
+    ttl = getattr(settings, "ML_REGISTRY_TTL", 5.0)
+    if _cached_online is not None and time.monotonic() - _online_checked_at < ttl:
+        return _cached_online
+
+    with _load_lock:
+        _online_checked_at = time.monotonic()
+        try:
+            mtime = ONLINE_MODEL_PATH.stat().st_mtime_ns
+        except FileNotFoundError:
+            return _cached_online
+        if _cached_online is None or mtime != _online_mtime:
+            _cached_online = joblib.load(ONLINE_MODEL_PATH)
+            _online_mtime = mtime
+        return _cached_online
+
+
+def train_incremental(progress=None, chunk_size=TRAINING_CHUNK_SIZE):
+    """
+    Aggiorna il modello incrementale con i soli ticket creati o ricategorizzati
+    (updated_at) dopo l'ultimo checkpoint, con partial_fit a blocchi.
+
+    Le categorie scritte dal modello stesso (ml_predict, predict_batch) non
+    aggiornano updated_at e quindi non rientrano nel training.
+
+    partial_fit lavora su una copia: il modello in cache continua a servire le
+    predizioni (ML_CLASSIFIER = "online") e viene sostituito solo a fine training.
+    Senza ticket nuovi il file non viene riscritto (i worker non lo ricaricano).
+    Ritorna None se il modello non esiste ancora e non ci sono dati.
+    """
+    report = progress or (lambda fraction, stage: None)
+
+    state = load_online_model()
+    if state is None:
+        state = {"pipeline": _new_online_pipeline(), "checkpoint": None}
+    pipeline, checkpoint = state["pipeline"], state["checkpoint"]
+    all_classes = np.array([c[0] for c in Ticket.CATEGORY_CHOICES])
+
+    qs = _training_queryset()
+    if checkpoint is not None:
+        qs = qs.filter(updated_at__gt=checkpoint)
+    rows = (
+        qs.order_by("updated_at", "id")
+        .values_list("title", "description", "category", "updated_at")
+        .iterator(chunk_size=chunk_size)
+    )
+
+    report(0.0, "partial fit")
+    n_samples = 0
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        if n_samples == 0:
+            pipeline = copy.deepcopy(pipeline)
+            hashing, clf = pipeline.named_steps["hashing"], pipeline.named_steps["clf"]
+        texts = [_build_text(title, desc) for title, desc, _, _ in chunk]
+        labels = [category for _, _, category, _ in chunk]
+        clf.partial_fit(hashing.transform(texts), labels, classes=all_classes)
+        checkpoint = chunk[-1][3]
+        n_samples += len(chunk)
+
+    if n_samples == 0:
+        if state["checkpoint"] is None:
+            return None
+        return {
+            "mode": "incremental",
+            "n_samples": 0,
+            "checkpoint": checkpoint.isoformat(),
+            "model_path": str(ONLINE_MODEL_PATH),
+        }
+
+    report(0.9, "saving model")
+    global _cached_online, _online_mtime, _online_checked_at
+    _cached_online = {"pipeline": pipeline, "checkpoint": checkpoint}
+    _dump(_cached_online, ONLINE_MODEL_PATH)
+    _online_mtime = ONLINE_MODEL_PATH.stat().st_mtime_ns
+    _online_checked_at = time.monotonic()
 
     return {
-        "n_samples": len(texts),
-        "n_classes": len(set(labels)),
-        "classes": sorted(set(labels)),
-        "model_path": str(MODEL_PATH),
+        "mode": "incremental",
+        "n_samples": n_samples,
+        "checkpoint": checkpoint.isoformat(),
+        "model_path": str(ONLINE_MODEL_PATH),
     }
 
 
-def load_model():
+def load_classifier():
     """
-    Carica il modello da cache se disponibile, altrimenti da disco.
-    Se il file non esiste, ritorna None.
+    Modello usato per le predizioni di categoria: quello incrementale se
+    ML_CLASSIFIER = "online" ed è già stato allenato, altrimenti quello batch.
     """
-    global _cached_model
-    if _cached_model is not None:
-        return _cached_model
-    if not MODEL_PATH.exists():
+    if getattr(settings, "ML_CLASSIFIER", "batch") == "online":
+        state = load_online_model()
+        if state is not None:
+            return state["pipeline"]
+    return load_model()
+
+
+def predict_categories(texts):
+    """
+    Predice la categoria per una lista di testi con una sola chiamata
+    a predict_proba. Ritorna (categorie, confidenze) come liste;
+    le confidenze sono None se il modello non supporta predict_proba.
+    Se il modello non esiste, ritorna None.
+    """
+    model = load_classifier()
+    if model is None:
         return None
-    _cached_model = joblib.load(MODEL_PATH)
-    return _cached_model
+
+    proba = getattr(model, "predict_proba", None)
+    if proba:
+        probs = proba(texts)
+        best = probs.argmax(axis=1)
+        confidences = probs[np.arange(len(best)), best]
+        return model.classes_[best].tolist(), confidences.astype(float).tolist()
+    else:
+        # fallback se predict_proba non supportata
+        return model.predict(texts).tolist(), [None] * len(texts)
 
 
 def predict_category_for_ticket(ticket: Ticket):
@@ -104,61 +488,583 @@ def predict_category_for_ticket(ticket: Ticket):
     Predice la categoria di un singolo ticket usando il modello allenato.
     Se il modello non esiste, ritorna None.
     """
+    predictions = predict_categories([_build_text(ticket.title, ticket.description)])
+    if predictions is None:
+        return None
+    categories, confidences = predictions
+    return {"category": categories[0], "confidence": confidences[0]}
+
+
+def categorize_tickets(tickets):
+    """
+    Assegna la categoria predetta a una lista di ticket (anche non ancora salvati)
+    con una sola chiamata a predict_proba. Ritorna False se il modello non esiste.
+    """
+    predictions = predict_categories([_build_text(t.title, t.description) for t in tickets])
+    if predictions is None:
+        return False
+    for ticket, category in zip(tickets, predictions[0]):
+        ticket.category = category
+    return True
+
+
+PREDICT_BATCH_SIZE = 1000
+
+
+def predict_categories_for_queryset(qs, chunk_size=PREDICT_BATCH_SIZE):
+    """
+    Ricategorizza in blocco i ticket del queryset: legge solo id/title/description
+    a blocchi (keyset su id), fa una predict_proba per blocco e scrive le sole
+    categorie cambiate con bulk_update.
+    Ritorna un riepilogo con i conteggi, oppure None se il modello non esiste.
+    """
+    if load_classifier() is None:
+        return None
+
+    processed = 0
+    updated = 0
+    by_category = {}
+    last_id = 0
+    while True:
+        rows = list(
+            qs.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "title", "description", "category", "created_at", "status", "resolved_at")[
+                :chunk_size
+            ]
+        )
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        categories, _ = predict_categories([_build_text(title, desc) for _, title, desc, *_ in rows])
+        changed = []
+        # bulk_update non passa dai signal: il contributo al rollup si sposta a mano
+        deltas = {}
+        for (ticket_id, _, _, old_category, created_at, status, resolved_at), new_category in zip(rows, categories):
+            if new_category != old_category:
+                changed.append(Ticket(id=ticket_id, category=new_category))
+                old_key, (c, r, s) = TicketDailyStats.contribution(created_at, old_category, status, resolved_at)
+                add_delta(deltas, old_key, -c, -r, -s)
+                add_delta(deltas, (old_key[0], new_category, status), c, r, s)
+        if changed:
+            with transaction.atomic():
+                Ticket.objects.bulk_update(changed, ["category"], batch_size=chunk_size)
+                TicketDailyStats.apply_on_commit(deltas)
+
+        processed += len(rows)
+        updated += len(changed)
+        for category in categories:
+            by_category[category] = by_category.get(category, 0) + 1
+
+    return {"processed": processed, "updated": updated, "by_category": by_category}
+
+
+class SimilarityIndex:
+    """
+    Indice per la ricerca dei ticket simili: matrice sparsa TF-IDF
+    (una riga per ticket, già normalizzata L2 dal vectorizer) + mapping id <-> riga.
+
+    Gli aggiornamenti incrementali (create/update di un ticket) non riscrivono la
+    matrice: la vecchia riga viene marcata come non valida e quella nuova finisce
+    in un piccolo buffer "delta", fuso nella matrice principale (e salvato su disco)
+    quando supera COMPACT_EVERY righe.
+    """
+
+    COMPACT_EVERY = 256
+
+    def __init__(self, ids, matrix, synced_at):
+        # istante fino al quale l'indice è allineato con la tabella Ticket
+        self.synced_at = synced_at
+        self._reset(ids, matrix)
+
+    def _reset(self, ids, matrix):
+        self.ids = np.asarray(ids, dtype=np.int64)
+        self.matrix = sp.csr_matrix(matrix)
+        self.alive = np.ones(len(self.ids), dtype=bool)
+        self._rows = {int(ticket_id): row for row, ticket_id in enumerate(self.ids)}
+        self._delta_ids = []
+        self._delta_rows = []
+
+    def __len__(self):
+        return int(self.alive.sum()) + len(self._delta_ids)
+
+    def remove(self, ticket_id):
+        ticket_id = int(ticket_id)
+        row = self._rows.pop(ticket_id, None)
+        if row is not None:
+            self.alive[row] = False
+            return
+        if ticket_id in self._delta_ids:
+            pos = self._delta_ids.index(ticket_id)
+            del self._delta_ids[pos]
+            del self._delta_rows[pos]
+
+    def upsert(self, ticket_id, vector):
+        """
+        Inserisce (o sostituisce) il vettore TF-IDF di un ticket.
+        """
+        self.remove(ticket_id)
+        self._delta_ids.append(int(ticket_id))
+        self._delta_rows.append(sp.csr_matrix(vector))
+
+    @property
+    def needs_compaction(self):
+        return len(self._delta_ids) >= self.COMPACT_EVERY
+
+    def compact(self):
+        """
+        Fonde il buffer delta nella matrice principale eliminando le righe non valide.
+        """
+        if not self._delta_ids and self.alive.all():
+            return
+        blocks = [self.matrix[self.alive]] + self._delta_rows
+        ids = np.concatenate([self.ids[self.alive], np.asarray(self._delta_ids, dtype=np.int64)])
+        self._reset(ids, sp.vstack(blocks, format="csr"))
+
+    def scores(self, query_vec):
+        """
+        Cosine similarity tra query_vec e tutti i ticket indicizzati
+        (prodotto scalare sparso, i vettori sono già normalizzati).
+        Ritorna (ids, scores) come array NumPy.
+        """
+        ids = self.ids[self.alive]
+        scores = (self.matrix @ query_vec.T).toarray().ravel()[self.alive]
+        if self._delta_ids:
+            delta = sp.vstack(self._delta_rows, format="csr")
+            ids = np.concatenate([ids, np.asarray(self._delta_ids, dtype=np.int64)])
+            scores = np.concatenate([scores, (delta @ query_vec.T).toarray().ravel()])
+        return ids, scores
+
+    def save(self, path):
+        self.compact()
+        _dump({"ids": self.ids, "matrix": self.matrix, "synced_at": self.synced_at}, path)
+
+    @classmethod
+    def load(cls, path):
+        data = joblib.load(path)
+        return cls(data["ids"], data["matrix"], data["synced_at"])
+
+
+def _iter_ticket_texts(qs, chunk_size=2000):
+    """
+    Scorre (id, testo) dei ticket a blocchi, senza istanziare i model
+    né tenere in memoria l'intero queryset.
+    """
+    rows = qs.values_list("id", "title", "description").iterator(chunk_size=chunk_size)
+    for ticket_id, title, description in rows:
+        yield ticket_id, _build_text(title, description)
+
+
+def _vectorize(tfidf, qs):
+    ids = []
+
+    def texts():
+        for ticket_id, text in _iter_ticket_texts(qs):
+            ids.append(ticket_id)
+            yield text
+
+    matrix = tfidf.transform(texts())
+    return np.asarray(ids, dtype=np.int64), matrix
+
+
+def build_similarity_index(tfidf, artifact_dir):
+    """
+    Vettorizza tutti i ticket con il tfidf del modello allenato
+    e salva l'indice di similarità nella directory della versione.
+    """
+    synced_at = timezone.now()
+    ids, matrix = _vectorize(tfidf, Ticket.objects.order_by("id"))
+    index = SimilarityIndex(ids, matrix, synced_at)
+    index.save(artifact_dir / INDEX_FILENAME)
+    return index
+
+
+def load_similarity_index():
+    """
+    Carica l'indice da cache o da disco, allineandolo ai ticket modificati
+    o cancellati dopo il salvataggio. Se manca il file (es. modello allenato prima
+    dell'introduzione dell'indice) o è più vecchio dei DeletedTicket conservati
+    lo ricostruisce.
+    Ritorna None se il modello non è allenato.
+    """
+    global _cached_index, _index_checked_at
+    if _cached_index is not None:
+        _refresh_indexes()
+        return _cached_index
+
     model = load_model()
     if model is None:
         return None
+    tfidf = model.named_steps["tfidf"]
+    path = _artifact_dir() / INDEX_FILENAME
 
-    text = _build_text(ticket.title, ticket.description)
-    proba = getattr(model, "predict_proba", None)
-    if proba:
-        probs = proba([text])[0]
-        classes = model.classes_
-        max_idx = probs.argmax()
-        return {
-            "category": classes[max_idx],
-            "confidence": float(probs[max_idx]),
-        }
+    index = SimilarityIndex.load(path) if path.exists() else None
+    if index is None or index.synced_at < _tombstone_horizon():
+        # file mancante, o più vecchio dei DeletedTicket conservati: si ricostruisce
+        _cached_index = build_similarity_index(tfidf, _artifact_dir())
     else:
-        # fallback se predict_proba non supportata
-        pred = model.predict([text])[0]
-        return {"category": pred, "confidence": None}
+        if _catch_up(index, tfidf):
+            index.save(path)
+        _cached_index = index
+    _index_checked_at = time.monotonic()
+    return _cached_index
+
+
+def _tombstone_horizon():
+    # i DeletedTicket più vecchi di così vengono cancellati (vedi prune_deleted_tickets)
+    return timezone.now() - timedelta(days=getattr(settings, "SIMILARITY_TOMBSTONE_DAYS", 30))
+
 
+def prune_deleted_tickets():
+    """
+    Cancella i DeletedTicket più vecchi di SIMILARITY_TOMBSTONE_DAYS giorni:
+    un indice allineato prima di allora viene ricostruito invece che riallineato.
+    """
+    return DeletedTicket.objects.filter(deleted_at__lt=_tombstone_horizon()).delete()[0]
+
+
+def _catch_up(index, tfidf):
+    """
+    Riallinea un indice con i ticket creati o modificati (updated_at) e cancellati
+    (DeletedTicket) dopo il suo ultimo allineamento: due range query su colonne
+    indicizzate. Ritorna il numero di ticket riallineati.
+    """
+    synced_at = timezone.now()
+    changed = Ticket.objects.filter(updated_at__gt=index.synced_at).values_list("id", flat=True)
+    deleted = DeletedTicket.objects.filter(deleted_at__gt=index.synced_at).values_list("ticket_id", flat=True)
+    ids, matrix = load_ticket_vectors(list(changed), tfidf)
+    for row, ticket_id in enumerate(ids):
+        index.upsert(ticket_id, matrix[row])
+    deleted = list(deleted)
+    for ticket_id in deleted:
+        index.remove(ticket_id)
+    index.synced_at = synced_at
+    return len(ids) + len(deleted)
+
+
+def _refresh_indexes():
+    """
+    Le create/update/delete fatte da altri worker aggiornano solo gli indici in
+    memoria di quel processo: ogni ML_REGISTRY_TTL secondi gli indici già
+    caricati qui vengono riallineati con la tabella Ticket.
+    """
+    global _index_checked_at
+    ttl = getattr(settings, "ML_REGISTRY_TTL", 5.0)
+    if _cached_model is None or time.monotonic() - _index_checked_at < ttl:
+        return
+    _index_checked_at = time.monotonic()
+    tfidf = _cached_model.named_steps["tfidf"]
+    for index in (_cached_index, _cached_ann):
+        if index is not None:
+            _catch_up(index, tfidf)
+
+
+def _similarity_backend():
+    return getattr(settings, "SIMILARITY_BACKEND", "exact")
+
+
+def build_ann_index(index: SimilarityIndex, artifact_dir):
+    """
+    Costruisce l'indice ANN (TruncatedSVD + LSH) a partire dall'indice esatto
+    e lo salva accanto al modello.
+    """
+    index.compact()
+    ann = SvdLshIndex.build(
+        index.ids,
+        index.matrix,
+        index.synced_at,
+        n_components=getattr(settings, "SIMILARITY_ANN_COMPONENTS", 128),
+    )
+    save_ann_index(ann, artifact_dir / ANN_FILENAME)
+    return ann
+
+
+def save_ann_index(ann: SvdLshIndex, path):
+    ann.compact()
+    _dump(ann, path)
 
-def get_similar_tickets(ticket: Ticket, top_k=5, max_corpus=500):
+
+def load_ann_index():
     """
-    Trova i ticket più simili (in base a TF-IDF + cosine similarity) rispetto al ticket passato.
+    Come load_similarity_index, ma per il backend approssimato.
+    Se il file manca (o è troppo vecchio) lo costruisce dall'indice esatto.
     """
+    global _cached_ann, _index_checked_at
+    if _cached_ann is not None:
+        _refresh_indexes()
+        return _cached_ann
+
     model = load_model()
     if model is None:
-        return []
+        return None
+    path = _artifact_dir() / ANN_FILENAME
 
+    ann = joblib.load(path) if path.exists() else None
+    if ann is None or ann.synced_at < _tombstone_horizon():
+        _cached_ann = build_ann_index(load_similarity_index(), _artifact_dir())
+    else:
+        if _catch_up(ann, model.named_steps["tfidf"]):
+            save_ann_index(ann, path)
+        _cached_ann = ann
+    _index_checked_at = time.monotonic()
+    return _cached_ann
+
+
+def _upsert_indexes(ids, matrix):
+    # aggiorna gli indici in memoria (se caricati) con le righe di `matrix`
+    for row, ticket_id in enumerate(ids):
+        if _cached_index is not None:
+            _cached_index.upsert(ticket_id, matrix[row])
+        if _cached_ann is not None:
+            _cached_ann.upsert(ticket_id, matrix[row])
+    if _cached_index is not None and _cached_index.needs_compaction:
+        _cached_index.save(_artifact_dir() / INDEX_FILENAME)
+    if _cached_ann is not None and _cached_ann.needs_compaction:
+        save_ann_index(_cached_ann, _artifact_dir() / ANN_FILENAME)
+
+
+def update_ticket_vector(ticket: Ticket, created=False):
+    """
+    Dopo la creazione o la modifica di title/description di un ticket: una sola
+    transform aggiorna sia TicketVector sia gli indici in memoria.
+    Se il modello non è in memoria in questo processo il vettore salvato non è
+    più valido e viene cancellato (verrà ricalcolato da chi lo legge o dal backfill).
+    """
+    if _cached_model is None:
+        if not created:
+            TicketVector.objects.filter(ticket_id=ticket.pk).delete()
+        return
+    tfidf = _cached_model.named_steps["tfidf"]
+    vector = tfidf.transform([_build_text(ticket.title, ticket.description)])
+    if _cached_version is not None:
+        store_ticket_vectors([ticket.pk], vector, _cached_version)
+    _upsert_indexes([ticket.pk], vector)
+
+
+def index_tickets(tickets):
+    """
+    Come update_ticket_vector, ma per molti ticket appena creati (es. dopo
+    bulk_create): una sola transform per tutto il blocco.
+    """
+    if _cached_model is None or not tickets:
+        return
+    tfidf = _cached_model.named_steps["tfidf"]
+    ids = [t.pk for t in tickets]
+    matrix = tfidf.transform([_build_text(t.title, t.description) for t in tickets])
+    if _cached_version is not None:
+        store_ticket_vectors(ids, matrix, _cached_version)
+    _upsert_indexes(ids, matrix)
+
+
+VECTOR_BATCH_SIZE = 1000
+
+
+def store_ticket_vectors(ids, matrix, version, batch_size=VECTOR_BATCH_SIZE):
+    """
+    Salva in TicketVector (insert o update) le righe di `matrix` per i ticket `ids`,
+    calcolate con il tfidf della versione `version` del modello.
+    """
+    matrix = sp.csr_matrix(matrix)
+    for start in range(0, len(ids), batch_size):
+        vectors = []
+        for row in range(start, min(start + batch_size, len(ids))):
+            lo, hi = matrix.indptr[row], matrix.indptr[row + 1]
+            vectors.append(
+                TicketVector(
+                    ticket_id=int(ids[row]),
+                    model_version=version,
+                    indices=matrix.indices[lo:hi].astype(np.int32).tobytes(),
+                    values=matrix.data[lo:hi].astype(np.float32).tobytes(),
+                )
+            )
+        TicketVector.objects.bulk_create(
+            vectors,
+            update_conflicts=True,
+            unique_fields=["ticket"],
+            update_fields=["model_version", "indices", "values", "updated_at"],
+        )
+
+
+def _n_features(tfidf):
+    # CompactTfidf (modello attivo) oppure TfidfVectorizer (vecchio MODEL_PATH)
+    return tfidf.n_features if hasattr(tfidf, "n_features") else len(tfidf.vocabulary_)
+
+
+def load_ticket_vectors(ids, tfidf):
+    """
+    Matrice TF-IDF dei ticket `ids` (una riga per id, nello stesso ordine), letta
+    in blocco da TicketVector per la versione attiva del modello. I ticket senza
+    un vettore valido vengono vettorizzati al volo con `tfidf`.
+    Ritorna (ids, matrix); gli id di ticket inesistenti vengono scartati.
+    """
+    ids = [int(i) for i in ids]
+    rows = {}
+    for start in range(0, len(ids), VECTOR_BATCH_SIZE):
+        chunk = ids[start:start + VECTOR_BATCH_SIZE]
+        if _cached_version is not None:
+            stored = TicketVector.objects.filter(
+                ticket_id__in=chunk, model_version=_cached_version
+            ).values_list("ticket_id", "indices", "values")
+            for ticket_id, indices, values in stored:
+                rows[ticket_id] = (np.frombuffer(indices, dtype=np.int32), np.frombuffer(values, dtype=np.float32))
+
+        missing = [i for i in chunk if i not in rows]
+        if missing:
+            found, matrix = _vectorize(tfidf, Ticket.objects.filter(id__in=missing))
+            for row, ticket_id in enumerate(found.tolist()):
+                lo, hi = matrix.indptr[row], matrix.indptr[row + 1]
+                rows[ticket_id] = (matrix.indices[lo:hi], matrix.data[lo:hi])
+
+    present = [i for i in ids if i in rows]
+    indptr = np.zeros(len(present) + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(rows[i][0]) for i in present])
+    indices = np.concatenate([rows[i][0] for i in present]) if present else np.empty(0, dtype=np.int32)
+    data = np.concatenate([rows[i][1] for i in present]).astype(np.float64) if present else np.empty(0)
+    matrix = sp.csr_matrix((data, indices, indptr), shape=(len(present), _n_features(tfidf)))
+    return np.asarray(present, dtype=np.int64), matrix
+
+
+def backfill_ticket_vectors(chunk_size=TRAINING_CHUNK_SIZE, rebuild=False, progress=None):
+    """
+    Calcola e salva i vettori dei ticket che non ne hanno uno valido per la
+    versione attiva (o di tutti, con rebuild=True), a blocchi per id.
+    Ritorna il numero di ticket vettorizzati, o None se il modello non esiste.
+    """
+    model = load_model()
+    if model is None or _cached_version is None:
+        return None
     tfidf = model.named_steps["tfidf"]
+    version = _cached_version
+
+    qs = Ticket.objects.order_by("id")
+    if not rebuild:
+        qs = qs.exclude(vector__model_version=version)
+
+    done = 0
+    last_id = 0
+    while True:
+        batch = list(qs.filter(id__gt=last_id).values_list("id", "title", "description")[:chunk_size])
+        if not batch:
+            break
+        ids = [row[0] for row in batch]
+        matrix = tfidf.transform([_build_text(title, description) for _, title, description in batch])
+        store_ticket_vectors(ids, matrix, version)
+        done += len(ids)
+        last_id = ids[-1]
+        if progress:
+            progress(done)
+    return done
 
-    # corpus: ultimi max_corpus ticket diversi da quello target
-    qs = (
-        Ticket.objects.exclude(id=ticket.id)
-        .order_by("-created_at")[:max_corpus]
-    )
 
-    corpus = [_build_text(t.title, t.description) for t in qs]
-    if not corpus:
+def remove_from_similarity_index(ticket_id):
+    if _cached_index is not None:
+        _cached_index.remove(ticket_id)
+    if _cached_ann is not None:
+        _cached_ann.remove(ticket_id)
+
+
+def _top_k(ids, scores, k):
+    """
+    Selezione vettorizzata dei k punteggi più alti: argpartition O(n)
+    + sort dei soli k vincitori (in ordine decrescente).
+    """
+    k = min(k, len(scores))
+    if k <= 0:
+        return ids[:0], scores[:0]
+    best = np.argpartition(-scores, k - 1)[:k]
+    best = best[np.argsort(-scores[best], kind="stable")]
+    return ids[best], scores[best]
+
+
+def get_similar_tickets(ticket: Ticket, top_k=5, probes=None):
+    """
+    Trova i ticket più simili (in base a TF-IDF + cosine similarity) rispetto al ticket passato,
+    cercando su tutto lo storico tramite l'indice precalcolato.
+
+    Con SIMILARITY_BACKEND = "lsh" la ricerca è approssimata: `probes` regola il
+    compromesso recall/latenza (default SIMILARITY_LSH_PROBES).
+    """
+    model = load_model()
+    if model is None:
         return []
 
+    tfidf = model.named_steps["tfidf"]
     query_vec = tfidf.transform([_build_text(ticket.title, ticket.description)])
-    corpus_vec = tfidf.transform(corpus)
-
-    sims = cosine_similarity(query_vec, corpus_vec)[0]
-    scored = list(zip(qs, sims))
-    scored.sort(key=lambda x: x[1], reverse=True)
-    top = scored[:top_k]
-
-    return [
-        {
-            "id": t.id,
-            "title": t.title,
-            "status": t.status,
-            "category": t.category,
-            "similarity": float(score),
-        }
-        for (t, score) in top
-    ]
+
+    if _similarity_backend() == "lsh":
+        if probes is None:
+            probes = getattr(settings, "SIMILARITY_LSH_PROBES", 2)
+        ids, sims = load_ann_index().scores(query_vec, probes=probes)
+    else:
+        ids, sims = load_similarity_index().scores(query_vec)
+
+    mask = ids != ticket.id
+    top_ids, top_scores = _top_k(ids[mask], sims[mask], top_k)
+
+    # solo le righe vincenti, e solo i campi restituiti (niente description)
+    tickets = Ticket.objects.only("id", "title", "status", "category").in_bulk(top_ids.tolist())
+
+    results = []
+    for ticket_id, score in zip(top_ids.tolist(), top_scores.tolist()):
+        t = tickets.get(ticket_id)
+        if t is None:
+            # ticket cancellato dopo l'ultimo allineamento dell'indice
+            continue
+        results.append(
+            {
+                "id": t.id,
+                "title": t.title,
+                "status": t.status,
+                "category": t.category,
+                "similarity": float(score),
+            }
+        )
+    return results
+
+
+# candidati lessicali (full-text) riordinati con TF-IDF in search_similar_text
+SIMILAR_TEXT_CANDIDATES = 200
+
+
+def search_similar_text(title, description, top_k=5, candidates=SIMILAR_TEXT_CANDIDATES):
+    """
+    Ticket esistenti più simili a un testo libero (es. il form di un nuovo ticket
+    non ancora inviato). Ricerca ibrida: la ricerca full-text seleziona pochi
+    candidati che condividono almeno una parola, poi li ordiniamo per cosine
+    similarity TF-IDF. Se il modello non esiste, ritorna None.
+    """
+    model = load_model()
+    if model is None:
+        return None
+
+    text = _build_text(title, description)
+    ids = lexical_candidates(text, candidates)
+    if not ids:
+        return []
+
+    tfidf = model.named_steps["tfidf"]
+    query_vec = tfidf.transform([text])
+    # vettori dei candidati già pronti in TicketVector: niente testi da ri-tokenizzare
+    ids, matrix = load_ticket_vectors(ids, tfidf)
+    # vettori TF-IDF normalizzati L2: il prodotto scalare è la cosine similarity
+    sims = np.asarray((matrix @ query_vec.T).todense()).ravel()
+    top_ids, top_scores = _top_k(ids, sims, top_k)
+    tickets = Ticket.objects.filter(id__in=top_ids.tolist()).values_list("id", "title", "status", "category")
+    meta = {row[0]: row[1:] for row in tickets}
+
+    results = []
+    for ticket_id, score in zip(top_ids.tolist(), top_scores.tolist()):
+        if score <= 0 or ticket_id not in meta:
+            continue
+        ticket_title, ticket_status, category = meta[ticket_id]
+        results.append(
+            {
+                "id": ticket_id,
+                "title": ticket_title,
+                "status": ticket_status,
+                "category": category,
+                "similarity": float(score),
+            }
+        )
+    return results
@@ -1,10 +1,101 @@
-from django.db import models
+from datetime import datetime, time, timedelta
+
+from django.db import models, transaction
+from django.db.models import Case, Count, DurationField, ExpressionWrapper, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
+from . import analytics_cache
+
 User = get_user_model()
 
 
+def add_delta(deltas, key, created, resolved, seconds):
+    """
+    Somma un contributo (created, resolved, seconds) alla chiave `key` di `deltas`.
+    """
+    c, r, s = deltas.get(key, (0, 0, 0.0))
+    deltas[key] = (c + created, r + resolved, s + seconds)
+
+
+class TicketQuerySet(models.QuerySet):
+    """
+    Operazioni set-based sui ticket: un solo UPDATE per tutto il queryset,
+    con la stessa logica di Ticket.save() su resolved_at.
+
+    NB: come ogni queryset.update(), non chiamano save() né i signal
+    (transition aggiorna esplicitamente il rollup TicketDailyStats).
+    """
+
+    def transition(self, status):
+        """
+        Porta i ticket selezionati allo status indicato e ritorna quanti ne ha modificati
+        (quelli già nello status di destinazione vengono esclusi).
+        """
+        now = timezone.now()
+        if status == "RESOLVED":
+            resolved_at = Case(
+                When(~Q(status="RESOLVED"), then=Value(now)),
+                default=F("resolved_at"),
+                output_field=models.DateTimeField(),
+            )
+        else:
+            # riapertura: un ticket che lascia RESOLVED perde resolved_at
+            resolved_at = Case(
+                When(status="RESOLVED", then=Value(None)),
+                default=F("resolved_at"),
+                output_field=models.DateTimeField(),
+            )
+        qs = self.exclude(status=status)
+        with transaction.atomic():
+            # spostamento dei contributi nel rollup, calcolato prima dell'UPDATE
+            deltas = qs._transition_deltas(status, resolved_at)
+            # update() non applica auto_now: updated_at va aggiornato esplicitamente
+            updated = qs.update(status=status, resolved_at=resolved_at, updated_at=now)
+            if updated:
+                TicketDailyStats.apply_on_commit(deltas)
+        return updated
+
+    def _transition_deltas(self, status, resolved_at):
+        """
+        Delta del rollup {(date, category, status): (created, resolved, seconds)} per il
+        passaggio dei ticket del queryset a `status` con `resolved_at` (espressione):
+        una sola SELECT raggruppata per (giorno, categoria, status attuale).
+        """
+        def resolution(end):
+            return ExpressionWrapper(end - F("created_at"), output_field=DurationField())
+
+        groups = (
+            self.order_by()
+            .annotate(day=TruncDate("created_at"))
+            .values("day", "category", "status")
+            .annotate(
+                created=Count("id"),
+                resolved=Count("resolved_at"),
+                seconds=Sum(resolution(F("resolved_at"))),
+                new_resolved=Count(resolved_at),
+                new_seconds=Sum(resolution(resolved_at)),
+            )
+        )
+        deltas = {}
+        for row in groups:
+            seconds = row["seconds"].total_seconds() if row["seconds"] else 0.0
+            new_seconds = row["new_seconds"].total_seconds() if row["new_seconds"] else 0.0
+            add_delta(deltas, (row["day"], row["category"], row["status"]), -row["created"], -row["resolved"], -seconds)
+            add_delta(deltas, (row["day"], row["category"], status), row["created"], row["new_resolved"], new_seconds)
+        return deltas
+
+    def assign(self, user_id):
+        """
+        Assegna i ticket selezionati all'utente (None = rimuove l'assegnazione)
+        e ritorna quanti ne ha modificati.
+        """
+        return self.exclude(assigned_to_id=user_id).update(
+            assigned_to_id=user_id, updated_at=timezone.now()
+        )
+
+
 class Ticket(models.Model):
     """
     Modello principale per i ticket di supporto.
@@ -41,7 +132,6 @@ class Ticket(models.Model):
         max_length=20, 
         choices=STATUS_CHOICES, 
         default="OPEN", 
-        db_index=True,
         help_text="Stato del ticket nel workflow (open, in_progress, resolved, ...)",
     )
     priority = models.CharField(
@@ -51,7 +141,6 @@ class Ticket(models.Model):
         max_length=20,
         choices=CATEGORY_CHOICES,
         default="other",
-        db_index=True,
         help_text="Categoria funzionale del ticket (es. billing, bug, question). Predetta anche dal modello ML.",
     )
 
@@ -67,14 +156,83 @@ class Ticket(models.Model):
         null=True,
         blank=True,
         on_delete=models.SET_NULL,
-        db_index=True,
+        # coperto dall'indice composito (assigned_to, -created_at)
+        db_index=False,
     )
 
     # Timestamp di creazione/aggiornamento e, se presente, di risoluzione
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
-    updated_at = models.DateTimeField(auto_now=True)
+    # (created_at è indicizzato dagli indici compositi in Meta.indexes)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # indicizzato: usato come checkpoint dal training incrementale e dagli indici ML
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
 
+    objects = TicketQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # chiave della paginazione keyset (vedi tickets/pagination.py)
+            models.Index(fields=["created_at", "id"], name="ticket_created_id_idx"),
+            # filtro/ordinamento per campo + data (vedi TicketViewSet.ORDERING)
+            models.Index(fields=["status", "-created_at"], name="ticket_status_created_idx"),
+            models.Index(fields=["assigned_to", "-created_at"], name="ticket_assignee_created_idx"),
+            models.Index(fields=["category", "-created_at"], name="ticket_category_created_idx"),
+            # analytics trends: range su created_at + GROUP BY category letti dal solo indice
+            models.Index(fields=["created_at", "category"], name="ticket_created_category_idx"),
+            # analytics MTTR: solo i ticket risolti
+            models.Index(
+                fields=["created_at", "resolved_at"],
+                condition=models.Q(resolved_at__isnull=False),
+                name="ticket_resolved_created_idx",
+            ),
+        ]
+
+    # Campi di cui teniamo in memoria il valore letto dal DB (vedi from_db/save):
+    # status per resolved_at, title/description per i vettori ML, gli altri
+    # per il rollup giornaliero (vedi signals.py)
+    TRACKED_FIELDS = ("status", "title", "description", "category", "created_at", "resolved_at")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot()
+        return instance
+
+    def _snapshot(self, fields=None):
+        # solo i campi effettivamente caricati: leggere un campo deferred farebbe una query
+        if fields is None or not hasattr(self, "_loaded_values"):
+            self._loaded_values = {}
+        names = self.TRACKED_FIELDS if fields is None else set(self.TRACKED_FIELDS) & set(fields)
+        for name in names:
+            if name in self.__dict__:
+                self._loaded_values[name] = self.__dict__[name]
+
+    def _loaded_value(self, name):
+        """
+        Valore del campo com'era sul DB all'ultimo caricamento/salvataggio.
+        Se l'istanza non viene dal DB (o il campo era deferred) lo rilegge con una query.
+        """
+        loaded = getattr(self, "_loaded_values", {})
+        if name in loaded:
+            return loaded[name]
+        return Ticket.objects.filter(pk=self.pk).values_list(name, flat=True).first()
+
+    def field_changed(self, name):
+        """
+        True se il campo è stato modificato in memoria rispetto al valore letto dal DB
+        (o se il valore letto non è noto, es. istanza nuova). Non fa query.
+        """
+        if name not in self.__dict__:
+            # deferred e mai assegnato
+            return False
+        loaded = getattr(self, "_loaded_values", {})
+        return name not in loaded or loaded[name] != self.__dict__[name]
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        # solo i campi riletti: caricare un campo deferred non deve far passare per
+        # "letti dal DB" le modifiche non ancora salvate degli altri campi
+        self._snapshot(kwargs.get("fields") or (args[1] if len(args) > 1 else None))
 
     def set_resolved_if_needed(self, old_status):
         # Mantiene coerente il campo resolved_at quando cambia lo status del ticket
@@ -83,20 +241,297 @@ class Ticket(models.Model):
         elif old_status == "RESOLVED" and self.status != "RESOLVED":
             self.resolved_at = None
 
-
     def save(self, *args, **kwargs):
         """
         Override di save per gestire automaticamente resolved_at
         quando lo status del ticket passa a RESOLVED o viene riaperto.
+
+        Lo status precedente è quello letto dal DB (from_db), quindi per un
+        ticket già caricato resolved_at viene calcolato prima della scrittura
+        e il save è un singolo UPDATE.
         """
-        old_status = None
-        if self.pk:
-            old_status = Ticket.objects.filter(pk=self.pk).values_list("status", flat=True).first()
+        update_fields = kwargs.get("update_fields")
+        if self.pk and (update_fields is None or "status" in update_fields):
+            old_status = self._loaded_value("status")
+            if old_status is not None:
+                self.set_resolved_if_needed(old_status)
+                if update_fields is not None and "resolved_at" not in update_fields:
+                    kwargs["update_fields"] = [*update_fields, "resolved_at"]
         super().save(*args, **kwargs)
-        if old_status is not None:
-            self.set_resolved_if_needed(old_status)
-            super().save(update_fields=["resolved_at"])
-
+        self._snapshot(kwargs.get("update_fields"))
 
     def __str__(self):
         return f"[{self.status}] {self.title[:40]}"
+
+
+class TicketDailyStats(models.Model):
+    """
+    Rollup giornaliero dei ticket per (giorno di creazione, categoria, status):
+    gli endpoint di analytics leggono da qui (~poche migliaia di righe per un anno)
+    invece di aggregare l'intera tabella dei ticket.
+
+    Ogni ticket contribuisce a una sola riga, quella del suo giorno di creazione
+    e dei suoi category/status attuali: created_count += 1 e, se è risolto,
+    resolved_count += 1 e resolution_seconds += (resolved_at - created_at).
+    Mantenuto incrementalmente (apply_on_commit) dai signal sui Ticket e dalle
+    operazioni in blocco, con un UPDATE a incremento per riga toccata dopo il
+    commit della scrittura sui ticket; ricalcolato da zero solo dal comando
+    `reconcile_daily_stats`. Ogni scrittura invalida la cache degli analytics
+    (tickets/analytics_cache.py).
+    """
+    date = models.DateField()
+    category = models.CharField(max_length=20, choices=Ticket.CATEGORY_CHOICES)
+    status = models.CharField(max_length=20, choices=Ticket.STATUS_CHOICES)
+    created_count = models.IntegerField(default=0)
+    resolved_count = models.IntegerField(default=0)
+    resolution_seconds = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ["date", "category", "status"]
+        constraints = [
+            models.UniqueConstraint(fields=["date", "category", "status"], name="unique_daily_stats"),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.category}/{self.status}: {self.created_count}"
+
+    @staticmethod
+    def contribution(created_at, category, status, resolved_at):
+        """
+        Chiave e contributo (created, resolved, seconds) di un singolo ticket.
+        """
+        key = (timezone.localdate(created_at), category, status)
+        if resolved_at is None:
+            return key, (1, 0, 0.0)
+        return key, (1, 1, (resolved_at - created_at).total_seconds())
+
+    @classmethod
+    def apply(cls, deltas):
+        """
+        Somma i contributi {(date, category, status): (created, resolved, seconds)}
+        alle righe del rollup: un UPDATE a incremento per chiave; le righe che non
+        esistono vengono create vuote (ignorando i conflitti) e poi incrementate.
+        """
+        changed = False
+        for (date, category, status), (created, resolved, seconds) in deltas.items():
+            if not (created or resolved or seconds):
+                continue
+            changed = True
+            rows = cls.objects.filter(date=date, category=category, status=status)
+            increment = {
+                "created_count": F("created_count") + created,
+                "resolved_count": F("resolved_count") + resolved,
+                "resolution_seconds": F("resolution_seconds") + seconds,
+            }
+            if not rows.update(**increment):
+                # riga nuova (o creata nel frattempo da un'altra richiesta)
+                cls.objects.bulk_create([cls(date=date, category=category, status=status)], ignore_conflicts=True)
+                rows.update(**increment)
+        if changed:
+            cls._invalidate_cache()
+
+    @classmethod
+    def apply_on_commit(cls, deltas):
+        """
+        Come apply, ma dopo il commit della scrittura sui ticket: gli UPDATE sulle
+        poche righe "calde" del rollup non allungano la transazione (e i lock) della
+        richiesta, e con un rollback non vengono eseguiti. Se il processo muore tra
+        commit e callback il rollup resta indietro: lo riallinea reconcile_daily_stats.
+        """
+        if deltas:
+            transaction.on_commit(lambda: cls.apply(deltas))
+
+    @classmethod
+    def add_tickets(cls, tickets):
+        """
+        Aggiunge (dopo il commit) il contributo di una lista di ticket appena creati.
+        """
+        deltas = {}
+        for t in tickets:
+            key, contribution = cls.contribution(t.created_at, t.category, t.status, t.resolved_at)
+            add_delta(deltas, key, *contribution)
+        cls.apply_on_commit(deltas)
+
+    @classmethod
+    def reconcile(cls, dates=None):
+        """
+        Ricalcola il rollup dalla tabella dei ticket: tutto, o solo i giorni in `dates`.
+        Ritorna il numero di righe scritte.
+        """
+        tickets = Ticket.objects.order_by().annotate(day=TruncDate("created_at"))
+        rows = cls.objects.all()
+        if dates is not None:
+            dates = set(dates)
+            if not dates:
+                return 0
+            # intervalli [mezzanotte, mezzanotte del giorno dopo) su created_at: usano l'indice
+            days = Q()
+            for day in dates:
+                start = timezone.make_aware(datetime.combine(day, time.min))
+                end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+                days |= Q(created_at__gte=start, created_at__lt=end)
+            tickets = tickets.filter(days)
+            rows = rows.filter(date__in=dates)
+
+        resolution = ExpressionWrapper(F("resolved_at") - F("created_at"), output_field=DurationField())
+        aggregated = tickets.values("day", "category", "status").annotate(
+            created=Count("id"),
+            resolved=Count("resolved_at"),
+            seconds=Sum(resolution, filter=Q(resolved_at__isnull=False)),
+        )
+        stats = [
+            cls(
+                date=row["day"],
+                category=row["category"],
+                status=row["status"],
+                created_count=row["created"],
+                resolved_count=row["resolved"],
+                resolution_seconds=row["seconds"].total_seconds() if row["seconds"] else 0.0,
+            )
+            for row in aggregated
+        ]
+        with transaction.atomic():
+            rows.delete()
+            cls.objects.bulk_create(stats, batch_size=1000)
+        cls._invalidate_cache()
+        return len(stats)
+
+    @staticmethod
+    def _invalidate_cache():
+        # dopo il commit: invalidando prima, una richiesta concorrente potrebbe
+        # rimettere in cache i valori vecchi (fuori da una transazione è immediato)
+        transaction.on_commit(analytics_cache.invalidate)
+
+
+class TicketVector(models.Model):
+    """
+    Vettore TF-IDF (sparso) di un ticket, calcolato con il tfidf di una versione
+    del modello: similarità e job di analisi lo leggono in blocco invece di
+    ri-tokenizzare i testi. Una riga per ticket; è valida solo se model_version
+    coincide con la versione attiva (vedi ml_utils.load_ticket_vectors).
+    """
+    ticket = models.OneToOneField(
+        Ticket,
+        primary_key=True,
+        related_name="vector",
+        on_delete=models.CASCADE,
+    )
+    model_version = models.PositiveIntegerField(db_index=True)
+    # colonne non nulle della riga (int32) e relativi pesi (float32), come bytes
+    indices = models.BinaryField()
+    values = models.BinaryField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"vector(ticket={self.ticket_id}, v{self.model_version})"
+
+
+class DeletedTicket(models.Model):
+    """
+    Traccia di un ticket cancellato: gli indici di similarità già salvati o in
+    cache in altri worker la leggono per togliere il ticket (vedi ml_utils._catch_up).
+    Le righe più vecchie di SIMILARITY_TOMBSTONE_DAYS vengono cancellate al training.
+    """
+    ticket_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"deleted(ticket={self.ticket_id})"
+
+
+class TrainingJob(models.Model):
+    """
+    Job di training del modello ML eseguito in background (vedi tickets/jobs.py).
+
+    L'endpoint /api/ml/train/ crea la riga e ritorna subito l'id;
+    lo stato, l'avanzamento e le metriche finali si leggono da /api/ml/jobs/{id}/.
+    """
+    MODE_CHOICES = [
+        ("full", "Full retrain"),
+        ("incremental", "Incremental update"),
+    ]
+
+    STATUS_CHOICES = [
+        ("PENDING", "Pending"),
+        ("RUNNING", "Running"),
+        ("SUCCEEDED", "Succeeded"),
+        ("FAILED", "Failed"),
+    ]
+
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES, default="full")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="PENDING", db_index=True)
+    # avanzamento 0.0 -> 1.0 e fase corrente del training
+    progress = models.FloatField(default=0.0)
+    stage = models.CharField(max_length=50, blank=True)
+
+    created_by = models.ForeignKey(
+        User,
+        related_name="training_jobs",
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # aggiornato periodicamente mentre il job gira: se si ferma il worker è morto
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    # info ritornate da train_model() (n_samples, classi, ...) oppure errore
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            # un solo job attivo per tipo, anche con più processi che accodano insieme
+            models.UniqueConstraint(
+                fields=["mode"],
+                condition=Q(status__in=["PENDING", "RUNNING"]),
+                name="unique_active_training_job",
+            ),
+        ]
+
+    @property
+    def duration_seconds(self):
+        if self.started_at is None:
+            return None
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    def __str__(self):
+        return f"TrainingJob #{self.pk} {self.mode} [{self.status}]"
+
+
+class ModelVersion(models.Model):
+    """
+    Registro delle versioni del modello ML (TF-IDF + Logistic Regression).
+
+    Ogni training completo crea una nuova versione con la sua directory di artifact
+    (classificatore + indici di similarità) sotto ml/artifacts/. Una sola versione
+    è attiva: i worker la rileggono periodicamente e la caricano a caldo
+    (vedi ml_utils.load_model).
+    """
+    version = models.PositiveIntegerField(unique=True)
+    # directory relativa a ml/artifacts (es. "v0003")
+    artifact_dir = models.CharField(max_length=255)
+    # sha256 del classificatore, verificato al training e all'attivazione (rollback)
+    checksum = models.CharField(max_length=64)
+    # dimensione in byte del classificatore: è il controllo fatto a ogni hot-swap,
+    # che non deve rileggere l'artifact per intero dentro una richiesta
+    size = models.PositiveBigIntegerField(null=True, blank=True)
+    metrics = models.JSONField(default=dict, blank=True)
+    is_active = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-version"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["is_active"],
+                condition=models.Q(is_active=True),
+                name="unique_active_model_version",
+            )
+        ]
+
+    def __str__(self):
+        return f"v{self.version}{' (active)' if self.is_active else ''}"
@@ -0,0 +1,179 @@
+"""
+Paginazione della lista ticket.
+
+PageNumberPagination (default di REST_FRAMEWORK) esegue OFFSET + COUNT(*) a ogni
+pagina: su tabelle grandi le pagine profonde diventano lente (il DB deve scorrere e
+scartare tutte le righe precedenti). Qui aggiungiamo una modalità keyset ("cursor"):
+la pagina successiva parte dalla coppia (created_at, id) dell'ultimo ticket visto,
+quindi costa come la prima pagina a qualsiasi profondità.
+"""
+import base64
+import json
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination:
+    """
+    Paginazione keyset su (created_at, id), coerente con l'ordinamento di default
+    -created_at (id fa da spareggio tra ticket creati nello stesso istante).
+
+    Il cursore è opaco (base64 di JSON) e contiene la chiave dell'ultimo/primo
+    elemento della pagina e la direzione. Con ?count=false il COUNT(*) viene saltato.
+    """
+    cursor_query_param = "cursor"
+    count_query_param = "count"
+    ordering_field = "created_at"
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request):
+        self.request = request
+        descending = self._descending(queryset)
+        cursor = self.decode_cursor(request)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, "true").lower() not in ("false", "0", "no"):
+            self.count = queryset.count()
+
+        # "previous": si legge all'indietro e poi si ribalta la pagina
+        backwards = cursor is not None and cursor["r"]
+        forward = descending != backwards
+        if cursor is not None:
+            created_at, pk = cursor["t"], cursor["i"]
+            if forward:
+                # (created_at, id) < cursore; created_at__lte permette il range scan sull'indice
+                keyset = Q(created_at__lte=created_at) & (Q(created_at__lt=created_at) | Q(id__lt=pk))
+            else:
+                keyset = Q(created_at__gte=created_at) & (Q(created_at__gt=created_at) | Q(id__gt=pk))
+            queryset = queryset.filter(keyset)
+
+        if forward:
+            queryset = queryset.order_by(f"-{self.ordering_field}", "-id")
+        else:
+            queryset = queryset.order_by(self.ordering_field, "id")
+
+        rows = list(queryset[: self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if backwards:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, cursor is not None
+        self.page = rows
+        return rows
+
+    def _descending(self, queryset):
+        ordering = tuple(queryset.query.order_by)
+        if ordering in ((), (f"-{self.ordering_field}",), (f"-{self.ordering_field}", "-id")):
+            return True
+        if ordering in ((self.ordering_field,), (self.ordering_field, "id")):
+            return False
+        raise ValidationError(
+            {"ordering": f"Cursor pagination supports only ordering={self.ordering_field} or -{self.ordering_field}"}
+        )
+
+    def encode_cursor(self, ticket, reverse):
+        payload = {"t": ticket.created_at.isoformat(), "i": ticket.pk, "r": int(reverse)}
+        return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    def decode_cursor(self, request):
+        raw = request.query_params.get(self.cursor_query_param)
+        if not raw:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(raw.encode()))
+            created_at = parse_datetime(payload["t"])
+            if created_at is None:
+                raise ValueError(payload["t"])
+            return {"t": created_at, "i": int(payload["i"]), "r": bool(payload["r"])}
+        except (TypeError, ValueError, KeyError):
+            raise NotFound("Invalid cursor")
+
+    def _link(self, ticket, reverse):
+        url = remove_query_param(self.request.build_absolute_uri(), "page")
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(ticket, reverse))
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self._link(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self._link(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "count": self.count,
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+
+class TicketPagination(PageNumberPagination):
+    """
+    Paginazione di /api/tickets/: per compatibilità resta a numero di pagina
+    (?page=N); con ?pagination=cursor, o quando è presente ?cursor=, passa
+    alla modalità keyset (vedi KeysetPagination).
+    """
+    mode_query_param = "pagination"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if (
+            request.query_params.get(self.mode_query_param) == "cursor"
+            or KeysetPagination.cursor_query_param in request.query_params
+        ):
+            page_size = self.get_page_size(request)
+            if page_size is None:
+                return None
+            self.keyset = KeysetPagination(page_size)
+            return self.keyset.paginate_queryset(queryset, request)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_paginated_response_schema(self, schema):
+        schema = super().get_paginated_response_schema(schema)
+        schema["properties"]["count"]["nullable"] = True
+        return schema
+
+    def get_schema_operation_parameters(self, view):
+        return super().get_schema_operation_parameters(view) + [
+            {
+                "name": self.mode_query_param,
+                "required": False,
+                "in": "query",
+                "description": "'cursor' per la paginazione keyset su (created_at, id).",
+                "schema": {"type": "string", "enum": ["cursor"]},
+            },
+            {
+                "name": KeysetPagination.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursore opaco restituito nei link next/previous (modalità keyset).",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": KeysetPagination.count_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Modalità keyset: false per saltare il COUNT(*) (count = null).",
+                "schema": {"type": "boolean"},
+            },
+        ]
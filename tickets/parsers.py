@@ -0,0 +1,29 @@
+"""
+Parser DRF aggiuntivi per l'API dei ticket.
+"""
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+class NDJSONParser(BaseParser):
+    """
+    Newline-delimited JSON (un oggetto per riga), tipico degli export
+    dei gateway email. Ritorna una lista di dict, come un array JSON.
+    """
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", "utf-8")
+        items = []
+        for lineno, line in enumerate(stream, start=1):
+            line = line.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                raise ParseError(f"NDJSON parse error at line {lineno}: {exc}")
+        return items
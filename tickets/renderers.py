@@ -0,0 +1,58 @@
+"""
+Renderer DRF per l'export dei ticket (GET /api/tickets/export/).
+
+L'export vero e proprio è uno StreamingHttpResponse costruito con stream():
+i renderer servono alla content negotiation (?format=csv|ndjson o header
+Accept) e a serializzare le risposte di errore nello stesso formato.
+"""
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import BaseRenderer
+
+
+class _Echo:
+    """
+    Pseudo-file per csv.writer: write() ritorna la riga invece di bufferizzarla.
+    """
+
+    def write(self, value):
+        return value
+
+
+class CSVRenderer(BaseRenderer):
+    media_type = "text/csv"
+    format = "csv"
+    charset = "utf-8"
+
+    def stream(self, header, rows):
+        writer = csv.writer(_Echo())
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # usato solo per le risposte non in streaming (errori): un dict diventa una riga
+        if data is None:
+            return b""
+        if isinstance(data, dict):
+            data = [data]
+        header = list(data[0]) if data else []
+        return "".join(self.stream(header, ([row.get(k) for k in header] for row in data))).encode()
+
+
+class NDJSONRenderer(BaseRenderer):
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = "utf-8"
+
+    def stream(self, header, rows):
+        for row in rows:
+            yield json.dumps(dict(zip(header, row)), cls=DjangoJSONEncoder) + "\n"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        items = data if isinstance(data, list) else [data]
+        return "".join(json.dumps(item, cls=DjangoJSONEncoder) + "\n" for item in items).encode()
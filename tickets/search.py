@@ -0,0 +1,152 @@
+"""
+Ricerca full-text sui ticket (?q= su GET /api/tickets/).
+
+- PostgreSQL: colonna tsvector `search_vector` (titolo con peso A, descrizione
+  con peso B) mantenuta da un trigger, indice GIN e ranking con SearchRank.
+- SQLite (sviluppo locale): tabella virtuale FTS5 "external content" su
+  tickets_ticket, mantenuta da trigger, ranking con bm25().
+
+La colonna/tabella di ricerca non è un campo del model: viene creata dalla
+migration 0009 (con una sua copia dell'SQL) e letta solo qui, così le query
+normali sui ticket non si portano dietro il tsvector.
+"""
+import re
+from functools import reduce
+from operator import or_
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import connections
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Ticket
+
+TABLE = Ticket._meta.db_table
+FTS_TABLE = f"{TABLE}_fts"
+SEARCH_CONFIG = "english"
+
+# trigger dell'indice FTS5 "external content" (vedi documentazione SQLite FTS5):
+# stessi della migration 0009, ricreati dopo ogni migrate da ensure_sqlite_triggers
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF title, description ON {TABLE} BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+]
+
+
+def _execute(connection, statements):
+    with connection.cursor() as cursor:
+        for sql in statements:
+            cursor.execute(sql)
+
+
+def ensure_sqlite_triggers(connection):
+    """
+    Su SQLite le migration che modificano tickets_ticket ricreano la tabella
+    (e con essa perdono i trigger): li reinstalliamo dopo ogni migrate.
+    Il contenuto dell'indice resta valido perché gli id non cambiano.
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        if cursor.fetchone() is None:
+            return
+    _execute(connection, SQLITE_TRIGGERS)
+
+
+def _fts5_query(text):
+    # solo parole (niente sintassi FTS5 dall'utente), tutte richieste: come websearch su PostgreSQL
+    return " ".join(f'"{word}"' for word in _words(text))
+
+
+def _words(text, limit=32):
+    # parole distinte della query, nell'ordine in cui compaiono
+    return list(dict.fromkeys(word.lower() for word in re.findall(r"\w+", text)))[:limit]
+
+
+def lexical_candidates(text, limit):
+    """
+    Id dei ticket che contengono almeno una parola di `text` (OR), i più
+    rilevanti per primi: prefiltro economico per la ricerca per similarità.
+    """
+    words = _words(text)
+    if not words:
+        return []
+    vendor = connections[Ticket.objects.db].vendor
+
+    if vendor == "postgresql":
+        query = reduce(or_, (SearchQuery(word, config=SEARCH_CONFIG) for word in words))
+        vector = RawSQL(f'"{TABLE}"."search_vector"', [], output_field=SearchVectorField())
+        qs = (
+            Ticket.objects.alias(search_vector=vector)
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+            .order_by("-rank")
+        )
+        return list(qs.values_list("id", flat=True)[:limit])
+
+    if vendor == "sqlite":
+        # ORDER BY bm25 ... LIMIT direttamente sulla tabella FTS5 (top-k senza join)
+        match = " OR ".join(f'"{word}"' for word in words)
+        with connections[Ticket.objects.db].cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, 2.0, 1.0) LIMIT %s",
+                [match, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    condition = reduce(or_, (Q(title__icontains=w) | Q(description__icontains=w) for w in words))
+    return list(Ticket.objects.filter(condition).order_by("-created_at").values_list("id", flat=True)[:limit])
+
+
+def search_tickets(queryset, text):
+    """
+    Filtra il queryset ai ticket che corrispondono a `text` e annota `rank`
+    (più alto = più rilevante). L'ordinamento resta a carico del chiamante.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+        # alias(): il tsvector serve a WHERE/rank ma non viene selezionato
+        vector = RawSQL(f'"{TABLE}"."search_vector"', [], output_field=SearchVectorField())
+        return (
+            queryset.alias(search_vector=vector)
+            .filter(search_vector=query)
+            .annotate(rank=SearchRank(F("search_vector"), query))
+        )
+
+    if vendor == "sqlite":
+        match = _fts5_query(text)
+        if not match:
+            return queryset.annotate(rank=Value(0.0, output_field=FloatField())).none()
+        # bm25() è negativo (più basso = più rilevante); titolo pesato il doppio della descrizione
+        rank = RawSQL(
+            f"SELECT -bm25({FTS_TABLE}, 2.0, 1.0) FROM {FTS_TABLE} "
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{TABLE}"."id"',
+            [match],
+            output_field=FloatField(),
+        )
+        matching_ids = RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+        return queryset.filter(id__in=matching_ids).annotate(rank=rank)
+
+    # altri backend: ricerca semplice su titolo/descrizione
+    return queryset.filter(Q(title__icontains=text) | Q(description__icontains=text)).annotate(
+        rank=Value(1.0, output_field=FloatField())
+    )
@@ -1,6 +1,12 @@
-from rest_framework import serializers
+from operator import attrgetter
+
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import Ticket
+from django.utils import timezone
+from django.db import transaction
+from .models import ModelVersion, Ticket, TicketDailyStats, TrainingJob
 
 User = get_user_model()
 
@@ -43,3 +49,266 @@ class TicketSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         # Puoi aggiungere logica custom se vuoi, per ora delega a ModelSerializer
         return super().update(instance, validated_data)
+
+
+class TicketReadSerializer(serializers.BaseSerializer):
+    """
+    Serializer in sola lettura per lista e dettaglio dei ticket: produce lo
+    stesso JSON di TicketSerializer leggendo direttamente gli attributi del
+    model, senza costruire e attraversare i Field di DRF per ogni ticket
+    (che sulle pagine grandi dominano la latenza, vedi `bench_serializers`).
+
+    Con context["fields"] (sottoinsieme di FIELDS) emette solo quei campi e
+    legge solo i relativi attributi, quindi funziona anche su queryset con
+    only()/defer() senza query aggiuntive.
+
+    Richiede created_by in select_related (come il queryset di TicketViewSet).
+    """
+    # campo JSON -> (attributo del model, conversione), nell'ordine di TicketSerializer
+    FIELDS = {
+        "id": ("id", None),
+        "title": ("title", None),
+        "description": ("description", None),
+        "status": ("status", None),
+        "priority": ("priority", None),
+        "category": ("category", None),
+        "created_by": ("created_by", "string"),
+        "assigned_to": ("assigned_to_id", None),
+        "created_at": ("created_at", "datetime"),
+        "updated_at": ("updated_at", "datetime"),
+        "resolved_at": ("resolved_at", "datetime"),
+    }
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # con many=True l'istanza è una sola per tutta la pagina: il fuso corrente
+        # (letto da un asgiref Local, costoso) e i campi da emettere si risolvono una volta sola
+        self.timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        if api_settings.DATETIME_FORMAT != ISO_8601:
+            self.to_datetime = serializers.DateTimeField().to_representation
+
+        names = self.context.get("fields")
+        if names is None:
+            names = self.FIELDS
+        self.names = [name for name in self.FIELDS if name in names]
+        # attrgetter con più attributi legge tutti i valori in una chiamata (e ritorna sempre una tupla)
+        self.get_values = attrgetter(*[self.FIELDS[name][0] for name in self.names], "pk")
+        conversions = [self.FIELDS[name][1] for name in self.names]
+        self.datetime_positions = [i for i, kind in enumerate(conversions) if kind == "datetime"]
+        self.string_positions = [i for i, kind in enumerate(conversions) if kind == "string"]
+
+    def to_datetime(self, value):
+        # come DateTimeField.to_representation di DRF: fuso corrente, ISO 8601, "Z" per UTC
+        if value is None:
+            return None
+        if self.timezone is not None:
+            if timezone.is_aware(value):
+                value = value.astimezone(self.timezone)
+            else:
+                value = timezone.make_aware(value, self.timezone)
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    def to_representation(self, ticket):
+        values = list(self.get_values(ticket))
+        for i in self.datetime_positions:
+            values[i] = self.to_datetime(values[i])
+        for i in self.string_positions:
+            values[i] = str(values[i])
+        return dict(zip(self.names, values))
+
+
+class TicketBulkListSerializer(serializers.ListSerializer):
+    """
+    Validazione e creazione in blocco per POST /api/tickets/bulk/:
+    gli assegnatari vengono verificati con una sola query e i ticket
+    scritti con bulk_create a batch, in un'unica transazione.
+    """
+    batch_size = 1000
+
+    def validate(self, attrs):
+        assignee_ids = {item["assigned_to"] for item in attrs if item.get("assigned_to")}
+        if assignee_ids:
+            found = set(User.objects.filter(id__in=assignee_ids).values_list("id", flat=True))
+            missing = sorted(assignee_ids - found)
+            if missing:
+                raise serializers.ValidationError(f"Unknown assigned_to user ids: {missing}")
+        return attrs
+
+    def create(self, validated_data):
+        # import locale: ml_utils importa i model e carica scikit-learn
+        from .ml_utils import categorize_tickets, index_tickets
+
+        request = self.context.get("request")
+        created_by = request.user if request else None
+        tickets = []
+        uncategorized = []
+        for item in validated_data:
+            item = dict(item)
+            ticket = Ticket(created_by=created_by, assigned_to_id=item.pop("assigned_to", None), **item)
+            tickets.append(ticket)
+            if "category" not in item:
+                uncategorized.append(ticket)
+
+        if self.context.get("categorize") and uncategorized:
+            categorize_tickets(uncategorized)
+
+        with transaction.atomic():
+            tickets = Ticket.objects.bulk_create(tickets, batch_size=self.batch_size)
+            # bulk_create non passa dai signal: il rollup giornaliero va aggiornato qui
+            TicketDailyStats.add_tickets(tickets)
+        # bulk_create non passa da save()/signal: aggiorniamo l'indice di similarità a mano
+        index_tickets(tickets)
+        return tickets
+
+
+class TicketBulkCreateSerializer(serializers.ModelSerializer):
+    """
+    Singolo ticket in POST /api/tickets/bulk/ (usato con many=True).
+    assigned_to è un semplice id, verificato in blocco dal list serializer.
+    """
+    assigned_to = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+
+    class Meta:
+        model = Ticket
+        fields = ["title", "description", "status", "priority", "category", "assigned_to"]
+        list_serializer_class = TicketBulkListSerializer
+
+
+class TrainRequestSerializer(serializers.Serializer):
+    """
+    Input (opzionale) di POST /api/ml/train/.
+    """
+    mode = serializers.ChoiceField(choices=TrainingJob.MODE_CHOICES, default="full")
+
+
+class PredictBatchSerializer(serializers.Serializer):
+    """
+    Input di POST /api/ml/predict_batch/: lista di id oppure filtri
+    (category, status) per selezionare i ticket da ricategorizzare.
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=10_000,
+        error_messages={
+            "max_length": "Ensure this field has no more than {max_length} elements; "
+            "select larger backlogs with the category/status filters instead.",
+        },
+    )
+    category = serializers.ChoiceField(choices=Ticket.CATEGORY_CHOICES, required=False)
+    status = serializers.ChoiceField(choices=Ticket.STATUS_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Provide ids or at least one filter (category, status)")
+        return attrs
+
+
+class SimilarTextSerializer(serializers.Serializer):
+    """
+    Input di POST /api/tickets/search_similar/: testo libero di un ticket non ancora creato.
+    """
+    title = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    description = serializers.CharField(required=False, allow_blank=True)
+    top = serializers.IntegerField(required=False, default=5, min_value=1, max_value=20)
+
+    def validate(self, attrs):
+        if not (attrs.get("title", "").strip() or attrs.get("description", "").strip()):
+            raise serializers.ValidationError("Provide a title or a description")
+        return attrs
+
+
+class TicketFilterSerializer(serializers.Serializer):
+    """
+    Filtri per selezionare i ticket delle operazioni in blocco.
+    """
+    status = serializers.ChoiceField(choices=Ticket.STATUS_CHOICES, required=False)
+    category = serializers.ChoiceField(choices=Ticket.CATEGORY_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Ticket.PRIORITY_CHOICES, required=False)
+    assigned_to = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    updated_before = serializers.DateTimeField(required=False)
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """
+    Selezione dei ticket per bulk_transition / bulk_assign:
+    lista di id e/o filtri (combinati in AND).
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=10_000,
+    )
+    filter = TicketFilterSerializer(required=False)
+
+    def validate(self, attrs):
+        if "ids" not in attrs and not attrs.get("filter"):
+            raise serializers.ValidationError("Provide ids or at least one filter")
+        return attrs
+
+    def get_queryset(self):
+        qs = Ticket.objects.all()
+        if "ids" in self.validated_data:
+            qs = qs.filter(id__in=self.validated_data["ids"])
+        filters = dict(self.validated_data.get("filter", {}))
+        if "updated_before" in filters:
+            filters["updated_at__lt"] = filters.pop("updated_before")
+        if "assigned_to" in filters:
+            filters["assigned_to_id"] = filters.pop("assigned_to")
+        return qs.filter(**filters)
+
+
+class BulkTransitionSerializer(BulkSelectionSerializer):
+    """
+    Input di POST /api/tickets/bulk_transition/.
+    """
+    status = serializers.ChoiceField(choices=Ticket.STATUS_CHOICES)
+
+
+class BulkAssignSerializer(BulkSelectionSerializer):
+    """
+    Input di POST /api/tickets/bulk_assign/ (assigned_to null = rimuove l'assegnazione).
+    """
+    assigned_to = serializers.PrimaryKeyRelatedField(queryset=User.objects.all(), allow_null=True)
+
+
+class TrainingJobSerializer(serializers.ModelSerializer):
+    """
+    Stato di un job di training (POST /api/ml/train/, GET /api/ml/jobs/{id}/).
+    """
+    created_by = serializers.StringRelatedField(read_only=True)
+    duration_seconds = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = TrainingJob
+        fields = [
+            "id",
+            "mode",
+            "status",
+            "progress",
+            "stage",
+            "created_by",
+            "created_at",
+            "started_at",
+            "finished_at",
+            "duration_seconds",
+            "result",
+            "error",
+        ]
+        read_only_fields = fields
+
+
+class ModelVersionSerializer(serializers.ModelSerializer):
+    """
+    Versione del modello nel registro (GET /api/ml/models/).
+    """
+
+    class Meta:
+        model = ModelVersion
+        fields = ["version", "artifact_dir", "checksum", "metrics", "is_active", "created_at"]
+        read_only_fields = fields
@@ -0,0 +1,85 @@
+"""
+Signal handler sui Ticket: mantengono allineati l'indice di similarità, i
+vettori salvati (TicketVector), il rollup giornaliero (TicketDailyStats) e le
+tracce delle cancellazioni (DeletedTicket) quando un ticket viene creato,
+modificato o cancellato.
+Dopo migrate reinstallano i trigger della ricerca full-text su SQLite.
+"""
+from django.db import connections
+from django.db.models.signals import post_migrate, post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .models import DeletedTicket, Ticket, TicketDailyStats, add_delta
+from . import ml_utils
+from .search import ensure_sqlite_triggers
+
+
+# campi che determinano la riga (e il contributo) del ticket nel rollup giornaliero
+STATS_FIELDS = ("created_at", "category", "status", "resolved_at")
+
+
+@receiver(pre_save, sender=Ticket)
+def ticket_stats_before_save(sender, instance, update_fields=None, **kwargs):
+    instance._stats_before = None
+    if instance._state.adding:
+        return
+    if update_fields is not None and not set(STATS_FIELDS) & set(update_fields):
+        return
+    loaded = getattr(instance, "_loaded_values", {})
+    if all(name in loaded for name in STATS_FIELDS):
+        values = [loaded[name] for name in STATS_FIELDS]
+    else:
+        # istanza non caricata dal DB (o con campi deferred): una SELECT prima dell'UPDATE
+        values = Ticket.objects.filter(pk=instance.pk).values_list(*STATS_FIELDS).first()
+    if values is not None:
+        instance._stats_before = TicketDailyStats.contribution(*values)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_stats_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    before = getattr(instance, "_stats_before", None)
+    if not created and before is None:
+        return
+    after = TicketDailyStats.contribution(
+        instance.created_at, instance.category, instance.status, instance.resolved_at
+    )
+    if after == before:
+        return
+    deltas = {after[0]: after[1]}
+    if before is not None:
+        key, (c, r, s) = before
+        add_delta(deltas, key, -c, -r, -s)
+    TicketDailyStats.apply_on_commit(deltas)
+
+
+@receiver(post_save, sender=Ticket)
+def ticket_saved(sender, instance, created=False, update_fields=None, **kwargs):
+    # se il save tocca solo campi non testuali (es. status, category) il vettore non cambia
+    if update_fields is not None and not {"title", "description"} & set(update_fields):
+        return
+    # save() completo: conta solo se il testo è davvero cambiato rispetto al DB
+    if not created and not (instance.field_changed("title") or instance.field_changed("description")):
+        return
+    ml_utils.update_ticket_vector(instance, created=created)
+
+
+@receiver(pre_delete, sender=Ticket)
+def ticket_stats_before_delete(sender, instance, **kwargs):
+    # valori dal DB: l'istanza in memoria può essere vecchia (es. dopo un bulk_transition)
+    instance._stats_before = Ticket.objects.filter(pk=instance.pk).values_list(*STATS_FIELDS).first()
+
+
+@receiver(post_delete, sender=Ticket)
+def ticket_deleted(sender, instance, **kwargs):
+    DeletedTicket.objects.create(ticket_id=instance.pk)
+    ml_utils.remove_from_similarity_index(instance.pk)
+    values = getattr(instance, "_stats_before", None)
+    if values is not None:
+        key, (c, r, s) = TicketDailyStats.contribution(*values)
+        TicketDailyStats.apply_on_commit({key: (-c, -r, -s)})
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    if sender.name == "tickets":
+        ensure_sqlite_triggers(connections[using])
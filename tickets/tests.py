@@ -1,19 +1,90 @@
-from datetime import timedelta
+import csv
+import json
+import re
+import tempfile
+from datetime import date, timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
+import numpy as np
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.models import QuerySet, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
 from rest_framework.test import APITestCase
 
-from .models import Ticket
+from .models import DeletedTicket, ModelVersion, Ticket, TicketDailyStats, TicketVector, TrainingJob
+from . import jobs, ml_utils
+from .compact_model import load_compact, save_compact
+from .serializers import TicketReadSerializer, TicketSerializer
 from .ml_utils import train_model, predict_category_for_ticket, get_similar_tickets
 
 
 User = get_user_model()
 
 
+def ticket_statements(ctx):
+    """
+    Tipo (SELECT/UPDATE/...) delle query catturate che toccano tickets_ticket.
+    """
+    table = f'"{Ticket._meta.db_table}"'
+    return [q["sql"].split()[0].upper() for q in ctx.captured_queries if table in q["sql"]]
+
+
+def statements(ctx):
+    """
+    (tipo, tabella) di tutte le query catturate, es. ("UPDATE", "tickets_ticket"):
+    per le scritture si contano anche quelle sul rollup giornaliero.
+    """
+    result = []
+    for query in ctx.captured_queries:
+        table = re.search(r'(?:UPDATE|INTO|FROM)\s+"(\w+)"', query["sql"])
+        result.append((query["sql"].split()[0].upper(), table.group(1) if table else None))
+    return result
+
+
+class IsolatedModelDirMixin:
+    """
+    I test che allenano il modello scrivono gli artifact in una directory
+    temporanea (non in BASE_DIR/ml/artifacts) e partono con le cache di
+    ml_utils vuote: ogni DB di test riparte dalla versione 1 e altrimenti
+    sovrascriverebbe le versioni reali dello sviluppatore.
+    """
+
+    def setUp(self):
+        super().setUp()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        model_dir = Path(tmp.name)
+        patcher = mock.patch.multiple(
+            ml_utils,
+            MODEL_DIR=model_dir,
+            MODEL_PATH=model_dir / "ticket_classifier.joblib",
+            ONLINE_MODEL_PATH=model_dir / "ticket_classifier_online.joblib",
+            _cached_model=None,
+            _cached_version=None,
+            _cached_dir=model_dir,
+            _checked_at=0.0,
+            _cached_index=None,
+            _cached_ann=None,
+            _index_checked_at=0.0,
+            _cached_online=None,
+            _online_mtime=None,
+            _online_checked_at=0.0,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
 class TicketModelTests(TestCase):
     """
     Test di base sul modello Ticket:
@@ -76,8 +147,75 @@ class TicketModelTests(TestCase):
 
         self.assertIsNone(ticket.resolved_at)
 
+    def test_status_change_is_a_single_query(self):
+        """
+        Lo status precedente è tracciato in memoria: il save di un ticket
+        caricato dal DB è un solo UPDATE (niente SELECT, niente secondo UPDATE),
+        e resolved_at viene scritto nella stessa query.
+        Il rollup giornaliero si aggiorna solo dopo il commit: un UPDATE a
+        incremento per riga (più l'INSERT di una riga che non esiste ancora).
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(
+                title="Query count",
+                description="One query per update",
+                created_by=self.user,
+            )
+        ticket = Ticket.objects.get(title="Query count")
 
-class TicketAPITests(APITestCase):
+        ticket.status = "RESOLVED"
+        with self.assertNumQueries(1), self.captureOnCommitCallbacks() as callbacks:
+            ticket.save()
+        with CaptureQueriesContext(connection) as ctx:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(
+            statements(ctx),
+            [
+                ("UPDATE", "tickets_ticketdailystats"),
+                ("INSERT", "tickets_ticketdailystats"),
+                ("UPDATE", "tickets_ticketdailystats"),
+                ("UPDATE", "tickets_ticketdailystats"),
+            ],
+        )
+
+        ticket.status = "OPEN"
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            ticket.save(update_fields=["status"])
+        self.assertEqual(
+            statements(ctx),
+            [
+                ("UPDATE", "tickets_ticket"),
+                ("UPDATE", "tickets_ticketdailystats"),
+                ("UPDATE", "tickets_ticketdailystats"),
+            ],
+        )
+
+        ticket.refresh_from_db()
+        self.assertIsNone(ticket.resolved_at)
+
+    def test_loading_deferred_field_keeps_unsaved_changes(self):
+        """
+        Leggere un campo deferred dopo aver cambiato lo status non fa passare il
+        nuovo status per "letto dal DB": il save imposta resolved_at e il rollup
+        sposta il ticket dalla riga giusta.
+        """
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(title="Deferred", description="Loaded later", category="bug", created_by=self.user)
+        ticket = Ticket.objects.defer("description").get(title="Deferred")
+
+        ticket.status = "RESOLVED"
+        self.assertEqual(ticket.description, "Loaded later")
+        with self.captureOnCommitCallbacks(execute=True):
+            ticket.save()
+
+        ticket.refresh_from_db()
+        self.assertIsNotNone(ticket.resolved_at)
+        rows = TicketDailyStats.objects.filter(created_count__gt=0).values_list("status", "created_count")
+        self.assertEqual(list(rows), [("RESOLVED", 1)])
+
+
+class TicketAPITests(IsolatedModelDirMixin, APITestCase):
     """
     Test sugli endpoint REST principali:
     - lista / filtro / ordinamento
@@ -87,6 +225,9 @@ class TicketAPITests(APITestCase):
     """
 
     def setUp(self):
+        super().setUp()
+        # le risposte di analytics in cache non devono passare da un test all'altro
+        cache.clear()
         # Utente autenticato per le chiamate API
         self.user = User.objects.create_user(
             username="apiuser",
@@ -95,6 +236,11 @@ class TicketAPITests(APITestCase):
         )
         self.client.force_authenticate(user=self.user)
 
+        # il rollup giornaliero si aggiorna dopo il commit: i callback vanno eseguiti
+        with self.captureOnCommitCallbacks(execute=True):
+            self._create_tickets()
+
+    def _create_tickets(self):
         # Creiamo un po' di ticket con categorie diverse
         self.ticket_billing = Ticket.objects.create(
             title="Billing issue",
@@ -142,6 +288,197 @@ class TicketAPITests(APITestCase):
         self.assertIn("results", response.data)
         self.assertGreaterEqual(len(response.data["results"]), 3)
 
+    def test_read_serializer_matches_ticket_serializer(self):
+        """
+        Lista e dettaglio usano TicketReadSerializer: stesso JSON di TicketSerializer
+        (chiavi, ordine, formato delle date, id di assigned_to, username di created_by).
+        """
+        tickets = Ticket.objects.select_related("created_by").order_by("id")
+        self.assertEqual(
+            TicketReadSerializer(tickets, many=True).data,
+            TicketSerializer(tickets, many=True).data,
+        )
+        with timezone.override("Europe/Rome"):
+            self.assertEqual(
+                TicketReadSerializer(self.ticket_resolved).data,
+                TicketSerializer(self.ticket_resolved).data,
+            )
+
+        response = self.client.get(reverse("tickets-list"), {"ordering": "created_at"})
+        expected = TicketSerializer(Ticket.objects.order_by("created_at", "id"), many=True).data
+        self.assertEqual(response.data["results"], expected)
+        response = self.client.get(reverse("tickets-detail", args=[self.ticket_bug.id]))
+        self.assertEqual(response.data, TicketSerializer(self.ticket_bug).data)
+
+    def test_ticket_sparse_fieldsets(self):
+        """
+        ?fields= / ?omit= restringono sia la risposta sia le colonne lette dal DB
+        (description non compare nella SELECT), su lista, dettaglio ed export.
+        """
+        url = reverse("tickets-list")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"fields": "id,title,status,priority"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data["results"][0]), ["id", "title", "status", "priority"])
+        # COUNT + SELECT della pagina: nessun caricamento di campi deferred riga per riga
+        self.assertEqual(len(ctx.captured_queries), 2)
+        select = next(q["sql"] for q in ctx.captured_queries if q["sql"].startswith("SELECT") and "LIMIT" in q["sql"])
+        self.assertNotIn('"description"', select)
+        self.assertNotIn("auth_user", select)
+
+        # created_at resta caricato anche se non richiesto: serve al cursore keyset
+        Ticket.objects.bulk_create(
+            [Ticket(title=f"Filler {i}", description="x" * 1000, created_by=self.user) for i in range(20)]
+        )
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"omit": "description,created_at", "pagination": "cursor"})
+        first = response.data["results"][0]
+        self.assertNotIn("description", first)
+        self.assertEqual(first["created_by"], self.user.username)
+        self.assertNotIn('"description"', ctx.captured_queries[-1]["sql"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data["results"]), 3)
+
+        response = self.client.get(reverse("tickets-detail", args=[self.ticket_bug.id]), {"fields": "title"})
+        self.assertEqual(response.data, {"title": self.ticket_bug.title})
+
+        response = self.client.get(reverse("tickets-export"), {"format": "ndjson", "fields": "id,status"})
+        items = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual(set(map(tuple, (i.keys() for i in items))), {("id", "status")})
+
+        self.assertEqual(self.client.get(url, {"fields": "id,secret"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"fields": "id", "omit": "id"}).status_code, 400)
+
+    def test_ticket_list_cursor_pagination(self):
+        """
+        ?pagination=cursor: paginazione keyset su (created_at, id), senza duplicati
+        né salti anche tra ticket con lo stesso created_at, in avanti e all'indietro.
+        """
+        # bulk_create: tutti con lo stesso created_at -> conta lo spareggio su id
+        Ticket.objects.bulk_create(
+            [Ticket(title=f"Bulk {i}", description="x", created_by=self.user) for i in range(45)]
+        )
+        expected = list(Ticket.objects.order_by("-created_at", "-id").values_list("id", flat=True))
+
+        response = self.client.get(reverse("tickets-list"), {"pagination": "cursor"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 48)
+        self.assertIsNone(response.data["previous"])
+        seen = [t["id"] for t in response.data["results"]]
+        pages = [response]
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            pages.append(response)
+            seen += [t["id"] for t in response.data["results"]]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+
+        previous = self.client.get(pages[-1].data["previous"])
+        self.assertEqual(previous.data["results"], pages[-2].data["results"])
+
+        # count=false: nessun COUNT(*)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse("tickets-list"), {"pagination": "cursor", "count": "false"})
+        self.assertIsNone(response.data["count"])
+        self.assertFalse(any("COUNT(" in q["sql"] for q in ctx.captured_queries))
+
+        response = self.client.get(reverse("tickets-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(reverse("tickets-list"), {"pagination": "cursor", "ordering": "status"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_ticket_list_ordering_whitelist(self):
+        """
+        ?ordering= accetta solo i campi dichiarati in TicketViewSet.ORDERING
+        (coperti da indici); gli altri, o campi inesistenti, danno 400 e non 500.
+        """
+        url = reverse("tickets-list")
+        response = self.client.get(url, {"ordering": "status"})
+        self.assertEqual(response.status_code, 200)
+        statuses = [t["status"] for t in response.data["results"]]
+        self.assertEqual(statuses, sorted(statuses))
+
+        response = self.client.get(url, {"ordering": "-category"})
+        categories = [t["category"] for t in response.data["results"]]
+        self.assertEqual(categories, sorted(categories, reverse=True))
+
+        for ordering in ("description", "updated_at", "not_a_field"):
+            response = self.client.get(url, {"ordering": ordering})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("ordering", response.data)
+
+    def test_ticket_list_full_text_search(self):
+        """
+        GET /api/tickets/?q=... cerca su titolo e descrizione (FTS5 su SQLite,
+        tsvector su PostgreSQL), ordina per rilevanza e segue create/update/delete.
+        """
+        url = reverse("tickets-list")
+        in_title = Ticket.objects.create(
+            title="Invoice payment failed", description="Please help", created_by=self.user
+        )
+        in_description = Ticket.objects.create(
+            title="Question", description="Where do I find the invoice?", created_by=self.user
+        )
+        # bulk_create non passa da save(): l'indice è mantenuto dal database
+        Ticket.objects.bulk_create(
+            [Ticket(title="Invoices export", description="csv", created_by=self.user)]
+        )
+
+        response = self.client.get(url, {"q": "invoice"})
+        self.assertEqual(response.status_code, 200)
+        ids = [t["id"] for t in response.data["results"]]
+        self.assertEqual(len(ids), 3)
+        # match nel titolo più rilevante di un match nella descrizione
+        self.assertLess(ids.index(in_title.id), ids.index(in_description.id))
+
+        # più parole: devono esserci tutte
+        response = self.client.get(url, {"q": "card not working"})
+        self.assertEqual([t["id"] for t in response.data["results"]], [self.ticket_billing.id])
+
+        in_description.description = "Nothing to see here"
+        in_description.save()
+        in_title.delete()
+        response = self.client.get(url, {"q": "invoice"})
+        self.assertEqual(len(response.data["results"]), 1)
+
+        # sintassi di query non valida o vuota: nessun errore
+        for q in ['"unbalanced', "AND OR NOT", "***"]:
+            response = self.client.get(url, {"q": q})
+            self.assertEqual(response.status_code, 200)
+
+    def test_export_csv_and_ndjson_streaming(self):
+        """
+        GET /api/tickets/export/ esporta in streaming (CSV di default, NDJSON con
+        ?format=ndjson) con gli stessi filtri e gli stessi valori della lista.
+        """
+        url = reverse("tickets-export")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        rows = list(csv.DictReader(lines))
+        self.assertEqual(len(rows), 3)
+
+        detail = self.client.get(reverse("tickets-detail", args=[self.ticket_bug.id]), format="json").data
+        row = next(r for r in rows if r["id"] == str(self.ticket_bug.id))
+        self.assertEqual(list(row), list(detail))
+        self.assertEqual(row["created_by"], detail["created_by"])
+        self.assertEqual(row["created_at"], detail["created_at"])
+        self.assertEqual(row["resolved_at"], "")
+
+        response = self.client.get(url, {"format": "ndjson", "status": "OPEN", "ordering": "created_at"})
+        self.assertTrue(response["Content-Type"].startswith("application/x-ndjson"))
+        items = [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+        self.assertEqual([i["id"] for i in items], [self.ticket_billing.id, self.ticket_bug.id])
+        self.assertEqual(items[1], {**detail, "assigned_to": self.user.id})
+
+        # gli errori di validazione dei filtri arrivano nel formato richiesto
+        response = self.client.get(url, {"format": "ndjson", "ordering": "title"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("ordering", json.loads(response.content))
+
     def test_ticket_list_filter_assigned_to_me(self):
         """
         GET /api/tickets/?assigned_to=me deve tornare solo
@@ -184,17 +521,53 @@ class TicketAPITests(APITestCase):
         self.ticket_billing.refresh_from_db()
         self.assertEqual(self.ticket_billing.status, "IN_PROGRESS")
 
+    def test_transition_query_count(self):
+        """
+        POST /api/tickets/{id}/transition/ deve costare una SELECT (get_object)
+        e un solo UPDATE, anche quando imposta resolved_at; dopo il commit un
+        UPDATE a incremento per ciascuna delle due righe del rollup.
+        """
+        url = reverse("tickets-transition", args=[self.ticket_billing.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(
+                title="Resolved", description="x", status="RESOLVED", category="billing", created_by=self.user
+            )
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"status": "RESOLVED"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNotNone(response.data["resolved_at"])
+
+        self.assertEqual(
+            statements(ctx),
+            [
+                ("SELECT", "tickets_ticket"),
+                ("UPDATE", "tickets_ticket"),
+                ("UPDATE", "tickets_ticketdailystats"),
+                ("UPDATE", "tickets_ticketdailystats"),
+            ],
+        )
+
+    @override_settings(ML_JOBS_EAGER=True)
     def test_ml_train_and_predict(self):
         """
-        - POST /api/ml/train/ deve allenare il modello
+        - POST /api/ml/train/ deve accodare (ed eseguire) un job di training
+        - GET /api/ml/jobs/{id}/ deve riportarne stato e metriche
         - l'azione ml_predict deve restituire una categoria con confidenza
         """
-        # 1) train via API
+        # 1) train via API: ritorna subito il job (202)
         train_url = reverse("ml-train")
         train_response = self.client.post(train_url, format="json")
-        self.assertEqual(train_response.status_code, 200)
-        self.assertGreaterEqual(train_response.data["n_samples"], 2)
-        self.assertGreaterEqual(train_response.data["n_classes"], 2)
+        self.assertEqual(train_response.status_code, 202)
+        self.assertIn("id", train_response.data)
+
+        job_url = reverse("ml-job-detail", args=[train_response.data["id"]])
+        job_response = self.client.get(job_url)
+        self.assertEqual(job_response.status_code, 200)
+        self.assertEqual(job_response.data["status"], "SUCCEEDED")
+        self.assertEqual(job_response.data["progress"], 1.0)
+        self.assertIsNotNone(job_response.data["duration_seconds"])
+        self.assertGreaterEqual(job_response.data["result"]["n_samples"], 2)
+        self.assertGreaterEqual(job_response.data["result"]["n_classes"], 2)
 
         # 2) ml_predict su un ticket
         # NB: il nome corretto della route è tickets-ml-predict (trattino)
@@ -205,6 +578,274 @@ class TicketAPITests(APITestCase):
         # se LogisticRegression con predict_proba, c'è anche confidence
         self.assertIn("confidence", predict_response.data)
 
+    def test_ml_train_returns_active_job_without_running_it(self):
+        """
+        Senza ML_JOBS_EAGER il training non blocca la richiesta: il job resta
+        in coda e una seconda POST ritorna lo stesso job invece di accodarne un altro.
+        """
+        train_url = reverse("ml-train")
+        first = self.client.post(train_url, format="json")
+        second = self.client.post(train_url, format="json")
+
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.data["status"], "PENDING")
+        self.assertEqual(second.data["id"], first.data["id"])
+
+        missing = self.client.get(reverse("ml-job-detail", args=[first.data["id"] + 1]))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_ml_train_fails_stale_jobs(self):
+        """
+        Un job RUNNING il cui heartbeat è fermo da giorni (worker riavviato) non
+        blocca i nuovi training: viene marcato FAILED e la POST accoda un job nuovo.
+        Un training partito da giorni ma con heartbeat recente è vivo e non si tocca.
+        """
+        started = timezone.now() - timedelta(days=3)
+        stale = TrainingJob.objects.create(status="RUNNING", started_at=started, heartbeat_at=timezone.now())
+        response = self.client.post(reverse("ml-train"), format="json")
+        self.assertEqual(response.data["id"], stale.id)
+        self.assertEqual(response.data["status"], "RUNNING")
+
+        TrainingJob.objects.filter(pk=stale.pk).update(heartbeat_at=started)
+        response = self.client.post(reverse("ml-train"), format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertNotEqual(response.data["id"], stale.id)
+        stale.refresh_from_db()
+        self.assertEqual(stale.status, "FAILED")
+        self.assertIn("Timed out", stale.error)
+        self.assertIsNotNone(stale.finished_at)
+
+    @override_settings(ML_JOBS_EAGER=True)
+    def test_pending_jobs_of_previous_process_are_requeued(self):
+        """
+        I job PENDING lasciati da un processo precedente vengono eseguiti alla prima
+        richiesta di training; un job già preso da un altro worker non riparte.
+        """
+        leftover = TrainingJob.objects.create()
+        with mock.patch.object(jobs, "_requeued", False):
+            response = self.client.post(reverse("ml-train"), format="json")
+            self.assertEqual(response.status_code, 202)
+            leftover.refresh_from_db()
+            self.assertEqual(leftover.status, "SUCCEEDED")
+
+            # solo la prima richiesta del processo rimette in coda
+            orphan = TrainingJob.objects.create(mode="incremental")
+            self.client.post(reverse("ml-train"), format="json")
+            orphan.refresh_from_db()
+            self.assertEqual(orphan.status, "PENDING")
+
+        running = TrainingJob.objects.create(status="RUNNING", started_at=timezone.now())
+        train = mock.Mock()
+        with mock.patch.dict(jobs.TRAINERS, {"full": train}):
+            jobs.run_training_job(running.pk)
+        train.assert_not_called()
+
+    def test_single_active_training_job_per_mode(self):
+        """
+        Il DB ammette un solo job attivo per tipo: se un altro processo accoda tra
+        il controllo e l'INSERT, submit_training_job ritorna il suo job. Un job
+        marcato FAILED mentre girava non viene riportato a SUCCEEDED.
+        """
+        existing = TrainingJob.objects.create(mode="full")
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TrainingJob.objects.create(mode="full", status="RUNNING")
+        TrainingJob.objects.create(mode="incremental")
+
+        real_first = QuerySet.first
+        calls = []
+
+        def first(qs):
+            # il primo controllo non vede il job appena accodato dall'altro processo
+            calls.append(qs)
+            return None if len(calls) == 1 else real_first(qs)
+
+        with mock.patch.object(jobs, "_requeued", True), mock.patch.object(QuerySet, "first", first):
+            job = jobs.submit_training_job(self.user, mode="full")
+        self.assertEqual(job.pk, existing.pk)
+        self.assertEqual(TrainingJob.objects.filter(mode="full").count(), 1)
+
+        def train(progress):
+            # scaduto (fail_stale_jobs) mentre il training era ancora in corso
+            TrainingJob.objects.filter(pk=existing.pk).update(status="FAILED", error="Timed out")
+            return {"n_samples": 10}
+
+        with mock.patch.dict(jobs.TRAINERS, {"full": train}):
+            jobs.run_training_job(existing.pk)
+        existing.refresh_from_db()
+        self.assertEqual((existing.status, existing.error), ("FAILED", "Timed out"))
+
+    def test_ml_predict_batch(self):
+        """
+        POST /api/ml/predict_batch/ ricategorizza in blocco i ticket
+        selezionati per id o per filtro.
+        """
+        url = reverse("ml-predict-batch")
+        train_model()
+
+        response = self.client.post(
+            url, {"ids": [self.ticket_billing.id, self.ticket_bug.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["processed"], 2)
+
+        # ticket finito in "other": il filtro per categoria lo ricategorizza
+        Ticket.objects.filter(pk=self.ticket_billing.pk).update(category="other")
+        TicketDailyStats.reconcile()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"category": "other"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["processed"], 1)
+        self.assertEqual(response.data["updated"], 1)
+        self.ticket_billing.refresh_from_db()
+        self.assertEqual(self.ticket_billing.category, "billing")
+        # il contributo al rollup si è spostato da other a billing
+        rows = dict(TicketDailyStats.objects.filter(status="OPEN").values_list("category", "created_count"))
+        self.assertEqual((rows["other"], rows["billing"]), (0, 1))
+
+        # nessun id e nessun filtro -> 400
+        response = self.client.post(url, {}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+        # troppi id: si rimanda ai filtri
+        response = self.client.post(url, {"ids": list(range(1, 10_002))}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("filters", str(response.data["ids"][0]))
+
+    def test_bulk_create_json_and_ndjson(self):
+        """
+        POST /api/tickets/bulk/ crea molti ticket con poche query,
+        sia da array JSON sia da NDJSON; un elemento non valido annulla tutto.
+        """
+        url = reverse("tickets-bulk")
+        items = [
+            {"title": f"Imported {i}", "description": "from email gateway", "priority": "LOW"}
+            for i in range(50)
+        ]
+        items[0]["assigned_to"] = self.user.id
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(url, items, format="json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 50)
+        # utente autenticato + verifica assegnatari + INSERT: nessuna query per ticket
+        self.assertLess(len(ctx.captured_queries), 10)
+        first = Ticket.objects.get(pk=response.data["ids"][0])
+        self.assertEqual(first.assigned_to_id, self.user.id)
+        self.assertEqual(first.created_by_id, self.user.id)
+
+        body = '{"title": "Nd 1", "description": "a"}\n\n{"title": "Nd 2", "description": "b"}\n'
+        response = self.client.post(url, body, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["created"], 2)
+
+        before = Ticket.objects.count()
+        bad = [{"title": "ok", "description": "x"}, {"title": "ko", "description": "x", "assigned_to": 99999}]
+        response = self.client.post(url, bad, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Ticket.objects.count(), before)
+
+        response = self.client.post(url, "{not json", content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_create_with_categorize(self):
+        """
+        ?categorize=true assegna la categoria predetta solo ai ticket che non la specificano.
+        """
+        url = reverse("tickets-bulk") + "?categorize=true"
+        items = [
+            {"title": "Billing issue", "description": "Card not working"},
+            {"title": "Bug on dashboard", "description": "Error 500", "category": "feature"},
+        ]
+        train_model()
+        response = self.client.post(url, items, format="json")
+        self.assertEqual(response.status_code, 201)
+        created = Ticket.objects.in_bulk(response.data["ids"])
+        self.assertEqual(created[response.data["ids"][0]].category, "billing")
+        self.assertEqual(created[response.data["ids"][1]].category, "feature")
+
+    def test_bulk_transition_maintains_resolved_at(self):
+        """
+        POST /api/tickets/bulk_transition/ aggiorna tutti i ticket con un solo UPDATE
+        e gestisce resolved_at come Ticket.save (impostato su RESOLVED, azzerato alla riapertura).
+        Prima dell'UPDATE una SELECT raggruppata calcola lo spostamento nel rollup,
+        applicato dopo il commit con un UPDATE a incremento per riga toccata.
+        """
+        url = reverse("tickets-bulk-transition")
+        ids = [self.ticket_billing.id, self.ticket_bug.id, self.ticket_resolved.id]
+
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, {"ids": ids, "status": "RESOLVED"}, format="json")
+        self.assertEqual(response.status_code, 200)
+        # il ticket già RESOLVED non viene toccato (e mantiene il suo resolved_at)
+        self.assertEqual(response.data["updated"], 2)
+        writes = [s for s in statements(ctx) if s[0] not in ("SAVEPOINT", "RELEASE")]
+        # billing/OPEN e bug/OPEN escono (-1), billing/RESOLVED e bug/RESOLVED entrano
+        # (righe nuove: UPDATE a vuoto, INSERT, UPDATE)
+        stats = "tickets_ticketdailystats"
+        self.assertEqual(
+            writes,
+            [("SELECT", "tickets_ticket"), ("UPDATE", "tickets_ticket")]
+            + [("UPDATE", stats), ("UPDATE", stats), ("INSERT", stats), ("UPDATE", stats)] * 2,
+        )
+        self.assertEqual(TicketDailyStats.objects.filter(status="RESOLVED").aggregate(n=Sum("created_count"))["n"], 3)
+        # stessi valori (secondi di risoluzione inclusi) di un ricalcolo da zero
+        rollup = TicketDailyStats.objects.filter(created_count__gt=0).order_by("category", "status")
+        fields = ("date", "category", "status", "created_count", "resolved_count", "resolution_seconds")
+        incremental = list(rollup.values_list(*fields))
+        TicketDailyStats.reconcile()
+        for row, expected in zip(incremental, rollup.values_list(*fields)):
+            self.assertEqual(row[:5], expected[:5])
+            self.assertAlmostEqual(row[5], expected[5], places=3)
+        self.assertEqual(len(incremental), rollup.count())
+
+        resolved_at = dict(Ticket.objects.values_list("id", "resolved_at"))
+        self.assertIsNotNone(resolved_at[self.ticket_billing.id])
+        self.assertEqual(resolved_at[self.ticket_resolved.id], self.ticket_resolved.resolved_at)
+
+        response = self.client.post(
+            url, {"filter": {"status": "RESOLVED", "category": "bug"}, "status": "OPEN"}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 1)
+        self.ticket_bug.refresh_from_db()
+        self.assertEqual(self.ticket_bug.status, "OPEN")
+        self.assertIsNone(self.ticket_bug.resolved_at)
+
+        # né id né filtri -> 400
+        response = self.client.post(url, {"status": "CLOSED"}, format="json")
+        self.assertEqual(response.status_code, 400)
+
+    def test_bulk_assign(self):
+        """
+        POST /api/tickets/bulk_assign/ assegna (o rimuove l'assegnazione) in blocco.
+        """
+        url = reverse("tickets-bulk-assign")
+        response = self.client.post(
+            url, {"filter": {"assigned_to": None}, "assigned_to": self.user.id}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertFalse(Ticket.objects.filter(assigned_to__isnull=True).exists())
+
+        response = self.client.post(
+            url, {"ids": [self.ticket_bug.id], "assigned_to": None}, format="json"
+        )
+        self.assertEqual(response.data["updated"], 1)
+        self.assertEqual(Ticket.objects.filter(assigned_to__isnull=True).count(), 1)
+
+    def test_search_similar_endpoint(self):
+        """
+        POST /api/tickets/search_similar/ con testo libero.
+        """
+        url = reverse("tickets-search-similar")
+        train_model()
+        response = self.client.post(url, {"title": "Card declined", "top": 2}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data[0]["id"], self.ticket_billing.id)
+        self.assertLessEqual(len(response.data), 2)
+
+        response = self.client.post(url, {"title": " "}, format="json")
+        self.assertEqual(response.status_code, 400)
+
     def test_similar_endpoint_with_top_param(self):
         """
         GET /api/tickets/{id}/similar/?top=1 deve rispettare il limite top.
@@ -231,6 +872,48 @@ class TicketAPITests(APITestCase):
         # Almeno una categoria presente
         self.assertGreater(len(response.data["by_category"]), 0)
 
+    def test_analytics_trends_series(self):
+        """
+        GET /api/analytics/trends/series/ ritorna una serie densa (zero dove non ci
+        sono ticket) per ogni categoria, a bucket giornalieri o settimanali.
+        """
+        url = reverse("analytics-trends-series")
+        moved = Ticket.objects.get(pk=self.ticket_bug.pk)
+        moved.created_at -= timedelta(days=10)
+        with self.captureOnCommitCallbacks(execute=True):
+            moved.save(update_fields=["created_at"])
+        # categorie fuori da CATEGORY_CHOICES (es. dismesse) non finiscono in altre serie
+        for legacy in ("aaa", "zzz"):
+            TicketDailyStats.objects.create(
+                date=timezone.localdate(), category=legacy, status="OPEN", created_count=5
+            )
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"days": 14})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len([q for q in ctx.captured_queries if "dailystats" in q["sql"]]), 1)
+
+        today = timezone.localdate()
+        buckets = response.data["buckets"]
+        self.assertEqual(len(buckets), 15)
+        self.assertEqual(buckets[-1], today.isoformat())
+        series = {s["category"]: s["counts"] for s in response.data["series"]}
+        self.assertEqual(set(series), {value for value, _ in Ticket.CATEGORY_CHOICES})
+        self.assertEqual(series["other"], [0] * 15)
+        self.assertEqual(series["bug"][buckets.index((today - timedelta(days=10)).isoformat())], 1)
+        self.assertEqual(sum(series["bug"]), 1)
+
+        response = self.client.get(url, {"days": 14, "bucket": "week"})
+        buckets = response.data["buckets"]
+        # bucket settimanali dal lunedì, l'ultimo contiene oggi
+        self.assertTrue(all(date.fromisoformat(b).weekday() == 0 for b in buckets))
+        self.assertEqual(buckets[-1], (today - timedelta(days=today.weekday())).isoformat())
+        totals = {s["category"]: s["total"] for s in response.data["series"]}
+        self.assertEqual(totals, {"billing": 1, "bug": 1, "feature": 1, "account": 0, "other": 0})
+
+        response = self.client.get(url, {"bucket": "month"})
+        self.assertEqual(response.status_code, 400)
+
     def test_analytics_mttr_positive(self):
         """
         GET /api/analytics/mttr/?days=90 deve restituire un MTTR
@@ -242,3 +925,645 @@ class TicketAPITests(APITestCase):
         mttr = response.data["mttr_seconds"]
         self.assertIsNotNone(mttr)
         self.assertGreater(mttr, 0)
+
+    def test_analytics_cached_and_invalidated_on_write(self):
+        """
+        La seconda richiesta di analytics uguale arriva dalla cache (nessuna query);
+        una scrittura sui ticket, dopo il commit, invalida le risposte salvate.
+        """
+        url = reverse("analytics-trends")
+        self.client.get(url, {"days": 30})
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"days": 30})
+        self.assertFalse([q for q in ctx.captured_queries if "dailystats" in q["sql"]])
+        self.assertEqual(sum(row["count"] for row in response.data["by_category"]), 3)
+
+        # finestra diversa = chiave diversa
+        self.client.get(url, {"days": 7})
+        stats = self.client.get(reverse("analytics-cache")).data
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 2))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Ticket.objects.create(title="New", description="after caching", created_by=self.user)
+        self.assertGreater(self.client.get(reverse("analytics-cache")).data["generation"], stats["generation"])
+        response = self.client.get(url, {"days": 30})
+        self.assertEqual(sum(row["count"] for row in response.data["by_category"]), 4)
+
+        # un save che non tocca status/categoria/date non cambia gli analytics: niente invalidazione
+        generation = self.client.get(reverse("analytics-cache")).data["generation"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.ticket_bug.title = "Renamed"
+            self.ticket_bug.save()
+        self.assertEqual(self.client.get(reverse("analytics-cache")).data["generation"], generation)
+
+    def test_analytics_mttr_percentiles(self):
+        """
+        GET /api/analytics/mttr/percentiles/ calcola p50/p90/p99 del tempo di
+        risoluzione (interpolazione lineare, come percentile_cont) con una sola
+        query, in totale o per dimensione.
+        """
+        base = timezone.now() - timedelta(days=2)
+        hours = [1, 2, 3, 4, 50]
+        for i, h in enumerate(hours):
+            ticket = Ticket.objects.create(
+                title=f"Resolved {i}",
+                description="percentiles",
+                category="bug",
+                priority="HIGH" if i % 2 else "LOW",
+                created_by=self.user,
+                assigned_to=self.user if i < 2 else None,
+            )
+            ticket.created_at = base
+            ticket.resolved_at = base + timedelta(hours=h)
+            ticket.save(update_fields=["created_at", "resolved_at"])
+
+        url = reverse("analytics-mttr-percentiles")
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, {"days": 30, "by": "category"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(ticket_statements(ctx), ["SELECT"])
+
+        by_category = {row["category"]: row for row in response.data["results"]}
+        self.assertEqual(set(by_category), {"bug", "feature"})
+        bug = by_category["bug"]
+        expected = np.percentile(np.array(hours) * 3600.0, [50, 90, 99])
+        self.assertEqual(bug["count"], 5)
+        self.assertAlmostEqual(bug["p50_seconds"], expected[0], places=3)
+        self.assertAlmostEqual(bug["p90_seconds"], expected[1], places=3)
+        self.assertAlmostEqual(bug["p99_seconds"], expected[2], places=3)
+        self.assertAlmostEqual(bug["mean_seconds"], np.mean(hours) * 3600, places=3)
+
+        response = self.client.get(url, {"days": 30, "by": "assigned_to"})
+        counts = {row["assigned_to"]: row["count"] for row in response.data["results"]}
+        self.assertEqual(counts, {self.user.id: 2, None: 4})
+
+        response = self.client.get(url, {"days": 30})
+        self.assertEqual(response.data["count"], 6)
+        self.assertIn("p99_seconds", response.data)
+
+        self.assertEqual(self.client.get(url, {"by": "title"}).status_code, 400)
+
+    def test_daily_stats_rollup_kept_in_sync(self):
+        """
+        Il rollup TicketDailyStats aggiornato incrementalmente (save, delete,
+        bulk create, bulk transition) coincide con quello ricalcolato da zero,
+        e gli analytics ne leggono i valori corretti.
+        """
+        def snapshot():
+            return sorted(
+                TicketDailyStats.objects.filter(created_count__gt=0).values_list(
+                    "date", "category", "status", "created_count", "resolved_count", "resolution_seconds"
+                )
+            )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("tickets-bulk"),
+                [
+                    {"title": "Bulk one", "description": "imported", "category": "bug"},
+                    {"title": "Bulk two", "description": "imported", "category": "bug"},
+                ],
+                format="json",
+            )
+            self.assertEqual(response.status_code, 201)
+            self.client.post(reverse("tickets-transition", args=[self.ticket_billing.id]), {"status": "RESOLVED"})
+            self.client.post(
+                reverse("tickets-bulk-transition"), {"filter": {"category": "bug"}, "status": "CLOSED"}, format="json"
+            )
+            # spostato al giorno prima: il contributo cambia riga
+            moved = Ticket.objects.get(title="Bulk one")
+            moved.created_at -= timedelta(days=1)
+            moved.save(update_fields=["created_at"])
+            self.ticket_bug.delete()
+
+        incremental = snapshot()
+        self.assertEqual(sum(row[3] for row in incremental), Ticket.objects.count())
+        TicketDailyStats.reconcile()
+        self.assertEqual(incremental, snapshot())
+
+        response = self.client.get(reverse("analytics-trends"), {"days": 30})
+        counts = {row["category"]: row["count"] for row in response.data["by_category"]}
+        self.assertEqual(counts, {"billing": 1, "bug": 2, "feature": 1})
+
+        # MTTR = media su ticket_resolved (1 h) e ticket_billing (appena risolto)
+        resolved = Ticket.objects.filter(resolved_at__isnull=False)
+        expected = sum((t.resolved_at - t.created_at).total_seconds() for t in resolved) / len(resolved)
+        response = self.client.get(reverse("analytics-mttr"), {"days": 30})
+        self.assertAlmostEqual(response.data["mttr_seconds"], expected, places=3)
+
+
+class SimilarityIndexTests(IsolatedModelDirMixin, TestCase):
+    """
+    Test sull'indice di similarità precalcolato:
+    - costruito al training su tutti i ticket
+    - aggiornato incrementalmente su create/update/delete
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username="indexuser",
+            email="indexuser@example.com",
+            password="supersecurepassword123",
+        )
+        self.billing = Ticket.objects.create(
+            title="Invoice not received",
+            description="I did not receive the invoice for my payment",
+            category="billing",
+            created_by=self.user,
+        )
+        self.bug = Ticket.objects.create(
+            title="Dashboard crash",
+            description="Error 500 when loading the dashboard",
+            category="bug",
+            created_by=self.user,
+        )
+        train_model()
+
+    def test_index_built_at_training_time(self):
+        """
+        Dopo train_model l'indice contiene tutti i ticket esistenti.
+        """
+        index = ml_utils.load_similarity_index()
+        self.assertEqual(len(index), 2)
+        self.assertTrue((ml_utils._artifact_dir() / ml_utils.INDEX_FILENAME).exists())
+
+    def test_new_ticket_is_indexed_incrementally(self):
+        """
+        Un ticket creato dopo il training compare tra i simili
+        senza dover riallenare il modello.
+        """
+        duplicate = Ticket.objects.create(
+            title="Invoice missing",
+            description="The invoice for my last payment was not received",
+            category="billing",
+            created_by=self.user,
+        )
+
+        results = get_similar_tickets(self.billing, top_k=1)
+        self.assertEqual(results[0]["id"], duplicate.id)
+
+        duplicate.delete()
+        ids = {r["id"] for r in get_similar_tickets(self.billing, top_k=5)}
+        self.assertNotIn(duplicate.id, ids)
+
+    @override_settings(ML_REGISTRY_TTL=0)
+    def test_cached_index_catches_up_with_other_workers(self):
+        """
+        Le scritture fatte da un altro worker (qui: signal disattivati) entrano
+        nell'indice già in cache al successivo controllo, cancellazioni comprese.
+        """
+        index = ml_utils.load_similarity_index()
+        with mock.patch.object(ml_utils, "update_ticket_vector"), \
+                mock.patch.object(ml_utils, "remove_from_similarity_index"):
+            duplicate = Ticket.objects.create(
+                title="Invoice missing",
+                description="The invoice for my last payment was not received",
+                category="billing",
+                created_by=self.user,
+            )
+            bug_id = self.bug.id
+            self.bug.delete()
+        self.assertEqual(len(index), 2)
+
+        self.assertTrue(DeletedTicket.objects.filter(ticket_id=bug_id).exists())
+
+        # riallineamento: ticket modificati (updated_at) e cancellati (DeletedTicket),
+        # niente COUNT(*) né lettura di tutti gli id della tabella
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertIs(ml_utils.load_similarity_index(), index)
+        self.assertNotIn("COUNT(", " ".join(q["sql"] for q in ctx.captured_queries))
+        self.assertIn(("SELECT", "tickets_deletedticket"), statements(ctx))
+        self.assertEqual(len(index), 2)
+        results = get_similar_tickets(self.billing, top_k=5)
+        self.assertEqual([r["id"] for r in results][0], duplicate.id)
+        self.assertNotIn(bug_id, [r["id"] for r in results])
+
+    def test_stale_index_file_is_rebuilt(self):
+        """
+        Un indice salvato prima delle DeletedTicket conservate non può essere
+        riallineato: viene ricostruito dalla tabella.
+        """
+        index = ml_utils.load_similarity_index()
+        index.synced_at = timezone.now() - timedelta(days=settings.SIMILARITY_TOMBSTONE_DAYS + 1)
+        index.save(ml_utils._artifact_dir() / ml_utils.INDEX_FILENAME)
+        ml_utils._cached_index = None
+
+        with mock.patch.object(ml_utils, "build_similarity_index", wraps=ml_utils.build_similarity_index) as build:
+            rebuilt = ml_utils.load_similarity_index()
+        build.assert_called_once()
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(len(rebuilt), 2)
+
+    def test_search_similar_by_free_text(self):
+        """
+        search_similar_text trova i ticket simili a un testo non ancora salvato,
+        usando la ricerca full-text solo per i candidati.
+        """
+        Ticket.objects.create(
+            title="Password reset",
+            description="I cannot reset my password",
+            category="account",
+            created_by=self.user,
+        )
+        results = ml_utils.search_similar_text("Invoice missing", "I never received my invoice")
+        self.assertEqual(results[0]["id"], self.billing.id)
+        # nessuna parola in comune con lo storico: nessun candidato
+        self.assertEqual(ml_utils.search_similar_text("zzz", ""), [])
+
+        with mock.patch.object(ml_utils, "lexical_candidates", return_value=[self.bug.id]) as candidates:
+            results = ml_utils.search_similar_text("dashboard error", "", top_k=3)
+        candidates.assert_called_once()
+        self.assertEqual([r["id"] for r in results], [self.bug.id])
+
+    def test_ticket_vectors_stored_and_kept_in_sync(self):
+        """
+        train_model salva i vettori TF-IDF in TicketVector; load_ticket_vectors li legge
+        senza ri-tokenizzare; una modifica del testo li aggiorna, una di status no.
+        """
+        version = ModelVersion.objects.get(is_active=True).version
+        self.assertEqual(
+            set(TicketVector.objects.filter(model_version=version).values_list("ticket_id", flat=True)),
+            {self.billing.id, self.bug.id},
+        )
+
+        tfidf = ml_utils.load_model().named_steps["tfidf"]
+        with mock.patch.object(ml_utils, "_vectorize", wraps=ml_utils._vectorize) as vectorize:
+            ids, matrix = ml_utils.load_ticket_vectors([self.bug.id, self.billing.id], tfidf)
+        vectorize.assert_not_called()
+        self.assertEqual(ids.tolist(), [self.bug.id, self.billing.id])
+        expected = tfidf.transform(["Dashboard crash Error 500 when loading the dashboard"])
+        np.testing.assert_allclose(matrix[0].toarray(), expected.toarray(), rtol=1e-6)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.bug.status = "IN_PROGRESS"
+            self.bug.save()
+        self.assertFalse([q for q in ctx.captured_queries if TicketVector._meta.db_table in q["sql"]])
+        self.assertEqual(ticket_statements(ctx), ["UPDATE"])
+
+        before = TicketVector.objects.get(ticket=self.bug).values
+        self.bug.title = "Dashboard crash after login"
+        self.bug.save()
+        self.assertNotEqual(bytes(TicketVector.objects.get(ticket=self.bug).values), bytes(before))
+
+    def test_backfill_ticket_vectors_command(self):
+        """
+        backfill_ticket_vectors ricrea solo i vettori mancanti (o obsoleti).
+        """
+        TicketVector.objects.filter(ticket=self.bug).delete()
+        out = StringIO()
+        call_command("backfill_ticket_vectors", stdout=out)
+        self.assertIn("Ticket vectors stored: 1", out.getvalue())
+        self.assertEqual(TicketVector.objects.count(), 2)
+
+    def test_similar_ranking_fetches_only_winners(self):
+        """
+        Il ranking top-k carica i soli ticket vincenti con una singola query,
+        in ordine di similarità decrescente.
+        """
+        for i in range(10):
+            Ticket.objects.create(
+                title=f"Invoice question {i}",
+                description="Where can I download the invoice",
+                category="billing",
+                created_by=self.user,
+            )
+
+        with self.assertNumQueries(1):
+            results = get_similar_tickets(self.billing, top_k=3)
+
+        self.assertEqual(len(results), 3)
+        scores = [r["similarity"] for r in results]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertNotIn(self.billing.id, {r["id"] for r in results})
+
+
+@override_settings(SIMILARITY_BACKEND="lsh")
+class AnnSimilarityTests(IsolatedModelDirMixin, APITestCase):
+    """
+    Test sul backend approssimato (TruncatedSVD + LSH) per i ticket simili.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username="annuser",
+            email="annuser@example.com",
+            password="supersecurepassword123",
+        )
+        self.client.force_authenticate(user=self.user)
+        self.original = Ticket.objects.create(
+            title="Password reset email never arrives",
+            description="I requested a password reset but got no email",
+            category="account",
+            created_by=self.user,
+        )
+        Ticket.objects.create(
+            title="Refund for double charge",
+            description="My card was charged twice for the same order",
+            category="billing",
+            created_by=self.user,
+        )
+        self.duplicate = Ticket.objects.create(
+            title="Password reset email never arrives",
+            description="I requested a password reset but got no email",
+            category="account",
+            created_by=self.user,
+        )
+        train_model()
+
+    def test_ann_index_saved_next_to_model(self):
+        artifact_dir = ml_utils._artifact_dir()
+        self.assertTrue((artifact_dir / ml_utils.ANN_FILENAME).exists())
+        self.assertTrue((artifact_dir / ml_utils.MODEL_FILENAME).exists())
+
+    def test_similar_finds_duplicate_with_probes_param(self):
+        """
+        GET /api/tickets/{id}/similar/?probes=N usa il backend LSH
+        e trova il duplicato esatto.
+        """
+        url = reverse("tickets-similar", args=[self.original.id])
+        for probes in (0, 4):
+            response = self.client.get(url, {"top": 1, "probes": probes})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data[0]["id"], self.duplicate.id)
+
+
+@override_settings(ML_JOBS_EAGER=True, ML_CLASSIFIER="online")
+class IncrementalTrainingTests(IsolatedModelDirMixin, APITestCase):
+    """
+    Test sul training incrementale (HashingVectorizer + SGDClassifier.partial_fit):
+    consuma solo i ticket cambiati dopo l'ultimo checkpoint.
+    """
+
+    def setUp(self):
+        # ONLINE_MODEL_PATH punta alla directory temporanea del mixin
+        super().setUp()
+
+        self.user = User.objects.create_user(
+            username="onlineuser",
+            email="onlineuser@example.com",
+            password="supersecurepassword123",
+        )
+        self.client.force_authenticate(user=self.user)
+        for title, category in [
+            ("Invoice not received", "billing"),
+            ("Payment failed on checkout", "billing"),
+            ("Error 500 on dashboard", "bug"),
+            ("Mobile app crashes on startup", "bug"),
+        ]:
+            Ticket.objects.create(
+                title=title, description=title, category=category, created_by=self.user
+            )
+
+    def _train(self):
+        response = self.client.post(reverse("ml-train"), {"mode": "incremental"}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["mode"], "incremental")
+        self.assertEqual(response.data["status"], "SUCCEEDED")
+        return response.data["result"]
+
+    def test_only_new_tickets_are_consumed(self):
+        self.assertEqual(self._train()["n_samples"], 4)
+        mtime = ml_utils.ONLINE_MODEL_PATH.stat().st_mtime_ns
+        # nessun ticket cambiato dopo il checkpoint: il file non viene riscritto
+        self.assertEqual(self._train()["n_samples"], 0)
+        self.assertEqual(ml_utils.ONLINE_MODEL_PATH.stat().st_mtime_ns, mtime)
+
+        Ticket.objects.create(
+            title="Double charge on my card",
+            description="Charged twice",
+            category="billing",
+            created_by=self.user,
+        )
+        serving = ml_utils.load_online_model()["pipeline"]
+        coef = serving.named_steps["clf"].coef_.copy()
+        self.assertEqual(self._train()["n_samples"], 1)
+        # partial_fit su una copia: il modello che serviva le predizioni non cambia
+        np.testing.assert_array_equal(serving.named_steps["clf"].coef_, coef)
+        self.assertIsNot(ml_utils.load_online_model()["pipeline"], serving)
+
+    def test_online_model_used_for_predictions(self):
+        self._train()
+        ticket = Ticket.objects.first()
+        result = predict_category_for_ticket(ticket)
+        self.assertIn(result["category"], dict(Ticket.CATEGORY_CHOICES))
+        self.assertIsNotNone(result["confidence"])
+
+    def test_invalid_mode(self):
+        response = self.client.post(reverse("ml-train"), {"mode": "magic"}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("mode", response.data)
+        # body che non è un oggetto JSON: 400, non 500
+        response = self.client.post(reverse("ml-train"), [], format="json")
+        self.assertEqual(response.status_code, 400)
+
+
+class ModelRegistryTests(IsolatedModelDirMixin, APITestCase):
+    """
+    Test sul registro versionato del modello:
+    - ogni training crea una nuova versione attiva con la sua directory
+    - i worker caricano a caldo la versione attiva (una sola deserializzazione)
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(
+            username="registryuser",
+            email="registryuser@example.com",
+            password="supersecurepassword123",
+        )
+        self.client.force_authenticate(user=self.user)
+        for title, category in [("Invoice not received", "billing"), ("Error 500", "bug")]:
+            Ticket.objects.create(
+                title=title, description=title, category=category, created_by=self.user
+            )
+
+    def test_each_training_creates_active_version(self):
+        first = train_model()
+        second = train_model()
+
+        self.assertEqual(second["version"], first["version"] + 1)
+        active = ModelVersion.objects.get(is_active=True)
+        self.assertEqual(active.version, second["version"])
+        self.assertEqual(len(active.checksum), 64)
+        self.assertNotEqual(first["model_path"], second["model_path"])
+
+        response = self.client.get(reverse("ml-model-list"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [v["version"] for v in response.data], [second["version"], first["version"]]
+        )
+
+    @override_settings(ML_REGISTRY_TTL=0)
+    def test_rollback_is_hot_swapped_once(self):
+        first = train_model()
+        train_model()
+
+        url = reverse("ml-model-activate", args=[first["version"]])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["is_active"])
+
+        with mock.patch.object(ml_utils, "load_compact", wraps=ml_utils.load_compact) as load:
+            model = ml_utils.load_model()
+            self.assertIs(ml_utils.load_model(), model)
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(ml_utils._cached_version, first["version"])
+
+        missing = self.client.post(reverse("ml-model-activate", args=[999]))
+        self.assertEqual(missing.status_code, 404)
+
+    @override_settings(ML_REGISTRY_TTL=0)
+    def test_checksum_is_verified_at_activation_not_on_swap(self):
+        """
+        Lo sha256 dell'artifact si calcola al training e all'attivazione: l'hot-swap
+        nei worker confronta solo la dimensione.
+        """
+        first = train_model()
+        train_model()
+        self.assertEqual(
+            ModelVersion.objects.get(version=first["version"]).size,
+            ml_utils._artifact_size(Path(first["model_path"])),
+        )
+
+        url = reverse("ml-model-activate", args=[first["version"]])
+        self.assertEqual(self.client.post(url).status_code, 200)
+        with mock.patch.object(ml_utils, "_checksum", wraps=ml_utils._checksum) as checksum:
+            ml_utils.load_model()
+        checksum.assert_not_called()
+        self.assertEqual(ml_utils._cached_version, first["version"])
+
+        # artifact troncato: l'attivazione lo rifiuta, lo swap lo scarta dalla dimensione
+        second = ModelVersion.objects.get(is_active=False)
+        coef = ml_utils.MODEL_DIR / second.artifact_dir / ml_utils.MODEL_FILENAME / "coef.npy"
+        coef.write_bytes(coef.read_bytes()[:-8])
+        response = self.client.post(reverse("ml-model-activate", args=[second.version]))
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(ModelVersion.objects.get(version=first["version"]).is_active)
+
+        ModelVersion.objects.update(is_active=False)
+        ModelVersion.objects.filter(pk=second.pk).update(is_active=True)
+        with self.assertLogs("tickets.ml_utils", level="ERROR"):
+            ml_utils.load_model()
+        self.assertEqual(ml_utils._cached_version, first["version"])
+
+
+class CompactModelTests(TestCase):
+    """
+    Test sul formato compatto del modello (array NumPy caricati in mmap).
+    """
+
+    def test_compact_model_matches_sklearn_pipeline(self):
+        """
+        Il modello compatto in mmap deve dare le stesse feature TF-IDF
+        e le stesse probabilità del Pipeline scikit-learn originale.
+        """
+        rows = [
+            ("Invoice not received for my payment", "billing"),
+            ("Card charged twice", "billing"),
+            ("Error 500 on dashboard", "bug"),
+            ("App crashes at startup", "bug"),
+            ("Cannot reset my password", "account"),
+        ]
+        pipeline, _ = ml_utils.fit_pipeline(rows)
+        texts = ["invoice error", "password reset crash", "", "completely unknown words"]
+
+        with tempfile.TemporaryDirectory() as directory:
+            save_compact(pipeline, directory)
+            compact = load_compact(directory)
+
+            self.assertIsInstance(compact.named_steps["clf"].coef_, np.memmap)
+            self.assertIsInstance(compact.named_steps["tfidf"].terms_hash, np.memmap)
+            self.assertEqual(list(compact.classes_), list(pipeline.classes_))
+
+            expected = pipeline.named_steps["tfidf"].transform(texts)
+            actual = compact.named_steps["tfidf"].transform(texts)
+            self.assertEqual(abs(expected - actual).max(), 0)
+            np.testing.assert_allclose(compact.predict_proba(texts), pipeline.predict_proba(texts))
+
+
+class QueryPlanTests(APITestCase):
+    """
+    Regressioni sugli indici: le query "calde" delle view (lista filtrata e
+    ordinata, analytics) non devono fare scansioni sequenziali della tabella che
+    leggono (tickets_ticket per la lista, il rollup giornaliero per gli analytics).
+
+    Si catturano le query reali eseguite dagli endpoint e se ne legge il piano:
+    - PostgreSQL: EXPLAIN con enable_seqscan = off, così su tabelle piccole il
+      planner sceglie l'indice se ne esiste uno utilizzabile ("Seq Scan" = manca);
+    - SQLite (sviluppo locale): EXPLAIN QUERY PLAN, niente "SCAN" senza indice
+      e, per la lista, niente sort esterno per l'ORDER BY.
+    """
+
+    TABLE = Ticket._meta.db_table
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="planuser", password="supersecurepassword123")
+        self.client.force_authenticate(user=self.user)
+        now = timezone.now()
+        for i, status in enumerate(["OPEN", "IN_PROGRESS", "RESOLVED", "CLOSED"] * 5):
+            Ticket.objects.create(
+                title=f"Ticket {i}",
+                description="plan test",
+                status=status,
+                category=Ticket.CATEGORY_CHOICES[i % 5][0],
+                created_by=self.user,
+                assigned_to=self.user if i % 2 else None,
+                resolved_at=now if status == "RESOLVED" else None,
+            )
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute("SET LOCAL enable_seqscan = off")
+                cursor.execute(f"EXPLAIN {sql}")
+            else:
+                cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+
+    def _full_scans(self, plan, table, ordered):
+        if connection.vendor == "postgresql":
+            return [line for line in plan.splitlines() if f"Seq Scan on {table} " in f"{line} "]
+        return [
+            line
+            for line in plan.splitlines()
+            if (line.startswith(f"SCAN {table}") and "USING" not in line)
+            or (ordered and "TEMP B-TREE FOR ORDER BY" in line)
+        ]
+
+    def assertIndexedQueries(self, path, params=None, ordered=True, table=TABLE):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200)
+
+        table_queries = [q["sql"] for q in ctx.captured_queries if f'"{table}"' in q["sql"]]
+        self.assertTrue(table_queries)
+        for sql in table_queries:
+            plan = self._plan(sql)
+            self.assertEqual(self._full_scans(plan, table, ordered), [], f"{path} {params}\n{sql}\n{plan}")
+
+    def test_ticket_list_queries_use_indexes(self):
+        url = reverse("tickets-list")
+        self.assertIndexedQueries(url)
+        self.assertIndexedQueries(url, {"status": "OPEN"})
+        self.assertIndexedQueries(url, {"assigned_to": "me"})
+        self.assertIndexedQueries(url, {"ordering": "category"})
+        self.assertIndexedQueries(url, {"pagination": "cursor", "count": "false"})
+
+    def test_mttr_percentiles_query_uses_indexes(self):
+        # indice parziale (created_at, resolved_at) WHERE resolved_at IS NOT NULL; il GROUP BY ordina
+        url = reverse("analytics-mttr-percentiles")
+        self.assertIndexedQueries(url, {"days": 30}, ordered=False)
+        self.assertIndexedQueries(url, {"days": 30, "by": "priority"}, ordered=False)
+
+    def test_analytics_queries_use_indexes(self):
+        # gli analytics leggono solo il rollup; l'ORDER BY è sul risultato aggregato: il sort è atteso
+        stats = TicketDailyStats._meta.db_table
+        for name in ("analytics-trends", "analytics-mttr"):
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(reverse(name), {"days": 30})
+            self.assertEqual(ticket_statements(ctx), [])
+            cache.clear()
+            self.assertIndexedQueries(reverse(name), {"days": 30}, ordered=False, table=stats)
@@ -2,40 +2,159 @@
 Views REST per:
 - gestione dei ticket (CRUD + azioni di workflow),
 - endpoint ML (train e predict),
-- endpoint di analytics (trend per categoria e MTTR).
+- endpoint di analytics (trend per categoria, serie temporali, MTTR e percentili).
 """
 from datetime import timedelta
 
+import numpy as np
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
 from django.utils import timezone
-from django.db.models import Count, Avg, F, ExpressionWrapper, DurationField
-from rest_framework import viewsets, status
+from django.db.models import F, Sum
+from django.db.models.functions import TruncWeek
+from rest_framework import serializers, viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import IsAuthenticated
-from drf_spectacular.utils import extend_schema, OpenApiParameter
-
-from .models import Ticket
-from .serializers import TicketSerializer
-from .ml_utils import train_model, predict_category_for_ticket, get_similar_tickets
-
-
+from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter
+
+from .models import ModelVersion, Ticket, TicketDailyStats, TrainingJob
+from .serializers import (
+    TicketSerializer,
+    TicketReadSerializer,
+    TicketBulkCreateSerializer,
+    SimilarTextSerializer,
+    BulkTransitionSerializer,
+    BulkAssignSerializer,
+    PredictBatchSerializer,
+    TrainRequestSerializer,
+    TrainingJobSerializer,
+    ModelVersionSerializer,
+)
+from . import analytics_cache
+from .analytics import DIMENSIONS, resolution_percentiles
+from .jobs import submit_training_job
+from .pagination import TicketPagination
+from .parsers import NDJSONParser
+from .renderers import CSVRenderer, NDJSONRenderer
+from .search import search_tickets
+from .ml_utils import (
+    activate_model_version,
+    load_classifier,
+    predict_category_for_ticket,
+    predict_categories_for_queryset,
+    get_similar_tickets,
+    search_similar_text,
+)
+
+
+# ?fields= / ?omit= (sparse fieldset) su lista, dettaglio ed export
+PROJECTION_PARAMETERS = [
+    OpenApiParameter(
+        name="fields",
+        type=str,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description=(
+            "Campi da restituire, separati da virgola (es. id,title,status,priority): "
+            "le altre colonne non vengono lette dal DB."
+        ),
+    ),
+    OpenApiParameter(
+        name="omit",
+        type=str,
+        location=OpenApiParameter.QUERY,
+        required=False,
+        description="Campi da escludere, separati da virgola (es. description).",
+    ),
+]
+
+
+@extend_schema_view(
+    # TicketReadSerializer non descrive i campi: lo schema resta quello di TicketSerializer
+    list=extend_schema(responses=TicketSerializer, parameters=PROJECTION_PARAMETERS),
+    retrieve=extend_schema(responses=TicketSerializer, parameters=PROJECTION_PARAMETERS),
+)
 class TicketViewSet(viewsets.ModelViewSet):
     """
     ViewSet principale per i ticket:
     - CRUD standard (list, retrieve, create, update, delete)
-    - azioni extra: assign, transition, ml_predict, similar
+    - azioni extra: assign, transition, ml_predict, similar, search_similar
+    - operazioni in blocco: bulk, bulk_transition, bulk_assign
+    - export in streaming: export (CSV / NDJSON)
     """
-    queryset = Ticket.objects.all().select_related("created_by", "assigned_to")
+    # assigned_to viene serializzato come id (assigned_to_id): basta il join su created_by
+    queryset = Ticket.objects.all().select_related("created_by")
     serializer_class = TicketSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TicketPagination
+
+    # ordinamenti ammessi in ?ordering=, ciascuno coperto da un indice composito
+    # (vedi Ticket.Meta.indexes): a parità di campo, i ticket più recenti prima
+    ORDERING = {
+        "created_at": ("created_at", "id"),
+        "-created_at": ("-created_at", "-id"),
+        "status": ("status", "-created_at"),
+        "-status": ("-status", "created_at"),
+        "assigned_to": ("assigned_to", "-created_at"),
+        "-assigned_to": ("-assigned_to", "created_at"),
+        "category": ("category", "-created_at"),
+        "-category": ("-category", "created_at"),
+    }
+
+    # azioni che accettano ?fields= / ?omit=
+    PROJECTION_ACTIONS = ("list", "retrieve", "export")
+    # colonne sempre lette: chiave della paginazione keyset e dell'ordinamento di default
+    ALWAYS_LOADED = ("id", "created_at")
+
+    @cached_property
+    def projection(self):
+        """
+        Campi richiesti con ?fields= e/o ?omit= (nomi di TicketReadSerializer.FIELDS),
+        oppure None se la risposta è completa.
+        """
+        params = self.request.query_params
+        if self.action not in self.PROJECTION_ACTIONS or not ({"fields", "omit"} & set(params)):
+            return None
+        selected = self._field_names("fields") if params.get("fields") else list(TicketReadSerializer.FIELDS)
+        omitted = self._field_names("omit") if params.get("omit") else []
+        selected = [name for name in selected if name not in omitted]
+        if not selected:
+            raise ValidationError({"fields": "No fields selected"})
+        return selected
+
+    def _field_names(self, param):
+        names = [name.strip() for name in self.request.query_params[param].split(",") if name.strip()]
+        unknown = [name for name in names if name not in TicketReadSerializer.FIELDS]
+        if unknown:
+            raise ValidationError(
+                {param: f"Unknown fields: {', '.join(unknown)}; use: {', '.join(TicketReadSerializer.FIELDS)}"}
+            )
+        return names
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["fields"] = self.projection
+        return context
+
+    def get_serializer_class(self):
+        # lista e dettaglio in sola lettura: serializer leggero, stesso JSON
+        if self.action in ("list", "retrieve"):
+            return TicketReadSerializer
+        return super().get_serializer_class()
 
     def get_queryset(self):
         """
         Applica filtri dinamici in base ai parametri di query:
         - ?status=open/closed/...
         - ?assigned_to=me -> solo ticket assegnati all'utente corrente
-        - ?ordering=created_at o -created_at, ecc.
+        - ?q=testo -> ricerca full-text su titolo/descrizione, ordinata per rilevanza
+        - ?ordering=created_at o -created_at, ecc. (solo i campi in ORDERING, altrimenti 400)
+        - ?fields=/?omit= -> solo le colonne richieste (lista, dettaglio, export)
         """
         qs = super().get_queryset()
 
@@ -47,14 +166,187 @@ class TicketViewSet(viewsets.ModelViewSet):
         if assigned_to_me == "me" and self.request.user.is_authenticated:
             qs = qs.filter(assigned_to=self.request.user)
 
+        query = self.request.query_params.get("q", "").strip()
+        if query:
+            qs = search_tickets(qs, query)
+
         ordering = self.request.query_params.get("ordering")
         if ordering:
-            qs = qs.order_by(ordering)
+            if ordering not in self.ORDERING:
+                raise ValidationError(
+                    {"ordering": f"Unsupported ordering, use one of: {', '.join(self.ORDERING)}"}
+                )
+            qs = qs.order_by(*self.ORDERING[ordering])
+        elif query:
+            qs = qs.order_by("-rank", "-created_at")
         else:
             qs = qs.order_by("-created_at")
 
+        if self.projection is not None:
+            # sparse fieldset anche nel DB: only() non legge le colonne escluse (es. description)
+            columns = {
+                Ticket._meta.get_field(TicketReadSerializer.FIELDS[name][0]).name for name in self.projection
+            }
+            if "created_by" not in columns:
+                qs = qs.select_related(None)
+            qs = qs.only(*columns.union(self.ALWAYS_LOADED))
+
         return qs
 
+    # limite per singola richiesta bulk (oltre conviene spezzare l'import)
+    BULK_MAX_ITEMS = 10_000
+
+    @extend_schema(
+        request=TicketBulkCreateSerializer(many=True),
+        parameters=[
+            OpenApiParameter(
+                name="categorize",
+                type=bool,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description=(
+                    "Se true, i ticket senza category vengono categorizzati dal modello ML "
+                    "con una sola predict_proba sull'intero blocco."
+                ),
+            ),
+        ],
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        url_path="bulk",
+        parser_classes=[JSONParser, NDJSONParser],
+    )
+    def bulk(self, request):
+        """
+        POST /api/tickets/bulk/?categorize=true
+        Body: array JSON di ticket, oppure NDJSON (Content-Type: application/x-ndjson)
+
+        Crea molti ticket in una sola transazione (bulk_create a batch).
+        Se un elemento non è valido non viene creato nulla.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response({"detail": "Expected a list of tickets"}, status=status.HTTP_400_BAD_REQUEST)
+
+        categorize = request.query_params.get("categorize", "").lower() in ("1", "true", "yes")
+        if categorize and load_classifier() is None:
+            return Response({"detail": "Model not trained"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = TicketBulkCreateSerializer(
+            data=items,
+            many=True,
+            max_length=self.BULK_MAX_ITEMS,
+            context={"request": request, "categorize": categorize},
+        )
+        serializer.is_valid(raise_exception=True)
+        tickets = serializer.save()
+        return Response(
+            {"created": len(tickets), "ids": [t.id for t in tickets]},
+            status=status.HTTP_201_CREATED,
+        )
+
+    @extend_schema(request=BulkTransitionSerializer)
+    @action(detail=False, methods=["post"], url_path="bulk_transition")
+    def bulk_transition(self, request):
+        """
+        POST /api/tickets/bulk_transition/
+        Body: {"ids": [1, 2, 3], "status": "CLOSED"}
+          oppure {"filter": {"status": "RESOLVED", "updated_before": "..."}, "status": "CLOSED"}
+
+        Cambia lo status di tutti i ticket selezionati con un solo UPDATE
+        (resolved_at aggiornato come in Ticket.save) e ritorna quanti ne ha modificati.
+        """
+        serializer = BulkTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        updated = serializer.get_queryset().transition(serializer.validated_data["status"])
+        return Response({"updated": updated})
+
+    @extend_schema(request=BulkAssignSerializer)
+    @action(detail=False, methods=["post"], url_path="bulk_assign")
+    def bulk_assign(self, request):
+        """
+        POST /api/tickets/bulk_assign/
+        Body: {"ids": [1, 2, 3], "assigned_to": user_id}
+          oppure {"filter": {"category": "billing", "assigned_to": null}, "assigned_to": user_id}
+
+        Assegna tutti i ticket selezionati con un solo UPDATE e ritorna quanti ne ha modificati.
+        """
+        serializer = BulkAssignSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        assignee = serializer.validated_data["assigned_to"]
+        updated = serializer.get_queryset().assign(assignee.pk if assignee else None)
+        return Response({"updated": updated})
+
+    # colonne dell'export, nello stesso ordine e con gli stessi valori di TicketSerializer
+    EXPORT_FIELDS = {
+        "id": "id",
+        "title": "title",
+        "description": "description",
+        "status": "status",
+        "priority": "priority",
+        "category": "category",
+        "created_by": "created_by__username",
+        "assigned_to": "assigned_to",
+        "created_at": "created_at",
+        "updated_at": "updated_at",
+        "resolved_at": "resolved_at",
+    }
+    EXPORT_DATETIME_FIELDS = ("created_at", "updated_at", "resolved_at")
+    EXPORT_CHUNK_SIZE = 2000
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="format",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                enum=["csv", "ndjson"],
+                description="Formato dell'export (default csv). Filtri come GET /api/tickets/.",
+            ),
+            *PROJECTION_PARAMETERS,
+        ],
+        responses={(200, "text/csv"): str, (200, "application/x-ndjson"): str},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        renderer_classes=[CSVRenderer, NDJSONRenderer],
+    )
+    def export(self, request):
+        """
+        GET /api/tickets/export/?format=csv|ndjson (+ gli stessi filtri della lista)
+
+        Esporta tutti i ticket selezionati in streaming: le righe vengono lette con
+        values_list().iterator() (cursore lato server su PostgreSQL) e scritte man
+        mano, quindi la memoria usata non dipende dal numero di ticket.
+        """
+        qs = self.filter_queryset(self.get_queryset())
+        header = self.projection or list(self.EXPORT_FIELDS)
+        columns = [self.EXPORT_FIELDS[name] for name in header]
+        rows = qs.values_list(*columns).iterator(chunk_size=self.EXPORT_CHUNK_SIZE)
+        renderer = request.accepted_renderer
+        positions = [header.index(name) for name in self.EXPORT_DATETIME_FIELDS if name in header]
+        to_representation = serializers.DateTimeField().to_representation
+
+        def formatted():
+            # datetime nello stesso formato della API JSON (ISO 8601, "Z" per UTC)
+            for row in rows:
+                row = list(row)
+                for i in positions:
+                    if row[i] is not None:
+                        row[i] = to_representation(row[i])
+                yield row
+
+        response = StreamingHttpResponse(
+            renderer.stream(header, formatted()),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = f'attachment; filename="tickets.{renderer.format}"'
+        return response
+
     @action(detail=True, methods=["post"])
     def assign(self, request, pk=None):
         """
@@ -114,13 +406,23 @@ class TicketViewSet(viewsets.ModelViewSet):
                 location=OpenApiParameter.QUERY,
                 required=False,
                 description="Numero massimo di ticket simili da restituire (default 5, max 20).",
-            )
+            ),
+            OpenApiParameter(
+                name="probes",
+                type=int,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description=(
+                    "Solo con backend di similarità 'lsh': bucket vicini esplorati per tabella "
+                    "(0-24). Valori alti aumentano recall e latenza."
+                ),
+            ),
         ]
     )
     @action(detail=True, methods=["get"], url_path="similar")
     def similar(self, request, pk=None):
         """
-        GET /api/tickets/{id}/similar/?top=5
+        GET /api/tickets/{id}/similar/?top=5&probes=2
 
         Ritorna i ticket più simili (TF-IDF + cosine similarity)
         al ticket indicato.
@@ -138,27 +440,133 @@ class TicketViewSet(viewsets.ModelViewSet):
         if top > 20:
             top = 20
 
+        probes = None
+        raw_probes = request.query_params.get("probes")
+        if raw_probes is not None:
+            try:
+                probes = min(max(int(raw_probes), 0), 24)
+            except ValueError:
+                probes = None
+
         ticket = self.get_object()
-        data = get_similar_tickets(ticket, top_k=top)
+        data = get_similar_tickets(ticket, top_k=top, probes=probes)
         return Response(data)
 
+    @extend_schema(request=SimilarTextSerializer)
+    @action(detail=False, methods=["post"], url_path="search_similar")
+    def search_similar(self, request):
+        """
+        POST /api/tickets/search_similar/
+        Body: {"title": "...", "description": "...", "top": 5}
+
+        Ticket esistenti più simili a un testo libero (es. dal form prima dell'invio):
+        candidati dalla ricerca full-text, riordinati per similarità TF-IDF.
+        """
+        serializer = SimilarTextSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        results = search_similar_text(
+            data.get("title", ""), data.get("description", ""), top_k=data["top"]
+        )
+        if results is None:
+            return Response({"detail": "Model not trained"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(results)
+
 
 class TrainModelView(APIView):
     """
     POST /api/ml/train/
+    Body (opzionale): {"mode": "full" | "incremental"}
 
-    Allena il modello ML sui ticket esistenti (con category valorizzata).
+    Accoda un job di training del modello ML sui ticket esistenti
+    (con category valorizzata) e ritorna subito il job (202).
+    - full: riallena da zero TF-IDF + Logistic Regression
+    - incremental: partial_fit del modello online sui soli ticket cambiati dall'ultimo checkpoint
+    Lo stato si segue con GET /api/ml/jobs/{id}/.
     """
     permission_classes = [IsAuthenticated]
 
+    @extend_schema(request=TrainRequestSerializer, responses=TrainingJobSerializer)
     def post(self, request):
-        info = train_model()
-        if info is None:
-            return Response(
-                {"detail": "No data (or only one class) available for training"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-        return Response(info, status=status.HTTP_200_OK)
+        serializer = TrainRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = submit_training_job(user=request.user, mode=serializer.validated_data["mode"])
+        return Response(TrainingJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class TrainingJobView(APIView):
+    """
+    GET /api/ml/jobs/{id}/
+
+    Stato, avanzamento, durata e metriche di un job di training.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses=TrainingJobSerializer)
+    def get(self, request, pk):
+        job = get_object_or_404(TrainingJob, pk=pk)
+        return Response(TrainingJobSerializer(job).data)
+
+
+class ModelVersionListView(APIView):
+    """
+    GET /api/ml/models/
+
+    Elenca le versioni del modello presenti nel registro (la più recente per prima).
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(responses=ModelVersionSerializer(many=True))
+    def get(self, request):
+        versions = ModelVersion.objects.all()
+        return Response(ModelVersionSerializer(versions, many=True).data)
+
+
+class ModelVersionActivateView(APIView):
+    """
+    POST /api/ml/models/{version}/activate/
+
+    Rende attiva una versione del registro (es. rollback dopo un training peggiore).
+    Tutti i worker la caricano a caldo entro ML_REGISTRY_TTL secondi.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=None, responses=ModelVersionSerializer)
+    def post(self, request, version):
+        try:
+            activated = activate_model_version(version)
+        except ValueError as exc:
+            return Response({"detail": str(exc)}, status=status.HTTP_409_CONFLICT)
+        if not activated:
+            return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ModelVersionSerializer(ModelVersion.objects.get(version=version)).data)
+
+
+class PredictBatchView(APIView):
+    """
+    POST /api/ml/predict_batch/
+    Body: {"ids": [1, 2, 3]} oppure {"category": "other", "status": "OPEN"}
+
+    Ricategorizza in blocco i ticket selezionati con il modello ML
+    (predict_proba a blocchi + bulk_update) e ritorna i conteggi.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(request=PredictBatchSerializer)
+    def post(self, request):
+        serializer = PredictBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        filters = dict(serializer.validated_data)
+
+        ids = filters.pop("ids", None)
+        qs = Ticket.objects.filter(**filters)
+        if ids is not None:
+            qs = qs.filter(id__in=ids)
+
+        result = predict_categories_for_queryset(qs)
+        if result is None:
+            return Response({"detail": "Model not trained"}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
 
 
 class AnalyticsTrendsView(APIView):
@@ -193,22 +601,119 @@ class AnalyticsTrendsView(APIView):
             days = 365
 
         since = timezone.now() - timedelta(days=days)
-        qs = Ticket.objects.filter(created_at__gte=since)
 
-        agg = (
-            qs.values("category")
-            .annotate(count=Count("id"))
-            .order_by("-count")
-        )
+        def compute():
+            # letto dal rollup giornaliero: granularità al giorno (da mezzanotte del giorno di `since`)
+            qs = TicketDailyStats.objects.filter(date__gte=timezone.localdate(since))
+            agg = (
+                qs.values("category")
+                .annotate(count=Sum("created_count"))
+                .filter(count__gt=0)
+                .order_by("-count")
+            )
+            return list(agg)
+
         return Response(
             {
                 "from": since,
                 "to": timezone.now(),
-                "by_category": list(agg),
+                "by_category": analytics_cache.cached("trends", days, since, compute),
             }
         )
 
 
+class AnalyticsTrendsSeriesView(APIView):
+    """
+    GET /api/analytics/trends/series/?days=90&bucket=day|week
+
+    Serie temporale dei ticket creati per categoria, un valore per bucket
+    (giorno, o settimana a partire dal lunedì), pronta per un grafico:
+    tutti i bucket della finestra e tutte le categorie, con zero dove non
+    ci sono ticket.
+    """
+    permission_classes = [IsAuthenticated]
+    BUCKET_DAYS = {"day": 1, "week": 7}
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="days",
+                type=int,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Finestra temporale in giorni (default 30, max 365).",
+            ),
+            OpenApiParameter(
+                name="bucket",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                enum=["day", "week"],
+                description="Ampiezza dei bucket (default day).",
+            ),
+        ]
+    )
+    def get(self, request):
+        raw_days = request.query_params.get("days", "30")
+        try:
+            days = int(raw_days)
+        except ValueError:
+            days = 30
+
+        if days < 1:
+            days = 1
+        if days > 365:
+            days = 365
+
+        bucket = request.query_params.get("bucket", "day")
+        if bucket not in self.BUCKET_DAYS:
+            raise ValidationError({"bucket": f"Invalid bucket, expected one of: {', '.join(self.BUCKET_DAYS)}"})
+
+        since = timezone.now() - timedelta(days=days)
+        series = analytics_cache.cached(
+            f"series-{bucket}",
+            days,
+            since,
+            lambda: self.series(timezone.localdate(since), timezone.localdate(), bucket),
+        )
+        return Response({"from": since, "to": timezone.now(), "bucket": bucket, **series})
+
+    def series(self, start, end, bucket):
+        """
+        Una sola query raggruppata (bucket, categoria) sul rollup giornaliero;
+        la matrice densa categorie x bucket viene riempita con NumPy.
+        """
+        categories = np.array([value for value, _ in Ticket.CATEGORY_CHOICES])
+        # solo le categorie note: una riga con categoria fuori da CATEGORY_CHOICES
+        # (es. valore dismesso) finirebbe nella riga di un'altra categoria
+        qs = TicketDailyStats.objects.filter(date__gte=start, date__lte=end, category__in=categories.tolist())
+        if bucket == "week":
+            qs = qs.annotate(bucket=TruncWeek("date"))
+            start -= timedelta(days=start.weekday())
+        else:
+            qs = qs.annotate(bucket=F("date"))
+        rows = list(qs.values_list("bucket", "category").annotate(count=Sum("created_count")).order_by())
+
+        step = np.timedelta64(self.BUCKET_DAYS[bucket], "D")
+        buckets = np.arange(np.datetime64(start), np.datetime64(end) + 1, step)
+        counts = np.zeros((len(categories), len(buckets)), dtype=np.int64)
+        if rows:
+            dates, row_categories, values = zip(*rows)
+            columns = (np.array(dates, dtype="datetime64[D]") - buckets[0]) // step
+            order = np.argsort(categories)
+            lines = order[np.searchsorted(categories, row_categories, sorter=order)]
+            # righe già raggruppate per (bucket, categoria): ogni cella compare una volta sola
+            counts[lines, columns] = values
+
+        return {
+            "buckets": buckets.astype(str).tolist(),
+            "series": [
+                {"category": category, "counts": line.tolist(), "total": int(line.sum())}
+                for category, line in zip(categories.tolist(), counts)
+            ],
+        }
+
+
 class AnalyticsMttrView(APIView):
     """
     GET /api/analytics/mttr/?days=30
@@ -243,24 +748,85 @@ class AnalyticsMttrView(APIView):
 
         since = timezone.now() - timedelta(days=days)
 
-        qs = Ticket.objects.filter(
-            created_at__gte=since,
-            resolved_at__isnull=False,
-        )
-
-        # Mean Time To Resolve: media di (resolved_at - created_at)
-        resolution_time = ExpressionWrapper(
-            F("resolved_at") - F("created_at"),
-            output_field=DurationField(),
-        )
+        def compute():
+            qs = TicketDailyStats.objects.filter(date__gte=timezone.localdate(since))
+            # Mean Time To Resolve: somma delle durate di risoluzione / ticket risolti
+            agg = qs.aggregate(total=Sum("resolution_seconds"), resolved=Sum("resolved_count"))
+            # in un dict: anche "nessun ticket risolto" (None) va in cache
+            return {"mttr_seconds": agg["total"] / agg["resolved"] if agg["resolved"] else None}
 
-        agg = qs.aggregate(avg_resolution=Avg(resolution_time))
         return Response(
             {
                 "from": since,
                 "to": timezone.now(),
-                "mttr_seconds": agg["avg_resolution"].total_seconds()
-                if agg["avg_resolution"] is not None
-                else None,
+                **analytics_cache.cached("mttr", days, since, compute),
             }
         )
+
+
+class AnalyticsMttrPercentilesView(APIView):
+    """
+    GET /api/analytics/mttr/percentiles/?days=30&by=category|priority|assigned_to
+
+    Percentili p50/p90/p99 (e media) del tempo di risoluzione, in secondi, dei
+    ticket creati negli ultimi N giorni e già risolti: in totale o, con ?by=,
+    per categoria, priorità o assegnatario (null = non assegnati).
+    Calcolati sulla tabella dei ticket con una sola query (vedi tickets/analytics.py);
+    non passano dalla cache perché priorità e assegnatario non sono nel rollup.
+    """
+    permission_classes = [IsAuthenticated]
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="days",
+                type=int,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Finestra temporale in giorni (default 30, max 365).",
+            ),
+            OpenApiParameter(
+                name="by",
+                type=str,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                enum=list(DIMENSIONS),
+                description="Dimensione per cui suddividere i percentili (default: nessuna).",
+            ),
+        ]
+    )
+    def get(self, request):
+        raw_days = request.query_params.get("days", "30")
+        try:
+            days = int(raw_days)
+        except ValueError:
+            days = 30
+
+        if days < 1:
+            days = 1
+        if days > 365:
+            days = 365
+
+        by = request.query_params.get("by") or None
+        if by is not None and by not in DIMENSIONS:
+            raise ValidationError({"by": f"Invalid dimension, expected one of: {', '.join(DIMENSIONS)}"})
+
+        since = timezone.now() - timedelta(days=days)
+        qs = Ticket.objects.filter(created_at__gte=since)
+        result = resolution_percentiles(qs, by=by)
+        if by is None:
+            return Response({"from": since, "to": timezone.now(), **result})
+        return Response({"from": since, "to": timezone.now(), "by": by, "results": result})
+
+
+class AnalyticsCacheView(APIView):
+    """
+    GET /api/analytics/cache/
+
+    Statistiche della cache degli analytics per il monitoraggio:
+    backend, TTL, generazione corrente, hit, miss e hit ratio.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response(analytics_cache.stats())